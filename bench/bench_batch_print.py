@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# Tickets per minute: N presses printed one job each (select, render a
+# one-page PDF, submit) vs one batch job (N facts selected in one transaction,
+# one N-page PDF, one submission). CUPS is replaced by a stub printer that
+# waits --job-overhead seconds per job, standing in for spooling and the
+# driver starting a job on the Pi; the ESC/POS path writes to a plain file.
+#
+#   python3 bench/bench_batch_print.py [--tickets 50] [--job-overhead 0.5]
+
+import os, sys, time
+import types
+import shutil
+import argparse
+import tempfile
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+work_directory = tempfile.mkdtemp(prefix="fun_facts_bench_")
+os.environ["FUN_FACTS_DB"] = os.path.join(work_directory, "facts.db")
+
+
+class StubPrinterConnection:
+    job_overhead = 0.0
+    jobs = []
+
+    def getPrinters(self):
+        import main
+        return {main.PRINTER_NAME: {}}
+
+    def createJob(self, printer, title, options):
+        time.sleep(self.job_overhead)
+        self.jobs.append(options["page-ranges"])
+        return len(self.jobs)
+
+    def startDocument(self, printer, job_id, title, document_format, last_document):
+        return 100
+
+    def writeRequestData(self, data, length):
+        return 100
+
+    def finishDocument(self, printer):
+        return 0
+
+sys.modules["cups"] = types.SimpleNamespace(Connection=StubPrinterConnection, HTTP_CONTINUE=100, IPP_OK=0)
+
+import main
+
+
+def timed(name, tickets, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed:7.2f}s   {tickets / elapsed * 60:9.0f} tickets/min")
+
+def one_job_per_ticket(tickets):
+    for _ in range(tickets):
+        main.print_fact_by_category()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=50)
+    parser.add_argument("--job-overhead", type=float, default=0.5)
+    args = parser.parse_args()
+    StubPrinterConnection.job_overhead = args.job_overhead
+
+    try:
+        main.get_fun_fact()
+        print(f"\n{args.tickets} tickets, stub printer with {args.job_overhead}s per job")
+
+        main.PRINTER_BACKEND = "cups"
+        timed("cups, one job per ticket", args.tickets, lambda: one_job_per_ticket(args.tickets))
+        timed("cups, one batch job", args.tickets, lambda: main.print_batch(args.tickets))
+
+        main.PRINTER_BACKEND = "escpos"
+        main.ESCPOS_DEVICE = os.path.join(work_directory, "printer.bin")
+        timed("escpos, one write per ticket", args.tickets, lambda: one_job_per_ticket(args.tickets))
+        timed("escpos, one batch write", args.tickets, lambda: main.print_batch(args.tickets))
+        print(f"cups jobs submitted: {len(StubPrinterConnection.jobs)}, last page-ranges {StubPrinterConnection.jobs[-1]}")
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
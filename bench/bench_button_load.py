@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+# Load test of the buttons demon off-device: simulated buttons fire presses at
+# a fixed rate through the button input thread, the real Menu state machine,
+# print queue and Display, with a virtual OLED and a null printer. Reports how
+# long the edge callback takes and how long from the edge until a frame
+# showing the press reached the panel. The synthetic edges are clean, so
+# debouncing is off and every press counts.
+#
+#   python3 bench/bench_button_load.py [presses_per_second] [seconds]
+
+import os, sys, time
+import random
+import shutil
+import tempfile
+import threading
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+from src import db_utils, print_queue, metrics
+from src.machine_status import status
+from demon import hardware
+from demon.buttons import ButtonInput, load_timing
+from demon.display import Display
+from demon.menu import Menu, RANDOM_FACT, INFO_TEXT
+
+# share of up / down / select presses
+BUTTON_MIX = (("up", 45), ("down", 45), ("select", 10))
+
+
+def scripted_presses(rate, seconds, rng):
+    names, weights = zip(*BUTTON_MIX)
+    events = []
+    for n in range(int(rate * seconds)):
+        at = n / rate
+        name = rng.choices(names, weights=weights)[0]
+        events.append((at, name, True))
+        events.append((at, name, False))
+    return events
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return "no samples"
+    pick = lambda fraction: samples[min(int(fraction * len(samples)), len(samples) - 1)] * 1000
+    return (f"p50 {pick(0.50):8.3f} ms   p95 {pick(0.95):8.3f} ms   "
+            f"p99 {pick(0.99):8.3f} ms   max {samples[-1] * 1000:8.3f} ms")
+
+def load_categories(menu):
+    cursor = db_utils.get_connection().cursor()
+    cursor.execute("SELECT name FROM categories WHERE fact_count > 0 ORDER BY name")
+    menu.set_categories([RANDOM_FACT] + [row[0] for row in cursor] + [INFO_TEXT])
+
+if __name__ == "__main__":
+    rate = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    work_directory = tempfile.mkdtemp(prefix="fun_facts_bench_")
+    db_utils.database_path = os.path.join(work_directory, "facts.db")
+
+    try:
+        db_utils.bootstrap_db()
+        device = hardware.VirtualDisplay()
+        printer = hardware.NullPrinter(delay=0.05)
+        menu = Menu(status, font_directory=os.path.join(root_directory, "src", "fonts"))
+        load_categories(menu)
+
+        frame_starts, frame_ends = [], []
+
+        def render(draw):
+            frame_starts.append(time.perf_counter())
+            menu.draw(draw)
+
+        def on_frame(image, changed):
+            frame_ends.append(time.perf_counter())
+            device.record_frame(image, changed)
+
+        display = Display(device, render, on_frame=on_frame)
+        menu.display = display
+
+        press_times, applied_times, handler_times = [], [], []
+
+        def on_action(name, at, repeat):
+            menu.on_button(name, True, repeat)
+            display.invalidate(since=at)
+            press_times.append(at)
+            applied_times.append(time.perf_counter())
+
+        timing = load_timing({name: {"debounce": 0, "repeat": False} for name, _ in BUTTON_MIX})
+        button_input = ButtonInput(on_action, timing).start()
+
+        def on_edge(name, pressed):
+            start = time.perf_counter()
+            button_input.edge(name, pressed)
+            if pressed:
+                handler_times.append(time.perf_counter() - start)
+
+        buttons = hardware.SimulatedButtons(on_edge)
+        worker = print_queue.PrintWorker(printer, on_status=menu.on_job_status)
+        worker.start()
+        display_thread = threading.Thread(target=display.run, kwargs={"tick_interval": menu.redraw_interval}, daemon=True)
+        display_thread.start()
+
+        events = scripted_presses(rate, seconds, random.Random(3))
+        start = time.perf_counter()
+        buttons.replay(events)
+        elapsed = time.perf_counter() - start
+        time.sleep(0.2)
+        button_input.stop()
+        display.stop()
+        worker.stop()
+        display_thread.join()
+
+        # a press shows up in the first frame rendered after the menu took it
+        frame_latency = []
+        frame = 0
+        for pressed_at, applied_at in zip(press_times, applied_times):
+            while frame < len(frame_starts) and frame_starts[frame] < applied_at:
+                frame += 1
+            if frame < len(frame_ends):
+                frame_latency.append(frame_ends[frame] - pressed_at)
+
+        print(f"\n{len(press_times)} presses in {elapsed:.2f}s ({len(press_times) / elapsed:.0f}/s, target {rate}/s)")
+        print(f"edge callback      {percentiles(handler_times)}")
+        print(f"edge to frame      {percentiles(frame_latency)}")
+        print(f"frames rendered {display.frames_rendered}, pushed {display.frames_pushed}, "
+              f"page writes {device.writes}, print jobs printed {printer.count}")
+    finally:
+        # the histograms go to the temporary database, not at exit after it is gone
+        metrics.flush()
+        db_utils.close_connection()
+        shutil.rmtree(work_directory, ignore_errors=True)
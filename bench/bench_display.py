@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# Frames and I2C bytes per minute for the OLED: the old 20 Hz full redraw loop
+# vs the event driven display with page diffing, on a headless device.
+#
+#   python3 bench/bench_display.py [presses_per_minute]
+
+import os, sys, time
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+from PIL import ImageFont
+
+from demon.display import Display
+
+FRAME_INTERVAL = 0.05
+MINUTE = 60.0
+
+categories = ["Random Fact", "About This Machine", "Animals", "Programming", "Rail", "Science", "Space", "Technology"]
+font_small = ImageFont.truetype(os.path.join(root_directory, "src", "fonts", "Ubuntu-Regular.ttf"), 9)
+state = {"position": 0, "status_page": False, "clock": 0.0}
+
+
+def draw_menu(draw):
+    draw.rectangle((0, 0, 127, 31), outline="white", fill="black")
+    if state["status_page"]:
+        draw.text((5, 10), f"Uptime: {int(state['clock'])}s", fill="white", font=font_small)
+        return
+
+    y = 2
+    for idx, item in enumerate(categories[state["position"]:]):
+        draw.text((5 if idx == 0 else 10, y), ("* " if idx == 0 else "  ") + item, fill="white")
+        y += 10
+
+def scripted_events(presses_per_minute):
+    # button presses spread over the minute, every fifth one opens the status page for 4s
+    events = []
+    for n in range(presses_per_minute):
+        at = n * MINUTE / presses_per_minute
+        events.append((at, "status" if n % 5 == 4 else "down"))
+    return events
+
+def legacy(events):
+    display = Display(None, draw_menu)
+    pending = list(events)
+    status_until = 0.0
+    ticks = int(MINUTE / FRAME_INTERVAL)
+
+    start = time.perf_counter()
+    for tick in range(ticks):
+        state["clock"] = tick * FRAME_INTERVAL
+        while pending and pending[0][0] <= state["clock"]:
+            _, kind = pending.pop(0)
+            if kind == "status":
+                status_until = state["clock"] + 4
+            else:
+                state["position"] = (state["position"] + 1) % len(categories)
+        state["status_page"] = state["clock"] < status_until
+
+        # what the old loop did: render and push every page, every frame
+        display._pages = None
+        display.refresh()
+    return display.stats(), time.perf_counter() - start
+
+def event_driven(events):
+    display = Display(None, draw_menu)
+    pending = list(events)
+    status_until = 0.0
+    next_tick = None
+    ticks = int(MINUTE / FRAME_INTERVAL)
+
+    start = time.perf_counter()
+    display.refresh()
+    for tick in range(ticks):
+        state["clock"] = tick * FRAME_INTERVAL
+        dirty = False
+        while pending and pending[0][0] <= state["clock"]:
+            _, kind = pending.pop(0)
+            if kind == "status":
+                status_until = state["clock"] + 4
+                next_tick = state["clock"] + 1
+            else:
+                state["position"] = (state["position"] + 1) % len(categories)
+            dirty = True
+
+        if state["status_page"] != (state["clock"] < status_until):
+            state["status_page"] = not state["status_page"]
+            dirty = True
+        if state["status_page"] and next_tick is not None and state["clock"] >= next_tick:
+            next_tick += 1
+            dirty = True
+
+        if dirty:
+            display.refresh()
+    return display.stats(), time.perf_counter() - start
+
+if __name__ == "__main__":
+    presses_per_minute = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    events = scripted_events(presses_per_minute)
+
+    print(f"\none simulated minute, {presses_per_minute} button presses")
+    print(f"{'':<14}{'rendered':>10}{'pushed':>10}{'pages':>8}{'bytes':>10}{'cpu':>10}")
+    for name, run in (("20 Hz loop", legacy), ("event driven", event_driven)):
+        state.update(position=0, status_page=False, clock=0.0)
+        stats, elapsed = run(events)
+        print(f"{name:<14}{stats['frames_rendered']:>10}{stats['frames_pushed']:>10}"
+              f"{stats['pages_pushed']:>8}{stats['bytes_pushed']:>10}{elapsed * 1000:>8.1f}ms")
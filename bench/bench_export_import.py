@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Memory ceiling of the streaming import and export: generates a CSV pack of
+# N facts, imports it into an empty database with python3 -m src.fact_import,
+# exports it again as CSV and JSONL with python3 -m src.fact_export, each in
+# its own process, and reports time and peak RSS per phase. Peak RSS should
+# stay flat as --rows grows. Checks that every fact made the round trip and
+# that a second import of the export adds nothing. Exits 1 on any failure.
+#
+#   python3 bench/bench_export_import.py [--rows 200000]
+
+import os, sys, time
+import csv
+import json
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATEGORIES = ("animals", "space", "history", "science", "food")
+
+
+def write_pack(path, rows):
+    # written row by row, the generator itself does not hold the pack either
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(("category", "description"))
+        for n in range(rows):
+            writer.writerow((CATEGORIES[n % len(CATEGORIES)],
+                             f"Fact number {n}: a sentence about something, with \"quotes\", commas and ünïcode."))
+
+def run(env, *args):
+    # peak RSS of the child alone, from wait4
+    start = time.perf_counter()
+    process = subprocess.Popen((sys.executable, *args), cwd=root_directory, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    errors = process.stderr.read().decode()
+    process.stderr.close()
+    if os.waitstatus_to_exitcode(status):
+        raise RuntimeError(f"{' '.join(args)} failed:\n{errors}")
+    return elapsed, usage.ru_maxrss / 1024
+
+def count_lines(path):
+    with open(path, "rb") as file:
+        return sum(1 for _ in file)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    work_directory = tempfile.mkdtemp(prefix="fun_facts_export_")
+    try:
+        database = os.path.join(work_directory, "facts.db")
+        pack, csv_export, jsonl_export = (os.path.join(work_directory, name)
+                                          for name in ("pack.csv", "export.csv", "export.jsonl"))
+        env = dict(os.environ, FUN_FACTS_DB=database)
+        write_pack(pack, args.rows)
+
+        # the database starts with the bundled facts.json, count on top of those
+        run(env, "-c", "from src import db_utils; db_utils.bootstrap_db()")
+        before = sqlite3.connect(database).execute("SELECT COUNT(*) FROM facts").fetchone()[0]
+
+        phases = (("baseline, python3 -c pass", ("-c", "pass")),
+                  ("import CSV pack", ("-m", "src.fact_import", pack)),
+                  ("export CSV", ("-m", "src.fact_export", "--format", "csv", "-o", csv_export)),
+                  ("export JSONL", ("-m", "src.fact_export", "--format", "jsonl", "-o", jsonl_export)),
+                  ("import the CSV export again", ("-m", "src.fact_import", csv_export)))
+        print(f"\n{args.rows} facts, pack {os.path.getsize(pack) / 1e6:.1f}MB")
+        print(f"{'phase':<30} {'seconds':>8} {'peak RSS MB':>12}")
+        for name, command in phases:
+            elapsed, rss = run(env, *command)
+            print(f"{name:<30} {elapsed:>8.2f} {rss:>12.1f}")
+
+        failures = []
+        total = sqlite3.connect(database).execute("SELECT COUNT(*) FROM facts").fetchone()[0]
+        if total != before + args.rows:
+            failures.append(f"database has {total} facts, expected {before + args.rows}")
+        if count_lines(jsonl_export) != total:
+            failures.append(f"JSONL export has {count_lines(jsonl_export)} lines, database {total}")
+        with open(csv_export, encoding="utf-8", newline="") as file:
+            exported = {row["description"] for row in csv.DictReader(file)}
+        with open(pack, encoding="utf-8", newline="") as file:
+            missing = sum(1 for row in csv.DictReader(file) if row["description"] not in exported)
+        if missing:
+            failures.append(f"{missing} facts of the pack are not in the CSV export")
+        with open(jsonl_export, encoding="utf-8") as file:
+            if json.loads(file.readline())["description"] not in exported:
+                failures.append("the JSONL export does not match the CSV export")
+
+        for failure in failures:
+            print("FAIL", failure)
+        print("FAILED" if failures else "OK")
+        sys.exit(1 if failures else 0)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+# Importing a synthetic 500k-fact pack: the old row-by-row populate_db vs the
+# streaming, deduplicating importer, plus an incremental re-sync of the same pack.
+#
+#   python3 bench/bench_fact_import.py [facts]
+
+import os, sys, time
+import json
+import shutil
+import sqlite3
+import tempfile
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+from src import db_utils, fact_import
+
+CATEGORIES = ["animals", "technology", "science", "programming", "space", "rail", "history", "food"]
+
+
+def write_packs(directory, count):
+    json_path = os.path.join(directory, "pack.json")
+    jsonl_path = os.path.join(directory, "pack.jsonl")
+
+    with open(json_path, "w") as json_file, open(jsonl_path, "w") as jsonl_file:
+        json_file.write("{")
+        for idx, category in enumerate(CATEGORIES):
+            facts = [f"Synthetic {category} fact number {n}." for n in range(idx, count, len(CATEGORIES))]
+            json_file.write(("," if idx else "") + json.dumps(category) + ":" + json.dumps(facts, indent=1))
+            for fact in facts:
+                jsonl_file.write(json.dumps({"category": category, "description": fact}) + "\n")
+        json_file.write("}")
+
+    return json_path, jsonl_path
+
+def legacy_import(path, json_path):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    db_utils.create_schema(cursor)
+    with open(json_path) as file:
+        json_data = json.load(file)
+
+    now = int(time.time())
+    for category in json_data:
+        for fact in json_data[category]:
+            sql = """
+                    INSERT INTO facts (category, description, times_used, owner, create_ts, update_ts)
+                    VALUES (?,?,?,?,?,?);
+            """
+            cursor.execute(sql, (category, fact, 0, "szymon", now, now))
+    conn.commit()
+    conn.close()
+
+def timed(name, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{name:<28} {time.perf_counter() - start:8.2f}s   {result or ''}")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    work_directory = tempfile.mkdtemp(prefix="fun_facts_bench_")
+
+    try:
+        json_path, jsonl_path = write_packs(work_directory, count)
+        print(f"\n{count} facts")
+
+        timed("before: row by row", lambda: legacy_import(os.path.join(work_directory, "legacy.db"), json_path))
+
+        conn = db_utils.open_connection(os.path.join(work_directory, "json.db"))
+        db_utils.create_schema(conn.cursor())
+        timed("after: .json pack", lambda: fact_import.import_pack(json_path, conn))
+        timed("after: .json re-sync", lambda: fact_import.import_pack(json_path, conn))
+        conn.close()
+
+        conn = db_utils.open_connection(os.path.join(work_directory, "jsonl.db"))
+        db_utils.create_schema(conn.cursor())
+        timed("after: .jsonl pack", lambda: fact_import.import_pack(jsonl_path, conn))
+        conn.close()
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
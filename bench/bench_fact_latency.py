@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+# Per-fact selection latency: the old init_db() per call path vs pooled connections.
+#
+#   python3 bench/bench_fact_latency.py [iterations]
+
+import os, sys, time
+import shutil
+import sqlite3
+import tempfile
+import statistics
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+work_directory = tempfile.mkdtemp(prefix="fun_facts_bench_")
+bench_db_path = os.path.join(work_directory, "facts.db")
+os.environ["FUN_FACTS_DB"] = bench_db_path
+
+import main
+from src import db_utils, metrics, usage_log
+
+
+def legacy_init_db():
+    conn = sqlite3.connect(bench_db_path)
+    cursor = conn.cursor()
+    db_utils.create_schema(cursor)
+    cursor.execute("SELECT COUNT(id) FROM facts")
+    cursor.fetchone()
+    conn = sqlite3.connect(bench_db_path)
+    return conn, conn.cursor()
+
+def legacy_get_random_category():
+    conn, cursor = legacy_init_db()
+    cursor.execute("SELECT category FROM facts GROUP BY category ORDER BY RANDOM() LIMIT 1")
+    category = cursor.fetchone()[0]
+    conn.close()
+    return category
+
+def legacy_get_fun_fact(category=None):
+    conn, cursor = legacy_init_db()
+    if not category:
+        category = legacy_get_random_category()
+
+    cursor.execute("SELECT times_used FROM facts WHERE category = ? ORDER BY times_used ASC LIMIT 1", (category, ))
+    smallest_times_used = cursor.fetchone()[0]
+    cursor.execute("""SELECT id, times_used, category, description FROM facts
+                        WHERE category = ? AND times_used = ? ORDER BY RANDOM() LIMIT 1""", (category, smallest_times_used))
+    fact_id, times_used, category, fact = cursor.fetchone()
+    cursor.execute("UPDATE facts SET times_used = ?, update_ts = ? WHERE id = ?", (times_used + 1, int(time.time()), fact_id))
+    conn.commit()
+    conn.close()
+    return fact, category
+
+def run(name, fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    print(f"{name:<10} mean {statistics.mean(samples):7.3f} ms   "
+          f"p50 {samples[len(samples) // 2]:7.3f} ms   "
+          f"p95 {samples[int(len(samples) * 0.95)]:7.3f} ms")
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    try:
+        db_utils.bootstrap_db()
+        print(f"\n{iterations} facts per run")
+        run("before", legacy_get_fun_fact, iterations)
+        run("after", main.get_fun_fact, iterations)
+    finally:
+        # the histograms and print events go to the temporary database, not at exit after it is gone
+        metrics.flush()
+        usage_log.flush()
+        db_utils.close_connection()
+        shutil.rmtree(work_directory, ignore_errors=True)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# Simulated picks over uneven categories for every scheduler in
+# src/fact_scheduler.py: how evenly facts and categories get printed, the
+# shortest gap between two prints of the same fact, and picks per second.
+# Then checks that a transaction that is rolled back and retried (the
+# database was busy) leaves exactly one pick in the scheduler's memory.
+# Exits 1 if it does not.
+#
+#   python3 bench/bench_fact_scheduler.py [picks]
+
+import os, sys, time
+import random
+import shutil
+import sqlite3
+import tempfile
+import statistics
+from collections import Counter
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+from src import db_utils, fact_scheduler, fact_selector
+
+CATEGORY_SIZES = {"animals": 20, "space": 200, "science": 2000, "technology": 8000}
+NO_REPEAT = 20
+
+
+def seed(path):
+    conn = db_utils.open_connection(path)
+    db_utils.create_schema(conn.cursor())
+    now = int(time.time())
+    rows = [(category, f"Synthetic {category} fact number {n}.", 0, "bench", now, now)
+            for category, size in CATEGORY_SIZES.items() for n in range(size)]
+    conn.executemany("""INSERT INTO facts (category, description, times_used, owner, create_ts, update_ts)
+                        VALUES (?,?,?,?,?,?)""", rows)
+    conn.commit()
+    conn.close()
+
+def simulate(path, name, picks):
+    conn = db_utils.open_connection(path)
+    scheduler = fact_scheduler.create_scheduler(name, no_repeat=NO_REPEAT, rng=random.Random(1))
+
+    fact_counts = Counter()
+    category_counts = Counter()
+    last_seen = {}
+    min_gap = None
+
+    start = time.perf_counter()
+    for n in range(picks):
+        fact_id, _, category, _ = scheduler.select(conn)
+        fact_counts[fact_id] += 1
+        category_counts[category] += 1
+        if fact_id in last_seen:
+            gap = n - last_seen[fact_id]
+            min_gap = gap if min_gap is None else min(min_gap, gap)
+        last_seen[fact_id] = n
+    elapsed = time.perf_counter() - start
+    scheduler.save(conn)
+    conn.close()
+
+    total_facts = sum(CATEGORY_SIZES.values())
+    counts = [fact_counts.get(fact_id, 0) for fact_id in range(1, total_facts + 1)]
+    # coefficient of variation of prints per fact, 0 means perfectly even
+    spread = statistics.pstdev(counts) / statistics.mean(counts)
+    shares = " ".join(f"{category}={category_counts[category] / picks:5.1%}" for category in CATEGORY_SIZES)
+
+    print(f"{name:<11} {picks / elapsed:9.0f} picks/s   per-fact CV {spread:5.2f}   "
+          f"never printed {counts.count(0):5d}   min repeat gap {min_gap}   {shares}")
+
+def memory(scheduler):
+    decks = {category: list(deck) for category, deck in getattr(scheduler, "decks", {}).items()}
+    return list(scheduler.recent), decks
+
+def check_retry(path, name, failures):
+    # the first attempt of a select fails as if another process held the
+    # write lock; write_transaction rolls it back and runs it again
+    conn = db_utils.open_connection(path)
+    scheduler = fact_scheduler.create_scheduler(name, no_repeat=NO_REPEAT, rng=random.Random(2))
+    for _ in range(30):
+        scheduler.select(conn, "space")
+    recent, decks = memory(scheduler)
+
+    mark_used = fact_selector.mark_used
+    busy = [True]
+
+    def busy_once(cursor, fact_id, times_used):
+        if busy.pop() if busy else False:
+            raise sqlite3.OperationalError("database is locked")
+        mark_used(cursor, fact_id, times_used)
+
+    fact_selector.mark_used = busy_once
+    try:
+        fact_id = scheduler.select(conn, "space")[0]
+    finally:
+        fact_selector.mark_used = mark_used
+    after_recent, after_decks = memory(scheduler)
+    conn.close()
+
+    expected_recent = (recent + [fact_id])[-NO_REPEAT:]
+    if after_recent != expected_recent:
+        failures.append(f"{name}: window after a retried pick {after_recent[-3:]}, expected {expected_recent[-3:]}")
+    if decks and len(after_decks["space"]) != len(decks["space"]) - 1:
+        failures.append(f"{name}: a retried pick took {len(decks['space']) - len(after_decks['space'])} cards from the deck")
+
+if __name__ == "__main__":
+    picks = int(sys.argv[1]) if len(sys.argv) > 1 else 51_000
+    work_directory = tempfile.mkdtemp(prefix="fun_facts_bench_")
+
+    try:
+        total_facts = sum(CATEGORY_SIZES.values())
+        shares = " ".join(f"{category}={size / total_facts:5.1%}" for category, size in CATEGORY_SIZES.items())
+        print(f"\n{total_facts} facts, {picks} picks, no-repeat window {NO_REPEAT}, category sizes {shares}")
+        failures = []
+        for name in fact_scheduler.SCHEDULERS:
+            path = os.path.join(work_directory, f"{name}.db")
+            seed(path)
+            simulate(path, name, picks)
+            check_retry(path, name, failures)
+
+        for failure in failures:
+            print("FAIL", failure)
+        print("FAILED" if failures else "OK")
+        sys.exit(1 if failures else 0)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
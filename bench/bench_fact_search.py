@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# Searching 1M synthetic facts: LIKE '%...%' table scan vs the facts_fts index.
+#
+#   python3 bench/bench_fact_search.py [rows]
+
+import os, sys, time
+import random
+import shutil
+import tempfile
+import statistics
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+from src import db_utils, fact_search
+
+CATEGORIES = ["animals", "technology", "science", "programming", "space", "rail"]
+VOCABULARY_SIZE = 20000
+
+
+def make_vocabulary(rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(VOCABULARY_SIZE)]
+
+WORDS = make_vocabulary(random.Random(7))
+QUERIES = [WORDS[10], WORDS[200] + " " + WORDS[300], WORDS[4000], WORDS[12345] + " " + WORDS[6789], WORDS[19999][:4]]
+
+def seed(conn, rows):
+    rng = random.Random(42)
+    now = int(time.time())
+    cursor = conn.cursor()
+    batch = []
+    for n in range(rows):
+        description = " ".join(rng.choice(WORDS) for _ in range(12)) + f" {n}."
+        batch.append((rng.choice(CATEGORIES), description, 0, "bench", now, now))
+        if len(batch) == 10000:
+            cursor.executemany("""INSERT INTO facts (category, description, times_used, owner, create_ts, update_ts)
+                                    VALUES (?,?,?,?,?,?)""", batch)
+            batch = []
+    if batch:
+        cursor.executemany("""INSERT INTO facts (category, description, times_used, owner, create_ts, update_ts)
+                                VALUES (?,?,?,?,?,?)""", batch)
+    conn.commit()
+
+def like_search(cursor, text, limit=20):
+    cursor.execute("SELECT id, description FROM facts WHERE description LIKE ? LIMIT ?", (f"%{text}%", limit))
+    return cursor.fetchall()
+
+def like_search_all(cursor, text):
+    # what a ranked LIKE search has to do: find every match before sorting
+    cursor.execute("SELECT COUNT(id) FROM facts WHERE description LIKE ?", (f"%{text}%", ))
+    return cursor.fetchone()
+
+def measure(fn, iterations=5):
+    samples = []
+    for _ in range(iterations):
+        for query in QUERIES:
+            start = time.perf_counter()
+            fn(query)
+            samples.append((time.perf_counter() - start) * 1000)
+    return statistics.mean(samples), max(samples)
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    work_directory = tempfile.mkdtemp(prefix="fun_facts_bench_")
+    db_utils.database_path = os.path.join(work_directory, "facts.db")
+
+    try:
+        conn = db_utils.get_connection()
+        start = time.perf_counter()
+        seed(conn, rows)
+        print(f"\nseeded {rows} facts (FTS kept in sync by triggers) in {time.perf_counter() - start:.1f}s")
+
+        cursor = conn.cursor()
+        results = (
+            ("LIKE, first 20", lambda q: like_search(cursor, q.split()[0])),
+            ("LIKE, all matches", lambda q: like_search_all(cursor, q.split()[0])),
+            ("FTS5, top 20 by bm25", lambda q: fact_search.search_facts(cursor, q)),
+        )
+        for name, fn in results:
+            mean, worst = measure(fn)
+            print(f"{name:<24} mean {mean:9.2f} ms   max {worst:9.2f} ms")
+    finally:
+        db_utils.close_connection()
+        shutil.rmtree(work_directory, ignore_errors=True)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+# Least-used fact pick latency as the facts table grows to 1M synthetic rows.
+# The old ORDER BY RANDOM() selection is measured alongside for comparison.
+#
+#   python3 bench/bench_fact_selection.py [max_rows]
+
+import os, sys, time
+import shutil
+import tempfile
+import statistics
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+from src import db_utils
+from src.fact_selector import select_fact
+
+CATEGORIES = ["animals", "technology", "science", "programming", "space", "rail", "history", "food"]
+
+
+def legacy_select_fact(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT category FROM facts GROUP BY category ORDER BY RANDOM() LIMIT 1")
+    category = cursor.fetchone()[0]
+    cursor.execute("SELECT times_used FROM facts WHERE category = ? ORDER BY times_used ASC LIMIT 1", (category, ))
+    smallest_times_used = cursor.fetchone()[0]
+    cursor.execute("""SELECT id, times_used FROM facts
+                        WHERE category = ? AND times_used = ? ORDER BY RANDOM() LIMIT 1""", (category, smallest_times_used))
+    fact_id, times_used = cursor.fetchone()
+    cursor.execute("UPDATE facts SET times_used = ? WHERE id = ?", (times_used + 1, fact_id))
+    conn.commit()
+
+def grow(conn, target_rows):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(id) FROM facts")
+    current = cursor.fetchone()[0]
+    now = int(time.time())
+    rows = ((CATEGORIES[n % len(CATEGORIES)], f"Synthetic fact number {n}.", 0, "bench", now, now)
+            for n in range(current, target_rows))
+    cursor.executemany("""INSERT INTO facts (category, description, times_used, owner, create_ts, update_ts)
+                            VALUES (?,?,?,?,?,?)""", rows)
+    conn.commit()
+
+def measure(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95)]
+
+if __name__ == "__main__":
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    work_directory = tempfile.mkdtemp(prefix="fun_facts_bench_")
+    db_utils.database_path = os.path.join(work_directory, "facts.db")
+
+    try:
+        conn = db_utils.get_connection()
+        print(f"\n{'rows':>9}  {'pick mean':>10}  {'pick p95':>10}  {'legacy mean':>12}")
+        rows = 1_000
+        while rows <= max_rows:
+            grow(conn, rows)
+            mean, p95 = measure(lambda: select_fact(conn), 2000)
+            legacy_mean, _ = measure(lambda: legacy_select_fact(conn), 20)
+            print(f"{rows:>9}  {mean:>7.3f} ms  {p95:>7.3f} ms  {legacy_mean:>9.3f} ms")
+            rows *= 10
+    finally:
+        db_utils.close_connection()
+        shutil.rmtree(work_directory, ignore_errors=True)
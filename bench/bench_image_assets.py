@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# What printing costs with the full-size category PNGs vs the pre-built 1-bit
+# assets: the first ticket of a category in a fresh process (decode the image
+# and render the PDF), a warm ticket, the PDF size CUPS has to take and the
+# ESC/POS raster. Also times an incremental asset build with nothing changed,
+# the check every process pays on its first print.
+#
+#   python3 bench/bench_image_assets.py [--tickets 50]
+
+import os, sys, time
+import argparse
+import contextlib
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+from src import image_assets, ticket_cache, escpos_printer
+
+TEXT = "Animals:\n" + "An octopus has three hearts and blue blood\n" * 3
+
+
+def render(image_path, tickets):
+    import main
+
+    ticket_cache.clear()
+    escpos_printer._images.clear()
+    start = time.perf_counter()
+    pdf = main.render_pdf([(image_path, TEXT)])
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(tickets):
+        main.render_pdf([(image_path, TEXT)])
+    warm = (time.perf_counter() - start) / tickets
+
+    start = time.perf_counter()
+    escpos_printer.render_ticket(image_path, TEXT)
+    escpos_first = time.perf_counter() - start
+    return first, warm, len(pdf), escpos_first
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=50)
+    args = parser.parse_args()
+
+    built, _ = image_assets.build_assets()
+    start = time.perf_counter()
+    image_assets.build_assets()
+    print(f"\nincremental build, nothing changed: {(time.perf_counter() - start) * 1000:.2f}ms "
+          f"({len(built)} converted on this run)")
+
+    print(f"{'image':<8} {'first pdf':>10} {'warm pdf':>10} {'pdf size':>10} {'first escpos':>13}")
+    for name, image_path in (("source", os.path.join(image_assets.images_directory, "animals.png")),
+                             ("asset", image_assets.asset_path("animals"))):
+        # main prints a line for every PDF
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            first, warm, size, escpos_first = render(image_path, args.tickets)
+        print(f"{name:<8} {first * 1000:>8.1f}ms {warm * 1000:>8.1f}ms {size / 1024:>8.1f}kB {escpos_first * 1000:>11.1f}ms")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+# Menu frame cost against the number of categories: the old renderer (walk
+# every category, title-case it and rasterize the rows through PIL on every
+# frame) vs Menu.draw (labels formatted once per category refresh, row
+# bitmaps cached, only the visible window composited). Scrolls through the
+# whole list like someone holding the down button. "first pass" is one trip
+# through the list with an empty bitmap cache, right after a category refresh.
+# The old renderer costs most of a second a frame at 1000 categories, so it runs
+# fewer frames (--old-frames); frames are spread evenly over the list either
+# way, since its cost depends on how far down the selection is.
+#
+#   python3 bench/bench_menu_render.py [--frames 200] [--old-frames 10]
+
+import os, sys, time
+import argparse
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+from PIL import Image, ImageDraw
+
+from demon.menu import Menu, RANDOM_FACT, INFO_TEXT
+
+
+def draw_every_category(draw, categories, selected):
+    draw.rectangle((0, 0, 127, 31), outline="white", fill="black")
+    y = 2
+    for idx, item in enumerate(categories):
+        if idx >= selected:
+            if idx == selected:
+                draw.text((5, y), "* " + " ".join(str(item).split("_")).title(), fill="white")
+            else:
+                draw.text((10, y), "  " + " ".join(str(item).split("_")).title(), fill="white")
+            y += 10
+
+def per_frame_ms(frames, categories, render):
+    image = Image.new("1", (128, 32))
+    draw = ImageDraw.Draw(image)
+    step = max(1, len(categories) // frames)
+    start = time.perf_counter()
+    for frame in range(frames):
+        render(draw, frame * step % len(categories))
+    return (time.perf_counter() - start) / frames * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--old-frames", type=int, default=10, help="frames of the old renderer, at most --frames")
+    args = parser.parse_args()
+
+    print(f"\n{'categories':>10} {'per frame':>12} {'first pass':>12} {'cached':>10} {'speedup':>8}")
+    for size in (10, 100, 500, 1000):
+        categories = [RANDOM_FACT] + [f"category_number_{n}" for n in range(size - 2)] + [INFO_TEXT]
+        menu = Menu(status=None, submit=lambda category: None)
+        menu.set_categories(categories)
+
+        def cached(draw, selected):
+            menu.selected = selected
+            menu.draw(draw)
+
+        old = per_frame_ms(min(args.old_frames, args.frames), categories, lambda draw, selected: draw_every_category(draw, categories, selected))
+        cold = per_frame_ms(len(categories), categories, cached)
+        new = per_frame_ms(args.frames, categories, cached)
+        print(f"{size:>10} {old:>10.3f}ms {cold:>10.3f}ms {new:>8.3f}ms {old / new:>7.1f}x")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# Cost and correctness of the latency timers. Times timed() as a decorator
+# and as a context manager, then checks what they record: a decorated
+# function running on several threads at once must observe each call's own
+# duration, a flush that fails must keep its histograms for the next one, and
+# a forked child (gunicorn --preload) must start its own flusher. Exits 1 on a
+# wrong result.
+#
+#   python3 bench/bench_metrics.py [--calls 200000]
+
+import os, sys, time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+import contextlib
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+work_directory = tempfile.mkdtemp(prefix="fun_facts_metrics_")
+os.environ["FUN_FACTS_DB"] = os.path.join(work_directory, "facts.db")
+
+from src import db_utils, metrics
+
+# one slow call overlapped by several quick ones on other threads
+SLOW_CALL = 0.5
+QUICK_CALL = 0.05
+QUICK_CALLS = 4
+
+
+@metrics.timed("bench_sleep")
+def sleep(seconds):
+    time.sleep(seconds)
+
+@metrics.timed("bench_empty")
+def empty():
+    pass
+
+def per_call_us(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+def timed_block():
+    with metrics.timed("bench_block"):
+        pass
+
+def check_threads(failures):
+    slow = threading.Thread(target=sleep, args=(SLOW_CALL, ))
+    slow.start()
+    time.sleep(QUICK_CALL / 2)
+    quick = [threading.Thread(target=sleep, args=(QUICK_CALL, )) for _ in range(QUICK_CALLS)]
+    for thread in quick:
+        thread.start()
+    for thread in [slow] + quick:
+        thread.join()
+
+    histogram = metrics._pending["bench_sleep"]
+    expected = SLOW_CALL + QUICK_CALLS * QUICK_CALL
+    print(f"overlapping calls: {histogram.count} observed, sum {histogram.sum:.3f}s, expected about {expected:.3f}s")
+    if histogram.count != QUICK_CALLS + 1:
+        failures.append(f"{histogram.count} calls observed, expected {QUICK_CALLS + 1}")
+    if not expected <= histogram.sum < expected + 0.1:
+        failures.append(f"overlapping calls summed to {histogram.sum:.3f}s, expected about {expected:.3f}s")
+    if histogram.buckets[metrics.BUCKETS.index(1.0)] != 1:
+        failures.append("the slow call is not in the 1s bucket")
+
+def check_failed_flush(failures):
+    # a database without stage_histograms makes the write fail
+    broken = sqlite3.connect(os.path.join(work_directory, "empty.db"), isolation_level=None)
+    pending = metrics._pending["bench_sleep"].count
+    with contextlib.suppress(sqlite3.OperationalError):
+        metrics.flush(broken)
+    kept = metrics._pending.get("bench_sleep")
+    if not kept or kept.count != pending:
+        failures.append("a failed flush dropped its histograms")
+
+    metrics.flush()
+    stored = metrics.load().get("bench_sleep")
+    print(f"after a failed flush: {stored.count if stored else 0} of {pending} calls stored by the next one")
+    if not stored or stored.count != pending:
+        failures.append("the histograms kept from a failed flush were not stored by the next one")
+
+def check_fork(failures):
+    metrics.start_flusher()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        started = metrics._flusher is None
+        metrics.start_flusher()
+        os.write(write, b"1" if started and metrics._flusher.is_alive() else b"0")
+        os._exit(0)
+    os.close(write)
+    ok = os.read(read, 1) == b"1"
+    os.waitpid(pid, 0)
+    print(f"forked child starts its own flusher: {ok}")
+    if not ok:
+        failures.append("a forked child did not start its own flusher")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            db_utils.bootstrap_db()
+        metrics.reset()
+
+        print(f"\ndecorator      {per_call_us(empty, args.calls):6.2f} us per call")
+        print(f"with block     {per_call_us(timed_block, args.calls):6.2f} us per call")
+        metrics.reset()
+
+        failures = []
+        check_threads(failures)
+        check_failed_flush(failures)
+        check_fork(failures)
+
+        for failure in failures:
+            print("FAIL", failure)
+        print("FAILED" if failures else "OK")
+        metrics.flush()
+        sys.exit(1 if failures else 0)
+    finally:
+        db_utils.close_connection()
+        shutil.rmtree(work_directory, ignore_errors=True)
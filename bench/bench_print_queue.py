@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+# Print queue behaviour with a null printer: what a submit costs, that a
+# double press shares one job whether the worker has picked it up yet or not,
+# that a button press returns at once while the database is locked, and that
+# the worker keeps going through database errors. Exits 1 on a wrong result.
+#
+#   python3 bench/bench_print_queue.py [--submits 2000]
+
+import os, sys, time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import contextlib
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+work_directory = tempfile.mkdtemp(prefix="fun_facts_queue_")
+os.environ["FUN_FACTS_DB"] = os.path.join(work_directory, "facts.db")
+
+from src import db_utils, print_queue, metrics
+
+
+def clear_jobs():
+    db_utils.write_transaction(lambda cursor: cursor.execute("DELETE FROM print_jobs"))
+
+def check_coalescing(failures):
+    clear_jobs()
+    first = print_queue.submit("animals", source="buttons")
+    if print_queue.submit("animals", source="buttons") != first:
+        failures.append("a second press while queued made a new job")
+
+    claimed = print_queue.claim_next_job()
+    if not claimed or claimed["id"] != first:
+        failures.append(f"claimed {claimed}, expected job {first}")
+    if print_queue.submit("animals", source="buttons") != first:
+        failures.append("a second press after the worker claimed the job made a new job")
+
+    if print_queue.submit("space", source="buttons") == first:
+        failures.append("a press for another category joined the job")
+    if print_queue.submit("animals", source="web", count=3) == first:
+        failures.append("a batch joined a single ticket job")
+
+    print_queue.finish_job(claimed, True)
+    if print_queue.submit("animals", source="buttons") == first:
+        failures.append("a press after the job was printed joined it")
+
+    # outside the window a press is a new print
+    db_utils.write_transaction(lambda cursor: cursor.execute(
+        "UPDATE print_jobs SET created_ts = created_ts - ?", (print_queue.COALESCE_WINDOW + 1, )))
+    db_utils.write_transaction(lambda cursor: cursor.execute(
+        "UPDATE print_jobs SET status = ? WHERE id = ?", (print_queue.PRINTING, first)))
+    if print_queue.submit("animals", source="buttons") == first:
+        failures.append("a press outside the coalesce window joined the printing job")
+
+    cursor = db_utils.get_connection().cursor()
+    cursor.execute("SELECT COUNT(id) FROM print_jobs")
+    print(f"coalescing: {cursor.fetchone()[0]} jobs for 8 submits")
+
+def check_submitter(failures):
+    # another connection holds the write lock while the buttons are pressed
+    clear_jobs()
+    submitted = []
+    submitter = print_queue.Submitter(on_submit=submitted.append)
+    submitter.start()
+    blocker = sqlite3.connect(db_utils.database_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.perf_counter()
+        submitter.submit("animals")
+        submitter.submit("animals")
+        press_ms = (time.perf_counter() - start) * 1000
+        time.sleep(0.5)
+        under_lock = len(submitted)
+    finally:
+        blocker.rollback()
+        blocker.close()
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline and len(submitted) < 2:
+        time.sleep(0.05)
+    submitter.stop()
+
+    print(f"presses with the database locked: {press_ms:.3f} ms for two, "
+          f"{under_lock} written under the lock, jobs {submitted} after it")
+    if press_ms > 10:
+        failures.append(f"two presses took {press_ms:.1f} ms with the database locked")
+    if under_lock:
+        failures.append("a job was written while another connection held the lock")
+    if len(submitted) != 2 or submitted[0] != submitted[1]:
+        failures.append(f"double press after the lock made jobs {submitted}, expected one job twice")
+
+def check_worker_errors(failures):
+    # the database fails a few times on claim and on finish
+    clear_jobs()
+    fails = {"claim": 3, "finish": 2}
+    claim, finish = print_queue.claim_next_job, print_queue.finish_job
+
+    def flaky(name, fn):
+        def call(*args):
+            if fails[name]:
+                fails[name] -= 1
+                raise sqlite3.OperationalError("database is locked")
+            return fn(*args)
+        return call
+
+    printed = []
+    worker = print_queue.PrintWorker(lambda category, count=1: printed.append(category) or True)
+    backoff = print_queue.MAX_ERROR_BACKOFF
+    print_queue.MAX_ERROR_BACKOFF = 0.2
+    print_queue.claim_next_job, print_queue.finish_job = flaky("claim", claim), flaky("finish", finish)
+    try:
+        job_id = print_queue.submit("animals")
+        worker.start()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and print_queue.get_job(job_id)["status"] != print_queue.DONE:
+            time.sleep(0.05)
+    finally:
+        print_queue.claim_next_job, print_queue.finish_job = claim, finish
+        print_queue.MAX_ERROR_BACKOFF = backoff
+        worker.stop()
+
+    job = print_queue.get_job(job_id)
+    print(f"database errors: worker alive {worker.is_alive()}, job {job['status']} after {len(printed)} print")
+    if job["status"] != print_queue.DONE or printed != ["animals"]:
+        failures.append(f"job {job['status']}, printed {printed}: the worker did not survive database errors")
+
+def submit_cost(submits):
+    clear_jobs()
+    start = time.perf_counter()
+    for n in range(submits):
+        print_queue.submit(f"category-{n}", source="buttons")
+    return (time.perf_counter() - start) / submits * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--submits", type=int, default=2000)
+    args = parser.parse_args()
+
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            db_utils.bootstrap_db()
+
+        print(f"\nsubmit: {submit_cost(args.submits):.3f} ms each")
+        failures = []
+        check_coalescing(failures)
+        check_submitter(failures)
+        check_worker_errors(failures)
+
+        for failure in failures:
+            print("FAIL", failure)
+        print("FAILED" if failures else "OK")
+        sys.exit(1 if failures else 0)
+    finally:
+        # the worker's histograms go to the temporary database, not at exit after it is gone
+        metrics.flush()
+        db_utils.close_connection()
+        shutil.rmtree(work_directory, ignore_errors=True)
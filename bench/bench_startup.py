@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Import cost of the buttons demon up to its first frame, of main.py, and of
+# the modules main.py now defers to the first print, measured with python -X
+# importtime in fresh interpreters. The demon is imported for real with the
+# sim hardware backend and stopped with a Ctrl-C once the first frame reaches
+# the virtual OLED, so whatever it loads before that is counted. Exits 1 when
+# a startup set is over budget, so it can run as a check on the Pi.
+#
+#   python3 bench/bench_startup.py [--budget-ms 400] [--top 8]
+
+import os, sys
+import shutil
+import argparse
+import tempfile
+import importlib.util
+import subprocess
+import statistics
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the demon's startup thread opens a database behind the first frame
+work_directory = tempfile.mkdtemp(prefix="fun_facts_startup_")
+
+# (name, modules, checked against the budget)
+IMPORT_SETS = (
+    ("demon, first frame", ["demon.buttons_demon"], True),
+    ("main", ["main"], True),
+    ("first print (deferred)", ["cups", "reportlab.pdfgen.canvas"], False),
+)
+
+# the demon's display loop never returns, its first recorded frame ends it
+STOP_AT_FIRST_FRAME = """
+import os, signal
+from demon import hardware
+record_frame = hardware.VirtualDisplay.record_frame
+def stop(self, image, changed):
+    record_frame(self, image, changed)
+    if changed:
+        os.kill(os.getpid(), signal.SIGINT)
+hardware.VirtualDisplay.record_frame = stop
+"""
+
+# (environment, code run before the imports) for sets that need them
+SETUP = {
+    "demon, first frame": ({"FUN_FACTS_HARDWARE": "sim", "FUN_FACTS_DB": os.path.join(work_directory, "facts.db")},
+                           STOP_AT_FIRST_FRAME),
+}
+
+
+def available(module):
+    sys.path.insert(0, root_directory)
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ImportError:
+        return False
+    finally:
+        sys.path.remove(root_directory)
+
+def import_times(modules, env=None, prelude=""):
+    # cumulative microseconds per top-level import, from python -X importtime
+    code = prelude + "\n".join(f"import {module}" for module in modules)
+    env = dict(os.environ, **{"FUN_FACTS_DB": os.devnull, **(env or {})})
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=root_directory,
+                            stdin=subprocess.DEVNULL, capture_output=True, text=True, env=env)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.append((int(cumulative), name.rstrip()))
+    return times
+
+def measure(modules, env=None, prelude="", runs=5):
+    # the first run warms the .pyc files, the median of the rest is reported
+    samples = []
+    for _ in range(runs + 1):
+        times = import_times(modules, env, prelude)
+        top_level = [(cumulative, name.strip()) for cumulative, name in times if not name.startswith("  ")]
+        samples.append((sum(cumulative for cumulative, _ in top_level) / 1000, times))
+    samples = samples[1:]
+    median = statistics.median(total for total, _ in samples)
+    return median, min(samples, key=lambda sample: abs(sample[0] - median))[1]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup import budget check")
+    parser.add_argument("--budget-ms", type=float, default=400.0)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    try:
+        over_budget = False
+        print()
+        for name, modules, budgeted in IMPORT_SETS:
+            missing = [module for module in modules if not available(module)]
+            present = [module for module in modules if module not in missing]
+            if not present:
+                print(f"{name:<24} skipped, not installed: {', '.join(missing)}\n")
+                continue
+
+            try:
+                total_ms, times = measure(present, *SETUP.get(name, ()))
+            except RuntimeError as e:
+                print(f"{name:<24} skipped, {e}\n")
+                continue
+            verdict = ""
+            if budgeted:
+                over = total_ms > args.budget_ms
+                over_budget = over_budget or over
+                verdict = f"   {'OVER' if over else 'ok'} (budget {args.budget_ms:.0f} ms)"
+            print(f"{name:<24} {total_ms:8.1f} ms{verdict}")
+            if missing:
+                print(f"  not installed here: {', '.join(missing)}")
+            for cumulative, module in sorted(times, reverse=True)[:args.top]:
+                print(f"  {cumulative / 1000:8.1f} ms  {module.strip()}")
+            print()
+
+        sys.exit(1 if over_budget else 0)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
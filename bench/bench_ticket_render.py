@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+# Ticket render latency: the old create_pdf (image decoded and text wrapped on
+# every print) vs the ticket cache.
+#
+#   python3 bench/bench_ticket_render.py [iterations]
+
+import os, sys, time
+import shutil
+import tempfile
+import textwrap
+import statistics
+from datetime import datetime
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+from reportlab.pdfgen import canvas
+from reportlab.lib import utils
+
+import main
+from src import ticket_cache
+
+CATEGORY = "animals"
+FACT_ID = 1
+FACT = "The tongue of a blue whale weighs as much as an elephant, and its heart is the size of a small car."
+
+
+def legacy_render(file_path):
+    width, height = 200, 200
+    text = " ".join(CATEGORY.split("_")).title() + ':\n' + textwrap.fill(FACT, 40) + '\n' * 4
+    image_path = os.path.join(root_directory, "src", "images", CATEGORY + ".png")
+
+    c = canvas.Canvas(file_path, pagesize=(width, height))
+    if not os.path.exists(image_path):
+        image_path = os.path.join(root_directory, "src", "images", "about_me.png")
+    c.drawImage(utils.ImageReader(image_path), 75, height - 50, width=50, height=50)
+    text_object = c.beginText(7, height - 65)
+    text_object.setFont("Helvetica", 10)
+    for line in text.split("\n"):
+        text_object.textLine(line)
+    c.drawText(text_object)
+    c.setFont('Helvetica', 7.5)
+    c.drawString(7, height - 140, datetime.now().strftime("%H:%M:%S %d %B %Y"))
+    c.save()
+
+def cached_render(file_path):
+    text = ticket_cache.get_wrapped_text(FACT_ID, CATEGORY, FACT)
+    image_path, _ = ticket_cache.get_prologue(CATEGORY)
+    main.create_pdf(file_path, image_path, text)
+
+def run(name, fn, file_path, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(file_path)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(f"{name:<8} mean {statistics.mean(samples):8.3f} ms   p95 {samples[int(len(samples) * 0.95)]:8.3f} ms")
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    work_directory = tempfile.mkdtemp(prefix="fun_facts_bench_")
+    file_path = os.path.join(work_directory, "ticket.pdf")
+
+    try:
+        print(f"\n{iterations} tickets per run")
+        run("before", legacy_render, file_path, iterations)
+        run("after", cached_render, file_path, iterations)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
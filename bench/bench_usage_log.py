@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# Dashboard cost against the length of the print history. Appends print events
+# in time order (one print every --interval seconds, ending now) through the
+# same batched write the demon's flusher does, and at every checkpoint times
+# the /stats summary, which reads the rollups, against the same numbers summed
+# from print_events. The summary should stay flat while the raw query grows
+# with the history. At the end the incrementally maintained rollups must match
+# a rebuild from the events. Exits 1 on a mismatch.
+#
+#   python3 bench/bench_usage_log.py [--events 1000000] [--interval 30]
+
+import os, sys, time
+import shutil
+import random
+import argparse
+import tempfile
+import statistics
+import contextlib
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+work_directory = tempfile.mkdtemp(prefix="fun_facts_usage_")
+os.environ["FUN_FACTS_DB"] = os.path.join(work_directory, "facts.db")
+
+WRITE_BATCH = 500
+
+
+def timed(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+def summed_from_events(cursor, now, hours=48, days=7, top=10):
+    # what the dashboard would cost without rollups
+    first_hour = now // usage_log.HOUR * usage_log.HOUR - (hours - 1) * usage_log.HOUR
+    first_day = now // usage_log.DAY * usage_log.DAY - (days - 1) * usage_log.DAY
+    cursor.execute(f"""SELECT CAST(ts AS INTEGER) / {usage_log.HOUR}, COUNT(id) FROM print_events
+                        WHERE ts >= ? GROUP BY 1""", (first_hour, ))
+    cursor.fetchall()
+    cursor.execute("SELECT category, COUNT(id) FROM print_events WHERE ts >= ? GROUP BY 1", (first_day, ))
+    cursor.fetchall()
+    cursor.execute("""SELECT fact_id, COUNT(id) FROM print_events WHERE ts >= ?
+                        GROUP BY 1 ORDER BY 2 DESC LIMIT ?""", (first_day, top))
+    cursor.fetchall()
+    cursor.execute("SELECT category, COUNT(id) FROM print_events GROUP BY 1")
+    cursor.fetchall()
+
+def snapshot(cursor):
+    tables = {}
+    for table in ("usage_hourly", "usage_categories", "usage_facts_daily"):
+        cursor.execute(f"SELECT * FROM {table} ORDER BY 1, 2")
+        tables[table] = cursor.fetchall()
+    return tables
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--interval", type=float, default=30.0, help="seconds between prints in the history")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    from src import db_utils, usage_log
+
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            db_utils.bootstrap_db()
+        conn = db_utils.get_connection()
+        cursor = conn.cursor()
+        facts = cursor.execute("SELECT id, category FROM facts").fetchall()
+        rng = random.Random(7)
+
+        # the record() path the demon takes, buffered and written by flush()
+        start = time.perf_counter()
+        for fact_id, category in rng.choices(facts, k=10000):
+            usage_log.record(fact_id, category)
+        record_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        usage_log.flush(conn)
+        flush_elapsed = time.perf_counter() - start
+        print(f"\nrecord(): {record_elapsed / 10000 * 1e6:.2f}us per print, "
+              f"flush of 10000 events with rollups {flush_elapsed * 1000:.0f}ms")
+        db_utils.write_transaction(lambda cursor: [cursor.execute(f"DELETE FROM {table}") for table in
+                                                   ("print_events", "usage_hourly", "usage_categories", "usage_facts_daily")])
+
+        checkpoints = sorted({n for n in (10000, 100000, 1000000, 3000000, args.events) if n <= args.events})
+        now = int(time.time())
+        first_ts = now - args.events * args.interval
+
+        print(f"\n{'events':>9} {'history':>9} {'append/s':>9} {'summary ms':>11} {'from events ms':>15}")
+        written, write_time = 0, 0.0
+        for checkpoint in checkpoints:
+            while written < checkpoint:
+                count = min(WRITE_BATCH, checkpoint - written)
+                events = [(first_ts + (written + n) * args.interval, *rng.choice(facts)) for n in range(count)]
+                start = time.perf_counter()
+                db_utils.write_transaction(lambda cursor: usage_log.write_events(cursor, events), conn)
+                write_time += time.perf_counter() - start
+                written += count
+
+            # "now" is the time of the last print so far, the history only grows backwards
+            present = int(first_ts + written * args.interval)
+            rollup_ms = timed(lambda: usage_log.summary(conn, now=present), args.runs)
+            events_ms = timed(lambda: summed_from_events(cursor, present), max(args.runs // 5, 1))
+            history_days = written * args.interval / usage_log.DAY
+            print(f"{written:>9} {history_days:>8.0f}d {written / write_time:>9.0f} {rollup_ms:>11.2f} {events_ms:>15.1f}")
+
+        failures = []
+        incremental = snapshot(cursor)
+        rebuilt_from = usage_log.rebuild(conn)
+        if rebuilt_from != written:
+            failures.append(f"print_events has {rebuilt_from} rows, {written} were written")
+        if snapshot(cursor) != incremental:
+            failures.append("incremental rollups differ from a rebuild")
+        total = sum(row["prints"] for row in usage_log.summary(conn, now=present)["all_categories"])
+        if total != written:
+            failures.append(f"all time per category adds up to {total}, expected {written}")
+
+        for failure in failures:
+            print("FAIL", failure)
+        print("FAILED" if failures else "OK")
+        sys.exit(1 if failures else 0)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+# Requests per second and bytes on the wire for the admin pages, served by the
+# real app over HTTP from a local threaded server: a browser without a cached
+# copy (full render, plain and gzip) against a browser revalidating its copy
+# with If-None-Match (304 straight from the facts_version counter), for the
+# fact listing, the index page and a fingerprinted asset. Every request also
+# runs as a baseline with the app's HTTP caching and compression turned off,
+# the way the pages were served before: no ETag to revalidate against, no
+# gzip, only Flask's own conditional answers for static files.
+#
+#   python3 bench/bench_web_server.py [--seconds 3] [--threads 4]
+
+import os, sys, time
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+import http.client
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+sys.path.append(os.path.join(root_directory, "demon", "web_server"))
+
+work_directory = tempfile.mkdtemp(prefix="fun_facts_web_")
+os.environ["FUN_FACTS_DB"] = os.path.join(work_directory, "facts.db")
+
+
+def login(port):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    connection.request("POST", "/login", body="username=admin&password=password",
+                       headers={"Content-Type": "application/x-www-form-urlencoded"})
+    response = connection.getresponse()
+    response.read()
+    return response.getheader("Set-Cookie").split(";")[0]
+
+def fetch(port, path, headers):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    connection.request("GET", path, headers=headers)
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response, body
+
+def run(port, path, headers, seconds, threads):
+    counts, sizes = [0] * threads, [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(idx):
+        while time.perf_counter() < deadline:
+            response, body = fetch(port, path, headers)
+            if response.status not in (200, 304):
+                raise RuntimeError(f"{path}: HTTP {response.status}")
+            counts[idx] += 1
+            sizes[idx] += len(body)
+
+    workers = [threading.Thread(target=worker, args=(idx, )) for idx in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return sum(counts) / elapsed, sum(sizes) / max(sum(counts), 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    import logging
+    from werkzeug.serving import make_server
+    from src import db_utils
+    import fun_fact_web_server
+
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            db_utils.bootstrap_db()
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        app = fun_fact_web_server.create_app()
+        app.config["WTF_CSRF_ENABLED"] = False
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        port = server.server_port
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        cookie = login(port)
+        asset = "/static/css/admin.css?v=" + fun_fact_web_server.fingerprint_files(fun_fact_web_server.static_directory)["css/admin.css"]
+
+        def measure(path, enabled):
+            app.config["HTTP_CACHING"] = app.config["COMPRESS_RESPONSES"] = enabled
+            plain = {"Cookie": cookie}
+            response, _ = fetch(port, path, plain)
+            etag = response.getheader("ETag")
+            revalidate = dict(plain, **{"If-None-Match": etag}) if etag else plain
+            return [run(port, path, headers, args.seconds, args.threads)
+                    for headers in (plain, dict(plain, **{"Accept-Encoding": "gzip"}), revalidate)]
+
+        print(f"\n{'':<42} {'baseline':>17} {'cached, compressed':>19}")
+        print(f"{'request':<42} {'req/s':>8} {'bytes':>8} {'req/s':>9} {'bytes':>9}")
+        for name, path in (("fact listing", "/api/facts?limit=100"), ("index page", "/"), ("admin.css", asset)):
+            baseline, optimized = measure(path, False), measure(path, True)
+            for variant, (old_rate, old_size), (rate, size) in zip(
+                    ("no cached copy", "no cached copy, gzip", "revalidated, 304"), baseline, optimized):
+                print(f"{name + ', ' + variant:<42} {old_rate:>8.0f} {old_size:>8.0f} {rate:>9.0f} {size:>9.0f}")
+        print("(admin.css is immutable: after the first load a browser does not ask again at all)")
+        server.shutdown()
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+# A fleet on one box: the Flask app serving /fleet/* from its own database
+# and N client machines, each a process with its own facts.db. Every client
+# syncs, prints online, prints with the server unreachable, comes back, then
+# every client must see edits made on the server: a new description, a fact
+# moved to another existing category and a changed times_used. Checks that the server's
+# times_used total grew by exactly the number of prints the clients made (a
+# resent batch is not counted twice) and that every client ends up with the
+# server's counts. Before its first sync every client prints a fact of its
+# own and a fact the server also has under another id: afterwards the print
+# history must point at the server's id, and the other prints at no fact.
+# Exits 1 on any failure.
+#
+#   python3 bench/fleet_simulation.py [--clients 4] [--prints 40]
+
+import os, sys, time
+import shutil
+import socket
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+TOKEN = "simulation-token"
+EDITED = "Edited on the fleet server"
+# times_used added on the server to the fact it moves to another category
+SERVER_USES = 5
+UNREACHABLE = "http://127.0.0.1:9"
+# printed on the clients before their first sync
+SHARED_CATEGORY = "shared"
+SHARED = "A fact the server has too"
+LOCAL_ONLY = "A fact only this machine has"
+
+
+def serve(database, port):
+    os.environ["FUN_FACTS_DB"] = database
+    os.environ["FUN_FACTS_FLEET_TOKEN"] = TOKEN
+    sys.path.append(os.path.join(root_directory, "demon", "web_server"))
+    import logging
+    from werkzeug.serving import make_server
+    from src import db_utils
+    import fun_fact_web_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    db_utils.bootstrap_db()
+    make_server("127.0.0.1", port, fun_fact_web_server.create_app(), threaded=True).serve_forever()
+
+def client(index, database, server, prints, edited, synced, results, moved_id, shared_id):
+    os.environ["FUN_FACTS_DB"] = database
+    os.environ["FUN_FACTS_FLEET_SERVER"] = server
+    os.environ["FUN_FACTS_FLEET_TOKEN"] = TOKEN
+    os.environ["FUN_FACTS_MACHINE"] = f"machine-{index}"
+    import contextlib
+    from src import db_utils, fact_selector, fleet, usage_log
+
+    report = {"index": index, "printed": 0, "offline_failures": 0, "sync_times": [], "errors": []}
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            db_utils.bootstrap_db()
+        conn = db_utils.get_connection()
+        fleet_client = fleet.FleetClient()
+
+        def sync():
+            start = time.perf_counter()
+            fleet_client.sync()
+            report["sync_times"].append(time.perf_counter() - start)
+
+        # history recorded before joining the fleet, under this machine's ids
+        for description, count in ((LOCAL_ONLY, 1), (SHARED, 2)):
+            local_id = db_utils.write_transaction(lambda cursor: cursor.execute(
+                "INSERT INTO facts (category, description, times_used) VALUES (?, ?, 0)",
+                (SHARED_CATEGORY, description)).lastrowid)
+            for _ in range(count):
+                usage_log.record(local_id, SHARED_CATEGORY)
+        usage_log.flush()
+
+        sync()
+        report["history"] = (
+            conn.execute("SELECT COUNT(id) FROM print_events WHERE fact_id = ?", (shared_id, )).fetchone()[0],
+            conn.execute("SELECT COUNT(id) FROM print_events WHERE fact_id IS NULL").fetchone()[0],
+            conn.execute("SELECT SUM(prints) FROM usage_facts_daily WHERE fact_id = ?", (shared_id, )).fetchone()[0],
+            conn.execute("SELECT COUNT(fact_id) FROM usage_facts_daily WHERE fact_id NOT IN (SELECT id FROM facts)")
+                .fetchone()[0],
+        )
+        for n in range(prints):
+            if fact_selector.select_fact(conn):
+                report["printed"] += 1
+            if n % 10 == 9:
+                sync()
+
+        # the server goes away, prints go on from the local table
+        fleet_client.server = UNREACHABLE
+        for n in range(prints):
+            if fact_selector.select_fact(conn):
+                report["printed"] += 1
+            if n % 10 == 9:
+                try:
+                    fleet_client.sync()
+                except OSError:
+                    report["offline_failures"] += 1
+        fleet_client.server = server
+        sync()
+
+        # a lost reply: the same batch again must not be counted twice
+        fact_selector.select_fact(conn)
+        report["printed"] += 1
+        batch, deltas = fleet_client.take_batch()
+        fleet_client.request("/fleet/usage", {"machine": fleet_client.machine, "batch": batch, "deltas": deltas})
+        sync()
+        resent = fleet_client.request("/fleet/usage", {"machine": fleet_client.machine, "batch": batch, "deltas": deltas})
+        if resent["applied"]:
+            report["errors"].append("resent batch was applied twice")
+
+        synced.put(index)
+        edited.wait(60)
+        sync()
+        report["edit_seen"] = conn.execute("SELECT description FROM facts WHERE id = 1").fetchone()[0] == EDITED
+        report["moved"] = conn.execute("SELECT category, times_used FROM facts WHERE id = ?", (moved_id, )).fetchone()
+        report["local_total"] = conn.execute("SELECT SUM(times_used) FROM facts").fetchone()[0]
+    except Exception as e:
+        report["errors"].append(repr(e))
+        synced.put(index)
+    results.put(report)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("fleet server did not start")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--prints", type=int, default=40, help="prints per client online, and again offline")
+    args = parser.parse_args()
+
+    work_directory = tempfile.mkdtemp(prefix="fun_facts_fleet_")
+    context = multiprocessing.get_context("spawn")
+    server_database = os.path.join(work_directory, "server.db")
+    port = free_port()
+    server_process = context.Process(target=serve, args=(server_database, port), daemon=True)
+    try:
+        server_process.start()
+        wait_for(port)
+        total_before = sqlite3.connect(server_database).execute("SELECT SUM(times_used) FROM facts").fetchone()[0] or 0
+
+        # the last fact of the first category moves into the second one
+        server = sqlite3.connect(server_database, timeout=10)
+        first, second = [row[0] for row in server.execute(
+            "SELECT name FROM categories WHERE fact_count > 0 ORDER BY name LIMIT 2")]
+        moved_id = server.execute("SELECT MAX(id) FROM facts WHERE category = ?", (first, )).fetchone()[0]
+        with server:
+            shared_id = server.execute("INSERT INTO facts (category, description, times_used) VALUES (?, ?, 0)",
+                                       (SHARED_CATEGORY, SHARED)).lastrowid
+
+        edited, synced, results = context.Event(), context.Queue(), context.Queue()
+        clients = [context.Process(target=client, args=(n, os.path.join(work_directory, f"client-{n}.db"),
+                                                        f"http://127.0.0.1:{port}", args.prints, edited, synced, results,
+                                                        moved_id, shared_id))
+                   for n in range(args.clients)]
+        start = time.perf_counter()
+        for process in clients:
+            process.start()
+        for _ in clients:
+            synced.get(timeout=300)
+
+        # every client has pushed everything, now edits on the server
+        with server:
+            server.execute("UPDATE facts SET description = ? WHERE id = 1", (EDITED, ))
+            server.execute("UPDATE facts SET category = ?, times_used = times_used + ? WHERE id = ?",
+                           (second, SERVER_USES, moved_id))
+        server_total = server.execute("SELECT SUM(times_used) FROM facts").fetchone()[0]
+        moved = server.execute("SELECT category, times_used FROM facts WHERE id = ?", (moved_id, )).fetchone()
+        edited.set()
+        reports = [results.get(timeout=120) for _ in clients]
+        for process in clients:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        failures, sync_times = [], []
+        printed = sum(report["printed"] for report in reports)
+        for report in reports:
+            failures += [f"client {report['index']}: {error}" for error in report["errors"]]
+            sync_times += report["sync_times"]
+            if report["errors"]:
+                continue
+            if not report["offline_failures"]:
+                failures.append(f"client {report['index']}: syncing with the server down did not fail")
+            if not report["edit_seen"]:
+                failures.append(f"client {report['index']}: never received the server's edit")
+            if tuple(report["moved"] or ()) != moved:
+                failures.append(f"client {report['index']}: moved fact is {report['moved']}, server has {moved}")
+            if report["history"] != (2, 1, 2, 0):
+                failures.append(f"client {report['index']}: history after the first sync (prints of the shared fact, "
+                                f"prints without a fact, shared fact rollup, rollup rows without a fact) "
+                                f"{report['history']}, expected (2, 1, 2, 0)")
+            if report["local_total"] != server_total:
+                failures.append(f"client {report['index']}: local times_used total {report['local_total']}, server {server_total}")
+        if server_total - total_before != printed + SERVER_USES:
+            failures.append(f"server counted {server_total - total_before} prints, clients made {printed}")
+
+        sync_times.sort()
+        print(f"\n{args.clients} clients, {printed} prints in {elapsed:.2f}s, {len(sync_times)} syncs")
+        if sync_times:
+            print(f"sync round trip: {sum(sync_times) / len(sync_times) * 1000:.1f}ms average, "
+                  f"{sync_times[int(len(sync_times) * 0.95)] * 1000:.1f}ms p95, first (full pull) {max(sync_times) * 1000:.1f}ms")
+        for failure in failures:
+            print("FAIL", failure)
+        print("FAILED" if failures else "OK")
+        sys.exit(1 if failures else 0)
+    finally:
+        server_process.terminate()
+        shutil.rmtree(work_directory, ignore_errors=True)
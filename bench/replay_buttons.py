@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# Replays recorded button edge traces through the software debouncer and
+# checks the presses and hold repeats they turn into. A trace is the
+# FUN_FACTS_BUTTON_SCRIPT format ("<seconds> <button> press|release" per
+# line), which is also what FUN_FACTS_BUTTON_TRACE records on the machine,
+# with the expected actions in a "# expect:" line: "down+" is a hold repeat,
+# "*N" repeats a token. The replay runs on the trace's own timestamps, so it
+# is exact and instant. Exits 1 when a trace does not give what it expects.
+#
+# --live plays the traces in real time through the demon's pieces (button
+# input thread, Menu, Display on a virtual OLED) and reports the
+# button_edge_to_action and button_edge_to_frame histograms.
+#
+#   python3 bench/replay_buttons.py [--live] [--timing JSON] [trace.txt ...]
+
+import os, sys, time
+import glob
+import json
+import shutil
+import argparse
+import tempfile
+import threading
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+from demon import hardware
+from demon.buttons import ButtonInput, load_timing, replay
+
+
+def read_trace(path):
+    with open(path) as file:
+        lines = file.readlines()
+    expected = []
+    for line in lines:
+        if line.startswith("# expect:"):
+            for token in line.split(":", 1)[1].split():
+                token, _, count = token.partition("*")
+                expected += [token] * int(count or 1)
+    return hardware.parse_script(lines), expected
+
+def action_names(actions):
+    return [name + "+" if repeat else name for _, name, repeat in actions]
+
+def compact(names):
+    # down down+ down+ down+ -> down down+*3
+    tokens = []
+    for name in names:
+        if tokens and tokens[-1][0] == name:
+            tokens[-1][1] += 1
+        else:
+            tokens.append([name, 1])
+    return " ".join(name if count == 1 else f"{name}*{count}" for name, count in tokens)
+
+def play_live(paths, timing):
+    from src import db_utils, metrics
+    from src.machine_status import status
+    from demon.display import Display
+    from demon.menu import Menu
+
+    menu = Menu(status, submit=lambda category: None, font_directory=os.path.join(root_directory, "src", "fonts"))
+    menu.set_categories([f"category_{n}" for n in range(40)])
+    device = hardware.VirtualDisplay()
+    display = Display(device, menu.draw, on_frame=device.record_frame)
+    menu.display = display
+
+    def on_action(name, at, repeat):
+        menu.on_button(name, True, repeat)
+        display.invalidate(since=at)
+
+    button_input = ButtonInput(on_action, timing).start()
+    buttons = hardware.SimulatedButtons(button_input.edge)
+    display_thread = threading.Thread(target=display.run, kwargs={"tick_interval": menu.redraw_interval}, daemon=True)
+    display_thread.start()
+
+    metrics.reset()
+    for path in paths:
+        buttons.replay(read_trace(path)[0])
+        time.sleep(0.1)
+    button_input.stop()
+    display.stop()
+    display_thread.join()
+
+    metrics.flush()
+    summary = metrics.summarize(metrics.load())
+    print(f"\nlive replay, {display.frames_rendered} frames rendered, {display.frames_pushed} pushed")
+    for stage in ("button_edge_to_action", "button_edge_to_frame", "oled_redraw"):
+        if stage in summary:
+            print(f"{stage:<24} {json.dumps(summary[stage])}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("traces", nargs="*")
+    parser.add_argument("--timing", help="per-button timing overrides, as FUN_FACTS_BUTTON_TIMING")
+    parser.add_argument("--live", action="store_true", help="also play the traces in real time and report latency")
+    args = parser.parse_args()
+
+    paths = args.traces or sorted(glob.glob(os.path.join(root_directory, "bench", "traces", "*.txt")))
+    timing = load_timing(json.loads(args.timing) if args.timing else None)
+
+    failures = 0
+    for path in paths:
+        events, expected = read_trace(path)
+        got = action_names(replay(events, timing))
+        # a fresh recording without an expect line is only shown
+        ok = got == expected or not expected
+        failures += not ok
+        mark = "    " if not expected else "ok  " if ok else "FAIL"
+        print(f"{mark} {os.path.basename(path):<22} {len(events):>4} edges -> {compact(got)}")
+        if not ok:
+            print(f"     expected {compact(expected)}")
+
+    if args.live:
+        work_directory = tempfile.mkdtemp(prefix="fun_facts_buttons_")
+        from src import db_utils
+        db_utils.database_path = os.path.join(work_directory, "facts.db")
+        try:
+            play_live(paths, timing)
+        finally:
+            db_utils.close_connection()
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+    print("FAILED" if failures else "OK")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+# Several processes against one database, like the button demon and a few
+# gunicorn workers: each one queues print jobs, selects facts, edits and adds
+# facts (some in brand-new categories) and flushes metrics, all at once. A
+# watcher process follows PRAGMA data_version like the demon does and reports
+# how long a new category took to show up. Fails on any "database is locked"
+# error, a lost write or a category the watcher never saw.
+#
+#   python3 bench/stress_multiprocess.py [--processes 4] [--ops 200]
+
+import os, sys, time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+work_directory = tempfile.mkdtemp(prefix="fun_facts_multiprocess_")
+os.environ["FUN_FACTS_DB"] = os.path.join(work_directory, "facts.db")
+
+WATCH_INTERVAL = 0.05
+
+
+def worker(index, ops, results):
+    from src import db_utils, fact_selector, print_queue, metrics
+    db_utils.bootstrap_db()
+
+    errors, locked, new_categories = [], 0, []
+    start = time.perf_counter()
+    for n in range(ops):
+        try:
+            kind = n % 5
+            if kind == 0:
+                print_queue.submit(None, source=f"worker-{index}", count=1 + n % 3)
+            elif kind == 1:
+                fact_selector.select_fact(db_utils.get_connection())
+            elif kind == 2:
+                db_utils.write_transaction(lambda cursor: cursor.execute(
+                    "UPDATE facts SET update_ts = ? WHERE id = (SELECT MIN(id) FROM facts)", (int(time.time()), )))
+            elif kind == 3:
+                category = f"stress-{index}-{n}" if n % 25 == 3 else "stress"
+                db_utils.write_transaction(lambda cursor: cursor.execute(
+                    """INSERT INTO facts (category, description, times_used, owner, create_ts, update_ts)
+                        VALUES (?, ?, 0, 'stress', 0, 0)""", (category, f"fact {index}-{n}")))
+                if category != "stress":
+                    new_categories.append((category, time.time()))
+            else:
+                with metrics.timed("stress"):
+                    pass
+                metrics.flush()
+        except sqlite3.OperationalError as e:
+            if db_utils.is_busy_error(e):
+                locked += 1
+            else:
+                errors.append(repr(e))
+        except Exception as e:
+            errors.append(repr(e))
+
+    results.put({"index": index, "elapsed": time.perf_counter() - start, "errors": errors,
+                 "locked": locked, "new_categories": new_categories})
+
+def watcher(stop, seen):
+    from src import db_utils
+    db_utils.bootstrap_db()
+    watch = db_utils.ChangeWatcher()
+    known = set()
+    while not stop.is_set():
+        time.sleep(WATCH_INTERVAL)
+        if not watch.changed():
+            continue
+        now = time.time()
+        for (name, ) in watch.conn.execute("SELECT name FROM categories"):
+            if name not in known:
+                known.add(name)
+                seen.put((name, now))
+    watch.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=200, help="operations per process")
+    args = parser.parse_args()
+
+    try:
+        from src import db_utils
+        db_utils.bootstrap_db()
+        facts_before = db_utils.get_connection().execute("SELECT COUNT(id) FROM facts").fetchone()[0]
+
+        results, seen, stop = multiprocessing.Queue(), multiprocessing.Queue(), multiprocessing.Event()
+        watch_process = multiprocessing.Process(target=watcher, args=(stop, seen))
+        watch_process.start()
+        time.sleep(0.5)
+
+        processes = [multiprocessing.Process(target=worker, args=(n, args.ops, results)) for n in range(args.processes)]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        time.sleep(WATCH_INTERVAL * 4)
+        stop.set()
+        watch_process.join()
+        seen_at = {}
+        while not seen.empty():
+            name, ts = seen.get()
+            seen_at[name] = ts
+
+        failures, lags = [], []
+        for report in reports:
+            failures += [f"worker {report['index']}: {error}" for error in report["errors"]]
+            if report["locked"]:
+                failures.append(f"worker {report['index']}: {report['locked']} 'database is locked' errors")
+            for category, created in report["new_categories"]:
+                if category in seen_at:
+                    lags.append(max(0.0, seen_at[category] - created))
+                else:
+                    failures.append(f"watcher never saw category {category}")
+
+        conn = db_utils.get_connection()
+        inserts = sum(1 for n in range(args.ops) if n % 5 == 3) * args.processes
+        facts_after = conn.execute("SELECT COUNT(id) FROM facts").fetchone()[0]
+        if facts_after - facts_before != inserts:
+            failures.append(f"{facts_after - facts_before} facts added, expected {inserts}")
+        stress_count = conn.execute("SELECT count FROM stage_histograms WHERE stage = 'stress'").fetchone()
+        flushes = sum(1 for n in range(args.ops) if n % 5 == 4) * args.processes
+        if not stress_count or stress_count[0] != flushes:
+            failures.append(f"metrics merged {stress_count and stress_count[0]} observations, expected {flushes}")
+
+        total_ops = args.processes * args.ops
+        print(f"\n{total_ops} operations from {args.processes} processes in {elapsed:.2f}s "
+              f"({total_ops / elapsed:.0f} ops/s)")
+        if lags:
+            lags.sort()
+            print(f"new category noticed after {sum(lags) / len(lags) * 1000:.0f} ms on average, "
+                  f"{lags[-1] * 1000:.0f} ms at worst ({len(lags)} categories)")
+        for failure in failures:
+            print("FAIL", failure)
+        print("FAILED" if failures else "OK")
+        sys.exit(1 if failures else 0)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# Fires prints from many threads at once (single tickets and batches, like the
+# buttons, the web UI and several gunicorn workers printing together) against
+# a stub CUPS printer, then checks that every job got its own complete PDF
+# with the right number of pages, that least-used selection never handed a
+# fact out twice ahead of its turn and that no PDF file was left behind.
+# Exits 1 on any failure.
+#
+#   python3 bench/stress_parallel_print.py [--threads 8] [--prints 20] [--file-fallback]
+
+import os, sys, re, time
+import types
+import shutil
+import argparse
+import tempfile
+import threading
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+work_directory = tempfile.mkdtemp(prefix="fun_facts_stress_")
+os.environ["FUN_FACTS_DB"] = os.path.join(work_directory, "facts.db")
+
+PAGE_RE = re.compile(rb"/Type /Page\b(?!s)")
+
+
+class StubPrinterConnection:
+    # every Connection is used by one thread, like pycups expects; the
+    # documents it receives are collected in the class-wide jobs dict
+    lock = threading.Lock()
+    jobs = {}
+
+    def __init__(self):
+        self.document = None
+
+    def getPrinters(self):
+        import main
+        return {main.PRINTER_NAME: {}}
+
+    def new_job(self, options):
+        with self.lock:
+            job_id = len(self.jobs) + 1
+            self.jobs[job_id] = {"pages": int(options["page-ranges"].split("-")[1]), "data": b""}
+        return job_id
+
+    def createJob(self, printer, title, options):
+        self.document = self.new_job(options)
+        return self.document
+
+    def startDocument(self, printer, job_id, title, document_format, last_document):
+        return 100
+
+    def writeRequestData(self, data, length):
+        # a little delay so threads interleave mid-document
+        time.sleep(0.001)
+        self.jobs[self.document]["data"] += data[:length]
+        return 100
+
+    def finishDocument(self, printer):
+        return 0
+
+    def printFile(self, printer, path, title, options):
+        job_id = self.new_job(options)
+        time.sleep(0.001)
+        with open(path, "rb") as file:
+            self.jobs[job_id]["data"] = file.read()
+        return job_id
+
+
+def check(jobs, expected_tickets, tmpfs_before):
+    import main
+    from src.db_utils import get_connection
+
+    failures = []
+    tickets = 0
+    for job_id, job in sorted(jobs.items()):
+        data = job["data"]
+        if not data.startswith(b"%PDF") or not data.rstrip().endswith(b"%%EOF"):
+            failures.append(f"job {job_id}: incomplete PDF ({len(data)} bytes)")
+        pages = len(PAGE_RE.findall(data))
+        if pages != job["pages"]:
+            failures.append(f"job {job_id}: {pages} pages, page-ranges said {job['pages']}")
+        tickets += pages
+
+    if tickets != expected_tickets:
+        failures.append(f"{tickets} tickets printed, expected {expected_tickets}")
+
+    # least used selection: within a category no fact gets a second print
+    # before every other fact got its first, however many threads ask at once
+    cursor = get_connection().cursor()
+    cursor.execute("""SELECT category, MAX(times_used) - MIN(times_used) FROM facts
+                        GROUP BY category HAVING MAX(times_used) - MIN(times_used) > 1""")
+    for category, spread in cursor.fetchall():
+        failures.append(f"{category}: times_used spread {spread}, a fact was handed out twice")
+    cursor.execute("SELECT SUM(times_used) FROM facts")
+    total = cursor.fetchone()[0]
+    if total != expected_tickets:
+        failures.append(f"times_used adds up to {total}, expected {expected_tickets}")
+
+    tmpfs = main.TMPFS_DIRECTORY or tempfile.gettempdir()
+    leftovers = [name for name in os.listdir(root_directory) if name.endswith(".pdf")]
+    leftovers += [name for name in os.listdir(tmpfs) if name.startswith("fun_fact_") and name not in tmpfs_before]
+    if leftovers:
+        failures.append(f"PDF files left behind: {leftovers}")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--prints", type=int, default=20, help="prints per thread, every fifth is a batch of 3")
+    parser.add_argument("--file-fallback", action="store_true", help="stub pycups without the streaming API")
+    args = parser.parse_args()
+
+    connection = StubPrinterConnection
+    if args.file_fallback:
+        class FileOnlyConnection(StubPrinterConnection):
+            # hasattr(conn, "createJob") is False, like an old pycups
+            def __getattribute__(self, name):
+                if name == "createJob":
+                    raise AttributeError(name)
+                return super().__getattribute__(name)
+        connection = FileOnlyConnection
+    sys.modules["cups"] = types.SimpleNamespace(Connection=connection, HTTP_CONTINUE=100, IPP_OK=0)
+
+    import main
+
+    try:
+        main.PRINTER_BACKEND = "cups"
+        main.get_connection()
+        tmpfs = main.TMPFS_DIRECTORY or tempfile.gettempdir()
+        tmpfs_before = set(os.listdir(tmpfs))
+        errors = []
+
+        def run():
+            try:
+                for n in range(args.prints):
+                    if n % 5 == 4:
+                        main.print_batch(3)
+                    else:
+                        main.print_fact_by_category()
+            except Exception as e:
+                errors.append(repr(e))
+
+        expected = args.threads * sum(3 if n % 5 == 4 else 1 for n in range(args.prints))
+        threads = [threading.Thread(target=run) for _ in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        failures = errors + check(StubPrinterConnection.jobs, expected, tmpfs_before)
+        print(f"\n{len(StubPrinterConnection.jobs)} jobs, {expected} tickets from {args.threads} threads "
+              f"in {elapsed:.2f}s ({'file fallback' if args.file_fallback else 'streamed'})")
+        for failure in failures:
+            print("FAIL", failure)
+        print("FAILED" if failures else "OK")
+        sys.exit(1 if failures else 0)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
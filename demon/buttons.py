@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+from src import metrics
+
+# Button input between the hardware callbacks and the menu. Callbacks (the
+# RPi.GPIO event threads, the simulator) only timestamp the raw edge and
+# append it to a deque, which needs no lock to append from any thread. One
+# consumer thread drains it, debounces every button in software and hands
+# presses and hold repeats to on_action, so it is the only thread acting on
+# the menu.
+#
+# Debouncing is eager: the first edge that changes a button's state counts
+# straight away, the contacts are then ignored for that button's debounce
+# time and the level they settled on wins. A press adds no latency, and taps
+# are accepted as fast as the contacts settle instead of one per 300 ms.
+# Buttons with repeat on fire again while held, after repeat_delay, every
+# repeat_interval shrinking by repeat_acceleration down to repeat_min_interval.
+#
+#   FUN_FACTS_BUTTON_TIMING='{"select": {"debounce": 0.05}, "down": {"repeat_delay": 0.3}}'
+#   FUN_FACTS_BUTTON_TRACE=edges.txt   records raw edges, see bench/replay_buttons.py
+
+DEFAULT_TIMING = {
+    "debounce": 0.02,
+    "repeat": False,
+    "repeat_delay": 0.4,
+    "repeat_interval": 0.15,
+    "repeat_min_interval": 0.04,
+    "repeat_acceleration": 0.8,
+}
+
+BUTTON_TIMING = {
+    "select": {"debounce": 0.03},
+    "up": {"repeat": True},
+    "down": {"repeat": True},
+}
+
+
+def load_timing(overrides=None):
+    if overrides is None:
+        overrides = json.loads(os.environ.get("FUN_FACTS_BUTTON_TIMING") or "{}")
+    return {name: {**DEFAULT_TIMING, **BUTTON_TIMING.get(name, {}), **overrides.get(name, {})}
+            for name in set(BUTTON_TIMING) | set(overrides)}
+
+
+# One button, driven only by the timestamps it is given, so a recorded trace
+# replays the same at any speed. Actions are (edge time, name, repeat).
+class Debouncer:
+    def __init__(self, name, timing):
+        self.name = name
+        self.timing = timing
+        self.pressed = False
+        self.level = False
+        self.level_at = 0.0
+        self.settle_at = 0.0
+        self.repeat_at = None
+        self.repeat_interval = None
+
+    def change(self, at, pressed, edge_at):
+        self.pressed = pressed
+        self.settle_at = at + self.timing["debounce"]
+        if not pressed:
+            self.repeat_at = None
+            return []
+        if self.timing["repeat"]:
+            self.repeat_at = at + self.timing["repeat_delay"]
+            self.repeat_interval = self.timing["repeat_interval"]
+        return [(edge_at, self.name, False)]
+
+    def edge(self, at, pressed):
+        self.level, self.level_at = pressed, at
+        if at < self.settle_at or pressed == self.pressed:
+            return []
+        return self.change(at, pressed, at)
+
+    def poll(self, now):
+        actions = []
+        if self.level != self.pressed and now >= self.settle_at:
+            # the contacts settled on the other level while they were ignored
+            actions += self.change(self.settle_at, self.level, self.level_at)
+        while self.repeat_at is not None and now >= self.repeat_at:
+            actions.append((self.repeat_at, self.name, True))
+            self.repeat_at += self.repeat_interval
+            self.repeat_interval = max(self.repeat_interval * self.timing["repeat_acceleration"],
+                                       self.timing["repeat_min_interval"])
+        return actions
+
+    def deadline(self):
+        # next time poll() has something to do, None while idle
+        deadlines = [self.repeat_at] if self.repeat_at is not None else []
+        if self.level != self.pressed:
+            deadlines.append(self.settle_at)
+        return min(deadlines) if deadlines else None
+
+
+class ButtonInput:
+    def __init__(self, on_action, timing=None, clock=time.perf_counter, trace_path=None):
+        self.on_action = on_action
+        self.timing = timing if timing is not None else load_timing()
+        self.clock = clock
+        self.debouncers = {}
+        self.edges = deque()
+        self.running = True
+        self.started = clock()
+        self.trace = open(trace_path, "a", buffering=1) if trace_path else None
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def edge(self, name, pressed):
+        # called from the hardware callback threads: timestamp, queue, return
+        self.edges.append((self.clock(), name, pressed))
+        self._wakeup.set()
+
+    def debouncer(self, name):
+        if name not in self.debouncers:
+            self.debouncers[name] = Debouncer(name, self.timing.get(name, DEFAULT_TIMING))
+        return self.debouncers[name]
+
+    def poll(self, now):
+        actions = []
+        for debouncer in self.debouncers.values():
+            actions += debouncer.poll(now)
+        return sorted(actions)
+
+    def process(self, now):
+        # drains the queue in edge order and runs every deadline up to now
+        actions = []
+        while self.edges:
+            at, name, pressed = self.edges.popleft()
+            if self.trace:
+                self.trace.write(f"{at - self.started:.4f} {name} {'press' if pressed else 'release'}\n")
+            actions += self.poll(at)
+            actions += self.debouncer(name).edge(at, pressed)
+        return actions + self.poll(now)
+
+    def next_deadline(self):
+        deadlines = [deadline for deadline in (debouncer.deadline() for debouncer in self.debouncers.values())
+                     if deadline is not None]
+        return min(deadlines) if deadlines else None
+
+    def run(self):
+        while self.running:
+            deadline = self.next_deadline()
+            self._wakeup.wait(None if deadline is None else max(deadline - self.clock(), 0))
+            self._wakeup.clear()
+            for at, name, repeat in self.process(self.clock()):
+                metrics.observe("button_edge_to_action", self.clock() - at)
+                try:
+                    self.on_action(name, at, repeat)
+                except Exception as e:
+                    print(f"Error handling button {name}: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="button-input", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+        if self.trace:
+            self.trace.close()
+
+
+def replay(events, timing=None):
+    # a parse_script trace through the debouncers on its own timestamps, no
+    # sleeping; returns the actions it causes
+    buttons = ButtonInput(None, timing)
+    buttons.edges.extend(events)
+    end = max((at for at, _, _ in events), default=0.0) + 1.0
+    return buttons.process(end)
@@ -1,61 +1,57 @@
 #!/usr/bin/env python3
 
-import RPi.GPIO as GPIO
-import time
-import sys, os, socket
-import math
-from luma.core.interface.serial import i2c
-from luma.core.render import canvas as canvas2
-from luma.oled.device import ssd1306
-from PIL import ImageFont
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from main import print_fact_by_category
-from src.db_utils import init_db
-
-# Set GPIO mode (BCM or BOARD)
-GPIO.setmode(GPIO.BOARD)
-
-# Define GPIO pin for the button
-button_select_pin = 11  # BCM 17 on rpi 4
-button_up_pin = 15  # BCM 27 on rpi 4
-button_down_pin = 13  # BCM 22 on rpi 4
-
-# Setup the button pin as input with pull-up resistor
-GPIO.setup(button_select_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(button_up_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(button_down_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-### setting up OLED screen
-serial = i2c(port=1, address=0x3C)
-device = ssd1306(serial, mode="1", width=128, height=32)
+import sys, os
+import threading
+import json
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_directory)
+
+from src import print_queue, db_utils, fleet
+from src.db_utils import bootstrap_db, get_connection
+from src.machine_status import status
+from demon.display import Display
+from demon.menu import Menu, RANDOM_FACT, INFO_TEXT
+from demon import hardware
+from demon.buttons import ButtonInput
+
+# pi drives the real buttons, OLED and printer, sim runs anywhere: buttons are
+# read from FUN_FACTS_BUTTON_SCRIPT (or typed on stdin), frames and print jobs
+# are only recorded, see demon/hardware.py
+HARDWARE = os.environ.get("FUN_FACTS_HARDWARE", "pi")
 
 #PWD = os.getcwd()
 PWD = "/opt/fun-facts"
-CATEGORIES = []
-INFO_TEXT = "==_I_N_F_O_=="
-SELECTED_POSITION = 0
-printing = False
-printing_error = False
-show_machine_status = False
-
-# Set the font size
-font_size = 15
-font = ImageFont.truetype(PWD + '/src/fonts/Ubuntu-Regular.ttf', font_size)
-font_bold = ImageFont.truetype(PWD + "/src/fonts/Ubuntu-Bold.ttf", font_size)
-font_small = ImageFont.truetype(PWD + '/src/fonts/Ubuntu-Regular.ttf', 9)
 
 # clock_font_size = 18
-# clock_font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf" 
+# clock_font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
 # clock_font_bold = ImageFont.truetype(clock_font_path, font_size)
 
 print("Staring fun-fact demon...")
 
+def category_snapshot_path():
+    return db_utils.database_path + ".categories.json"
+
+def read_category_snapshot():
+    # menu written by the previous run, shown before the database is opened
+    try:
+        with open(category_snapshot_path()) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return []
+
+def write_category_snapshot(categories):
+    tmp_path = category_snapshot_path() + ".tmp"
+    try:
+        with open(tmp_path, "w") as file:
+            json.dump(categories, file)
+        os.replace(tmp_path, category_snapshot_path())
+    except OSError as e:
+        print("Could not save category snapshot:", e)
+
 def get_categories():
-    global CATEGORIES
-    conn, cursor = init_db()
-    sql = """SELECT DISTINCT(category) from facts ORDER BY category"""
-    categories = ["random_fact"]
+    cursor = get_connection().cursor()
+    sql = """SELECT name FROM categories WHERE fact_count > 0 ORDER BY name"""
+    categories = [RANDOM_FACT]
 
     cursor.execute(sql)
     for row in cursor:
@@ -63,148 +59,76 @@ def get_categories():
 
     categories.append(INFO_TEXT)
 
-    if conn:
-        conn.commit()
-        conn.close()
-
-    CATEGORIES = categories
-
-get_categories()
-
-def get_total_prints():
-    conn, cursor = init_db()
-    sql = """SELECT SUM(times_used) as total_sum from facts"""
-    total = 0
-
-    cursor.execute(sql)
-    row = cursor.fetchone()
-    total = row[0]
-
-    if conn:
-        conn.commit()
-        conn.close()
-
-    return str(total)
-
-
-def get_local_ip():
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except socket.error as e:
-        print(f"Error getting local IP: {e}")
-    return "NOT CONNECTED!"
-
-def format_duration(seconds):
-    minutes, seconds = divmod(seconds, 60)
-    hours, minutes = divmod(minutes, 60)
-    days, hours = divmod(hours, 24)
-
-    if days > 0:
-        return str(f"{days}d {hours}h {minutes}m")
-    elif hours > 0:
-        return str(f"{hours:02d}h {minutes:02d}m")
-    else:
-        return str(f"{minutes:02d}m {seconds:02d}s")
-
-def get_uptime():
-    with open('/proc/uptime', 'r') as f:
-        uptime_seconds = float(f.readline().split()[0])
-    formatted_uptime = format_duration(math.ceil(uptime_seconds))
-    return formatted_uptime
-
-def draw_menu():
-    with canvas2(device) as draw:
-        draw.rectangle(device.bounding_box, outline="white", fill="black")
-        y = 2
-
-        if printing:
-            draw.text((5, 8), "Printing fact...", fill="white", font=font_bold)
-
-        elif printing_error:
-            draw.text((5, 8), "Error Printing :(", fill="white", font=font_bold)
-
-        elif show_machine_status:
-            my_ip =  get_local_ip()
-            draw.text((5, 1), f"My  IP: {my_ip}", fill="white", font=font_small)
-            draw.text((5, 10), "Uptime: " + get_uptime(), fill="white", font=font_small)
-            draw.text((5, 20), "Total prints: " + get_total_prints(), fill="white", font=font_small)
-
-        else:
-            for idx, item in enumerate(CATEGORIES):
-                if idx >= SELECTED_POSITION:
-                    if idx == SELECTED_POSITION:
-                        draw.text((5, y), "* " + " ".join(str(item).split("_")).title(), fill="white")
-                    else:
-                        draw.text((10, y), "  " + " ".join(str(item).split("_")).title(), fill="white")
-                    y += 10
-
-def button_up_callback(channel):
-    print("Button UP Pressed!")
-    global SELECTED_POSITION
-
-    if GPIO.input(channel) == GPIO.LOW:
-        if SELECTED_POSITION == 0:
-            SELECTED_POSITION = len(CATEGORIES) -1
-        else:
-            SELECTED_POSITION -= 1
-
-def button_down_callback(channel):
-    print("Button DOWN Pressed!")
-    global SELECTED_POSITION
-    if GPIO.input(channel) == GPIO.LOW:
-        if SELECTED_POSITION == len(CATEGORIES) -1:
-            SELECTED_POSITION = 0
-        else:
-            SELECTED_POSITION += 1
-
-def button_accept_callback(channel):
-    print("Button ACCEPT Pressed!")
-    global SELECTED_POSITION, printing, printing_error, show_machine_status
-    category = CATEGORIES[SELECTED_POSITION]
-    print("category", category)
-    success = False
-    if GPIO.input(channel) == GPIO.LOW:
-        printing = True
-        if category == "random_fact":
-            success = print_fact_by_category()
-        elif category == INFO_TEXT:
-            printing = False
-            show_machine_status = True
-        else:
-            success = print_fact_by_category(category)
-
-        if success:
-            time.sleep(1)
-            printing = False
-        elif show_machine_status:
-            time.sleep(4)
-            show_machine_status = False
-        else:
-            time.sleep(1)
-            printing = False
-            printing_error = True
-            time.sleep(3)
-            printing_error = False
-
-        # SELECTED_POSITION = 0
-
-GPIO.add_event_detect(button_up_pin, GPIO.BOTH, callback=button_up_callback, bouncetime=300)
-GPIO.add_event_detect(button_down_pin, GPIO.BOTH, callback=button_down_callback, bouncetime=300)
-GPIO.add_event_detect(button_select_pin, GPIO.BOTH, callback=button_accept_callback, bouncetime=300)
+    if menu.set_categories(categories):
+        write_category_snapshot(categories)
+
+### setting up OLED screen and printer, FUN_FACTS_DISPLAY=headless runs without a screen
+if HARDWARE == "sim":
+    device = hardware.VirtualDisplay()
+    print_function = hardware.NullPrinter()
+elif os.environ.get("FUN_FACTS_DISPLAY") == "headless":
+    device = None
+    print_function = None
+else:
+    device = hardware.open_ssd1306(width=128, height=32)
+    print_function = None
+
+# the button input thread only queues a press, the job is written here
+submitter = print_queue.Submitter(source="buttons", on_submit=lambda job_id: print("queued print job", job_id))
+
+menu = Menu(status, submit=submitter.submit, font_directory=os.path.join(PWD if HARDWARE == "pi" else root_directory, "src", "fonts"))
+menu.set_categories(read_category_snapshot())
+
+display = Display(device, menu.draw, width=128, height=32,
+                  on_frame=device.record_frame if HARDWARE == "sim" else None)
+menu.display = display
+
+def button_callback(name, at, repeat):
+    # debounced presses and hold repeats, all from the one button input thread
+    if not repeat:
+        print(f"Button {name.upper()} Pressed!")
+    menu.on_button(name, True, repeat)
+    display.invalidate(since=at)
+
+# the hardware only queues raw edges, debouncing happens on the input thread
+button_input = ButtonInput(button_callback, trace_path=os.environ.get("FUN_FACTS_BUTTON_TRACE")).start()
+
+if HARDWARE == "sim":
+    buttons = hardware.SimulatedButtons(button_input.edge)
+    buttons.start_replay(os.environ.get("FUN_FACTS_BUTTON_SCRIPT"))
+else:
+    buttons = hardware.GpioButtons(button_input.edge)
+
+print_worker = print_queue.PrintWorker(print_function, on_status=menu.on_job_status)
+
+def start_services():
+    # runs behind the first frame: schema checks, the facts.json sync and the
+    # print worker all wait until the menu is already on screen
+    bootstrap_db()
+    submitter.start()
+    get_categories()
+    # categories added or emptied from the web UI show up without a restart
+    db_utils.watch_changes(get_categories)
+    # fleet clients send their prints and fetch edits in the background
+    fleet.start()
+    status.start()
+    print_worker.start()
+
+threading.Thread(target=start_services, name="startup", daemon=True).start()
 
 try:
-    while True:
-        draw_menu()
-        time.sleep(0.05)
+    display.invalidate()
+    display.run(tick_interval=menu.redraw_interval)
 
 except KeyboardInterrupt:
     pass
 
 finally:
     print("Exiting...")
-    device.clear()
-    GPIO.cleanup()
+    print_worker.stop()
+    submitter.stop()
+    display.stop()
+    if device:
+        device.clear()
+    buttons.close()
+    button_input.stop()
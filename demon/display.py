@@ -0,0 +1,109 @@
+import time
+import threading
+
+from PIL import Image, ImageDraw
+
+from src import metrics
+
+# SSD1306 commands used for partial updates
+COLUMNADDR = 0x21
+PAGEADDR = 0x22
+PAGE_HEIGHT = 8
+
+
+def frame_to_pages(image):
+    # SSD1306 GDDRAM layout: one byte per column per 8-pixel page, LSB on top.
+    # Rotating the page strip by 270 degrees makes PIL pack exactly that.
+    pages = []
+    for top in range(0, image.height, PAGE_HEIGHT):
+        strip = image.crop((0, top, image.width, top + PAGE_HEIGHT))
+        pages.append(strip.transpose(Image.Transpose.ROTATE_270).tobytes())
+    return pages
+
+
+# Event driven OLED output: the frame is re-rendered only after invalidate()
+# (or on the optional tick while a live page is shown) and only the 8-pixel
+# pages that differ from what the panel already shows are sent over I2C.
+# With device=None it runs headless and just keeps the counters. on_frame is
+# called with every rendered image and the number of pages it changed.
+class Display:
+    def __init__(self, device, render, width=128, height=32, colstart=0, on_frame=None):
+        self.device = device
+        self.render = render
+        self.on_frame = on_frame
+        self.size = (width, height)
+        self.colstart = colstart
+        self.running = True
+        self.image = None
+        self._pages = None
+        self._dirty = threading.Event()
+        self._lock = threading.Lock()
+        self._since_lock = threading.Lock()
+        self._since = None
+
+        self.frames_rendered = 0
+        self.frames_pushed = 0
+        self.pages_pushed = 0
+        self.bytes_pushed = 0
+
+    def invalidate(self, since=None):
+        # since: perf_counter time of the button edge behind the change, the
+        # next frame on the panel observes 'button_edge_to_frame' from it
+        if since is not None:
+            with self._since_lock:
+                self._since = since if self._since is None else min(self._since, since)
+        self._dirty.set()
+
+    def stop(self):
+        self.running = False
+        self._dirty.set()
+
+    def push_page(self, page, data):
+        command = (COLUMNADDR, self.colstart, self.colstart + self.size[0] - 1, PAGEADDR, page, page)
+        if self.device:
+            self.device.command(*command)
+            self.device.data(list(data))
+        self.pages_pushed += 1
+        self.bytes_pushed += len(command) + len(data)
+
+    @metrics.timed("oled_redraw")
+    def refresh(self):
+        with self._lock:
+            with self._since_lock:
+                since, self._since = self._since, None
+            image = Image.new("1", self.size)
+            self.render(ImageDraw.Draw(image))
+            self.frames_rendered += 1
+
+            pages = frame_to_pages(image)
+            changed = [idx for idx, data in enumerate(pages) if not self._pages or self._pages[idx] != data]
+            for idx in changed:
+                self.push_page(idx, pages[idx])
+
+            if changed:
+                self.frames_pushed += 1
+            self.image, self._pages = image, pages
+            if self.on_frame:
+                self.on_frame(image, len(changed))
+            if since is not None:
+                metrics.observe("button_edge_to_frame", time.perf_counter() - since)
+            return len(changed)
+
+    def run(self, tick_interval=None):
+        # tick_interval() returns seconds between forced redraws, or None when
+        # the current page is static and only state changes matter
+        while self.running:
+            tick = tick_interval() if tick_interval else None
+            if not self._dirty.wait(tick or 1.0) and not tick:
+                continue
+            self._dirty.clear()
+            if self.running:
+                self.refresh()
+
+    def stats(self):
+        return {
+            "frames_rendered": self.frames_rendered,
+            "frames_pushed": self.frames_pushed,
+            "pages_pushed": self.pages_pushed,
+            "bytes_pushed": self.bytes_pushed,
+        }
@@ -0,0 +1,176 @@
+import sys
+import time
+import threading
+from collections import deque
+
+from PIL import Image
+
+from demon.display import COLUMNADDR, PAGE_HEIGHT
+
+# Hardware behind the buttons demon, picked with FUN_FACTS_HARDWARE:
+#
+#   pi   RPi.GPIO buttons, ssd1306 OLED over I2C, the real print path (default)
+#   sim  scripted buttons, a virtual OLED that records frames and a null
+#        printer that records jobs, so the demon runs and can be load tested
+#        anywhere
+#
+# Real backends import their drivers only when they are created.
+
+# board pin numbers of the buttons
+BUTTON_PINS = {
+    "select": 11,  # BCM 17 on rpi 4
+    "up": 15,  # BCM 27 on rpi 4
+    "down": 13,  # BCM 22 on rpi 4
+}
+
+
+class GpioButtons:
+    # every raw edge goes to on_button, bounces included: debouncing is done
+    # in software by demon.buttons.ButtonInput, with per-button timing
+    def __init__(self, on_button, pins=BUTTON_PINS):
+        import RPi.GPIO as GPIO
+
+        self.GPIO = GPIO
+        GPIO.setmode(GPIO.BOARD)
+        for name, pin in pins.items():
+            # pull-up, so a pressed button reads LOW
+            GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            GPIO.add_event_detect(pin, GPIO.BOTH,
+                                  callback=lambda channel, name=name: on_button(name, GPIO.input(channel) == GPIO.LOW))
+
+    def close(self):
+        self.GPIO.cleanup()
+
+
+def parse_script(lines):
+    # "<seconds since start> <button> [press|release]" per line, a button
+    # without an edge is a press followed by a release; # starts a comment
+    events = []
+    for line in lines:
+        fields = line.split("#", 1)[0].split()
+        if not fields:
+            continue
+        if len(fields) == 1:
+            fields.insert(0, "0")
+        at, name = float(fields[0]), fields[1]
+        edge = fields[2] if len(fields) > 2 else None
+        if edge in (None, "press"):
+            events.append((at, name, True))
+        if edge in (None, "release"):
+            events.append((at, name, False))
+    return events
+
+
+class SimulatedButtons:
+    def __init__(self, on_button, pins=BUTTON_PINS):
+        self.on_button = on_button
+        self.pins = pins
+        self.running = True
+        self.edges = 0
+
+    def edge(self, name, pressed):
+        if name not in self.pins:
+            raise ValueError(f"Unknown button {name!r}")
+        self.edges += 1
+        return self.on_button(name, pressed)
+
+    def press(self, name):
+        result = self.edge(name, True)
+        self.edge(name, False)
+        return result
+
+    def replay(self, events, speed=1.0):
+        # events from parse_script, timestamps are relative to the first one
+        start = time.perf_counter()
+        for at, name, pressed in events:
+            if not self.running:
+                break
+            delay = start + at / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.edge(name, pressed)
+
+    def start_replay(self, path=None):
+        # replays a script file, or button names typed on stdin as they come
+        def run():
+            if path:
+                with open(path) as file:
+                    self.replay(parse_script(file))
+            else:
+                for line in sys.stdin:
+                    try:
+                        for _, name, pressed in parse_script([line]):
+                            self.edge(name, pressed)
+                    except ValueError as e:
+                        print(e)
+
+        thread = threading.Thread(target=run, name="simulated-buttons", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self.running = False
+
+
+def open_ssd1306(width=128, height=32, port=1, address=0x3C):
+    from luma.core.interface.serial import i2c
+    from luma.oled.device import ssd1306
+
+    return ssd1306(i2c(port=port, address=address), mode="1", width=width, height=height)
+
+
+# Takes the same command()/data() calls as the luma device, keeps its own copy
+# of the panel memory and records every pushed frame, so tests of the display
+# see exactly what would have reached the OLED.
+class VirtualDisplay:
+    def __init__(self, width=128, height=32, max_frames=1000):
+        self.width = width
+        self.height = height
+        self.gddram = [bytes(width) for _ in range(height // PAGE_HEIGHT)]
+        self.frames = deque(maxlen=max_frames)
+        self.frame_count = 0
+        self.writes = 0
+        self._page = 0
+
+    def command(self, *args):
+        if args and args[0] == COLUMNADDR and len(args) >= 5:
+            self._page = args[4]
+
+    def data(self, data):
+        self.gddram[self._page] = bytes(data)
+        self.writes += 1
+
+    def image(self):
+        # GDDRAM back into a 1-bit image, the inverse of display.frame_to_pages
+        image = Image.new("1", (self.width, self.height))
+        for idx, data in enumerate(self.gddram):
+            strip = Image.frombytes("1", (PAGE_HEIGHT, self.width), data).transpose(Image.Transpose.ROTATE_90)
+            image.paste(strip, (0, idx * PAGE_HEIGHT))
+        return image
+
+    def record_frame(self, image, changed):
+        if changed:
+            self.frames.append((time.perf_counter(), image))
+            self.frame_count += 1
+
+    def clear(self):
+        self.gddram = [bytes(self.width) for _ in self.gddram]
+
+
+class NullPrinter:
+    def __init__(self, delay=0.0, fail_every=0, max_jobs=10000):
+        self.delay = delay
+        self.fail_every = fail_every
+        self.jobs = deque(maxlen=max_jobs)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, category, tickets=1):
+        with self._lock:
+            self.count += 1
+            count = self.count
+            self.jobs.append((time.time(), category, tickets))
+        if self.delay:
+            time.sleep(self.delay)
+        return not (self.fail_every and count % self.fail_every == 0)
+
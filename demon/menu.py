@@ -0,0 +1,200 @@
+import os
+import time
+import threading
+
+from PIL import Image, ImageDraw, ImageFont
+
+from src import print_queue
+
+RANDOM_FACT = "random_fact"
+INFO_TEXT = "==_I_N_F_O_=="
+
+MENU = "menu"
+PRINTING = "printing"
+PRINTING_ERROR = "printing_error"
+MACHINE_STATUS = "machine_status"
+
+# seconds a page stays up before the menu comes back
+DONE_DELAY = 1
+ERROR_DELAY = 3
+STATUS_DELAY = 4
+
+FONT_SIZE = 15
+
+# menu rows: the selected category on top, the ones after it below
+ROW_TOP = 2
+ROW_HEIGHT = 10
+VISIBLE_ROWS = 3
+# scroll bar along the right border, only for lists longer than the screen
+SCROLLBAR_X = 124
+
+
+def format_label(item):
+    return " ".join(str(item).split("_")).title()
+
+
+# The buttons demon's state machine, free of any hardware: button edges and
+# print job updates change it and invalidate the display, draw() renders it.
+# Temporary pages expire on a deadline checked when drawing, so a burst of
+# presses never leaves a pile of timer threads behind.
+class Menu:
+    def __init__(self, status, submit=None, font_directory=None):
+        self.status = status
+        self.submit = submit or (lambda category: print_queue.submit(category, source="buttons"))
+        self.font_directory = font_directory
+        self.display = None
+        self.categories = []
+        self.labels = []
+        self.selected = 0
+        self.page = MENU
+        self.page_until = None
+        self._fonts = {}
+        self._bitmaps = {}
+        self._lock = threading.Lock()
+
+    def get_font(self, file_name, size):
+        # the menu uses PIL's default font, TrueType fonts load the first time a page needs them
+        key = (file_name, size)
+        if key not in self._fonts:
+            if file_name is None:
+                self._fonts[key] = ImageFont.load_default()
+            else:
+                self._fonts[key] = ImageFont.truetype(os.path.join(self.font_directory, file_name), size)
+        return self._fonts[key]
+
+    def text_bitmap(self, text, font_key=None):
+        # text is rasterized once per font, frames only paste the 1-bit mask
+        key = (font_key, text)
+        bitmap = self._bitmaps.get(key)
+        if bitmap is None:
+            font = self.get_font(*font_key) if font_key else self.get_font(None, None)
+            measure = ImageDraw.Draw(Image.new("1", (1, 1)))
+            right, bottom = measure.textbbox((0, 0), text, font=font)[2:]
+            bitmap = Image.new("1", (max(right, 1), max(bottom, 1)))
+            ImageDraw.Draw(bitmap).text((0, 0), text, fill=1, font=font)
+            self._bitmaps[key] = bitmap
+        return bitmap
+
+    def draw_text(self, draw, xy, text, font_key=None):
+        draw.bitmap(xy, self.text_bitmap(text, font_key), fill="white")
+
+    def invalidate(self):
+        if self.display:
+            self.display.invalidate()
+
+    def set_categories(self, categories):
+        with self._lock:
+            if categories == self.categories:
+                return False
+            self.categories = list(categories)
+            self.labels = [format_label(item) for item in self.categories]
+            self.selected = max(0, min(self.selected, len(self.categories) - 1))
+            # keep the page texts, drop bitmaps of categories that went away
+            labels = {"* " + label for label in self.labels} | {"  " + label for label in self.labels}
+            self._bitmaps = {key: bitmap for key, bitmap in self._bitmaps.items()
+                             if key[0] is not None or key[1] in labels}
+        self.invalidate()
+        return True
+
+    def show(self, page, seconds=None):
+        with self._lock:
+            self.page = page
+            self.page_until = time.monotonic() + seconds if seconds else None
+        self.invalidate()
+
+    def current_page(self):
+        if self.page_until and time.monotonic() >= self.page_until:
+            self.page, self.page_until = MENU, None
+        return self.page
+
+    def redraw_interval(self):
+        # the status page shows a running uptime and temporary pages have to
+        # come down on time, everything else is static
+        page = self.current_page()
+        if page == MACHINE_STATUS:
+            return 1.0
+        if self.page_until:
+            return max(self.page_until - time.monotonic(), 0.01)
+        return None
+
+    def move(self, step, wrap):
+        with self._lock:
+            if wrap:
+                self.selected = (self.selected + step) % len(self.categories)
+            else:
+                self.selected = max(0, min(self.selected + step, len(self.categories) - 1))
+        self.invalidate()
+
+    def on_button(self, name, pressed, repeat=False):
+        # called from the button input thread only, see demon/buttons.py. Only
+        # the press edge does anything, releases are ignored. A press wraps
+        # around the list, a held button repeating stops at its end.
+        if not pressed or not self.categories:
+            return None
+
+        if name == "up":
+            self.move(-1, wrap=not repeat)
+        elif name == "down":
+            self.move(1, wrap=not repeat)
+        elif name == "select" and not repeat:
+            category = self.categories[self.selected]
+            if category == INFO_TEXT:
+                self.show(MACHINE_STATUS, STATUS_DELAY)
+            else:
+                # hand the job to the print worker so the callback returns straight away
+                return self.submit(None if category == RANDOM_FACT else category)
+        return None
+
+    def on_job_status(self, job):
+        # called from the print worker thread whenever a job changes state
+        if job["status"] == print_queue.PRINTING:
+            self.show(PRINTING)
+        elif job["status"] == print_queue.DONE:
+            self.show(PRINTING, DONE_DELAY)
+        elif job["status"] == print_queue.FAILED or job["error"]:
+            self.show(PRINTING_ERROR, ERROR_DELAY)
+
+    def draw(self, draw):
+        draw.rectangle((0, 0, 127, 31), outline="white", fill="black")
+        page = self.current_page()
+
+        if page == PRINTING:
+            self.draw_text(draw, (5, 8), "Printing fact...", ("Ubuntu-Bold.ttf", FONT_SIZE))
+
+        elif page == PRINTING_ERROR:
+            self.draw_text(draw, (5, 8), "Error Printing :(", ("Ubuntu-Bold.ttf", FONT_SIZE))
+
+        elif page == MACHINE_STATUS:
+            # uptime changes every second, not worth caching
+            my_ip =  self.status.get_local_ip()
+            font_small = self.get_font("Ubuntu-Regular.ttf", 9)
+            draw.text((5, 1), f"My  IP: {my_ip}", fill="white", font=font_small)
+            draw.text((5, 10), "Uptime: " + self.status.get_uptime(), fill="white", font=font_small)
+            draw.text((5, 20), "Total prints: " + str(self.status.get_total_prints()), fill="white", font=font_small)
+
+        elif not self.categories:
+            # first start, no snapshot yet: splash until the database is ready
+            self.draw_text(draw, (5, 10), "Loading facts...")
+
+        else:
+            self.draw_menu(draw)
+
+    def draw_menu(self, draw):
+        # only the rows on screen are touched, so the cost of a frame does
+        # not depend on how many categories there are
+        with self._lock:
+            labels, selected = self.labels, self.selected
+
+        y = ROW_TOP
+        for idx in range(selected, min(selected + VISIBLE_ROWS, len(labels))):
+            if idx == selected:
+                self.draw_text(draw, (5, y), "* " + labels[idx])
+            else:
+                self.draw_text(draw, (10, y), "  " + labels[idx])
+            y += ROW_HEIGHT
+
+        if len(labels) > VISIBLE_ROWS:
+            track = 32 - 4
+            thumb = max(2, track * VISIBLE_ROWS // len(labels))
+            top = 2 + (track - thumb) * selected // (len(labels) - 1)
+            draw.line((SCROLLBAR_X, top, SCROLLBAR_X, top + thumb - 1), fill="white")
@@ -1,22 +1,85 @@
-import os
-from flask import Flask, render_template, redirect, url_for, flash, jsonify, request
+import os, sys
+import io
+import csv
+import gzip
+import json
+import sqlite3
+import hashlib
+import functools
+from flask import Flask, render_template, redirect, url_for, flash, jsonify, request, make_response, stream_with_context
 from flask_wtf import FlaskForm
-from wtforms import StringField, IntegerField, PasswordField, SubmitField
+from wtforms import StringField, IntegerField, PasswordField, SubmitField, BooleanField
 from wtforms.validators import DataRequired
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_sqlalchemy import SQLAlchemy
-import sqlite3
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src import print_queue, fact_search, metrics, fleet, fact_export, fact_import, usage_log
+from src.db_utils import get_connection, database_path, write_transaction
+
+# columns the editor may change, with the type each value is converted to
+EDITABLE_COLUMNS = {
+    'category': str,
+    'description': str,
+    'times_used': int,
+}
+
+# page size limits for /api/facts, keeps the response small however big the table gets
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+static_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+template_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# asset URLs carry a hash of the file, so browsers may keep them for a year
+STATIC_MAX_AGE = 365 * 24 * 3600
+# responses smaller than this are sent as they are
+COMPRESS_MIN_SIZE = 512
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript')
+
+# brotli is optional, gzip is always there
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def fingerprint_files(directory):
+    # relative path -> first 12 hex digits of the file's sha256
+    fingerprints = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            with open(path, 'rb') as file:
+                digest = hashlib.sha256(file.read()).hexdigest()[:12]
+            fingerprints[os.path.relpath(path, directory).replace(os.sep, '/')] = digest
+    return fingerprints
+
+def pick_encoding(accept_encodings):
+    if brotli and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
 
 def create_app():
-    current_file_path = os.path.abspath(__file__)
-    root_path = os.path.dirname(os.path.dirname(os.path.dirname(current_file_path)))
-    _db_path = os.path.join(root_path, "src", "facts.db")
-    db_path = "sqlite:///" + os.path.join(root_path, "src", "facts.db")
+    db_path = "sqlite:///" + database_path
 
     # print("db_path", db_path)
 
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'your_secret_key'  # Change this to a secure secret key
+    # templates only change with a deploy, which restarts the workers
+    app.config['TEMPLATES_AUTO_RELOAD'] = False
+    # ETags, 304s and long-lived asset caching, and compressed responses; only
+    # turned off to measure without them (bench/bench_web_server.py)
+    app.config['HTTP_CACHING'] = True
+    app.config['COMPRESS_RESPONSES'] = True
     app.config['SQLALCHEMY_DATABASE_URI'] = db_path
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     db = SQLAlchemy(app)
@@ -31,6 +94,9 @@ def create_app():
         def __init__(self, user_id):
             self.id = user_id
 
+    # one User per account for the life of the worker, load_user runs on every request
+    known_users = {username: User(username) for username in users}
+
     class Fact(db.Model):
         __tablename__ = 'facts' 
         id = db.Column(db.Integer, primary_key=True)
@@ -40,7 +106,7 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User(user_id)
+        return known_users.get(user_id)
 
     class LoginForm(FlaskForm):
         username = StringField('Username', validators=[DataRequired()])
@@ -61,35 +127,286 @@ def create_app():
     class EntryForm(FlaskForm):
         category = StringField('Category', validators=[DataRequired()])
         description = StringField('Fact', validators=[DataRequired()])        
+        add_anyway = BooleanField('Add even if a similar fact exists')
         submit = SubmitField('Add New Fact')
 
-    def update_data_in_db(id, column_name, new_value):
-        conn = sqlite3.connect(_db_path)
-        cursor = conn.cursor()
-        cursor.execute(f'UPDATE facts SET {column_name} = ? WHERE id = ?', (new_value, id))
-        conn.commit()
-        conn.close()
+    def validate_fields(fields):
+        if not isinstance(fields, dict):
+            raise ValueError('fields must be an object')
+
+        values = {}
+        for column, value in fields.items():
+            if column not in EDITABLE_COLUMNS:
+                raise ValueError(f'Column {column!r} can not be edited')
+            if value is None or value == '':
+                continue
+            if EDITABLE_COLUMNS[column] is int:
+                if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+                    raise ValueError(f'{column} must be a whole number of 0 or more, not {value!r}')
+            elif not isinstance(value, str):
+                raise ValueError(f'{column} must be text, not {value!r}')
+            values[column] = EDITABLE_COLUMNS[column](value)
+        return values
+
+    def validate_edits(edits):
+        # [{"id": 1, "fields": {...}}, ...] -> [(1, values), ...], a malformed
+        # entry rejects the whole request before anything is written
+        if not isinstance(edits, list):
+            raise ValueError('Expected a list of edits')
+
+        parsed = []
+        for position, edit in enumerate(edits):
+            if not isinstance(edit, dict):
+                raise ValueError(f'Edit {position}: expected an object with "id" and "fields"')
+            fact_id = edit.get('id')
+            if isinstance(fact_id, bool) or not isinstance(fact_id, int):
+                raise ValueError(f'Edit {position}: id must be a fact id, not {fact_id!r}')
+            try:
+                parsed.append((fact_id, validate_fields(edit.get('fields'))))
+            except ValueError as e:
+                raise ValueError(f'Edit {position} (fact {fact_id}): {e}')
+        return parsed
+
+    def update_facts(edits):
+        # every (fact id, values) edit from validate_edits becomes one UPDATE,
+        # all of them in one transaction
+        now = int(time.time())
+
+        def apply_edits(cursor):
+            results = []
+            for fact_id, values in edits:
+                if not values:
+                    results.append({'id': fact_id, 'success': True, 'message': 'Nothing to update'})
+                    continue
+
+                # column names come from EDITABLE_COLUMNS only
+                assignments = ', '.join(f'{column} = ?' for column in values)
+                cursor.execute(f'UPDATE facts SET {assignments}, update_ts = ? WHERE id = ?',
+                               (*values.values(), now, fact_id))
+                if cursor.rowcount:
+                    results.append({'id': fact_id, 'success': True})
+                else:
+                    results.append({'id': fact_id, 'success': False, 'message': 'Unknown fact'})
+            return results
+
+        # no ticket cache eviction here: the cache lives in the demon, which
+        # re-wraps an edited fact when its description no longer matches
+        return write_transaction(apply_edits)
 
     def add_data_to_db(category, description):
-        conn = sqlite3.connect(_db_path)
-        cursor = conn.cursor()
-        cursor.execute(f'INSERT INTO facts (category, description, times_used, owner, create_ts, update_ts) VALUES (?, ?, ?, ?, ?, ?)', (category, description, 0, "admin", 0, 0))
-        conn.commit()
-        conn.close()
+        write_transaction(lambda cursor: cursor.execute(
+            'INSERT INTO facts (category, description, times_used, owner, create_ts, update_ts) VALUES (?, ?, ?, ?, ?, ?)',
+            (category, description, 0, "admin", 0, 0)))
+
+    def list_facts(category=None, search=None, sort='id', order='asc', after=None, limit=DEFAULT_PAGE_SIZE):
+        # keyset pagination: "after" is the sort key of the last row of the previous
+        # page, so every page is an index seek no matter how deep it is
+        descending = order == 'desc'
+        comparison = '<' if descending else '>'
+        direction = 'DESC' if descending else 'ASC'
+        where, params = [], []
+
+        if category:
+            where.append('category = ?')
+            params.append(category)
+        if search and fact_search.fts_available(get_connection().cursor()):
+            match_query = fact_search.build_match_query(search)
+            if match_query:
+                where.append('id IN (SELECT rowid FROM facts_fts WHERE facts_fts MATCH ?)')
+                params.append(match_query)
+        elif search:
+            where.append("description LIKE ? ESCAPE '\\'")
+            params.append('%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+
+        if sort == 'times_used':
+            if after:
+                last_times_used, last_id = (int(part) for part in after.split(':'))
+                where.append(f'(times_used, id) {comparison} (?, ?)')
+                params.extend((last_times_used, last_id))
+            order_by = f'times_used {direction}, id {direction}'
+        else:
+            if after:
+                where.append(f'id {comparison} ?')
+                params.append(int(after))
+            order_by = f'id {direction}'
+
+        sql = 'SELECT id, category, description, times_used FROM facts'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += f' ORDER BY {order_by} LIMIT ?'
+        params.append(limit + 1)
+
+        cursor = get_connection().cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+        facts = [{'id': row[0], 'category': row[1], 'description': row[2], 'times_used': row[3]} for row in rows[:limit]]
+        next_after = None
+        if len(rows) > limit:
+            last = facts[-1]
+            next_after = f"{last['times_used']}:{last['id']}" if sort == 'times_used' else str(last['id'])
+
+        return facts, next_after
+
+    # static assets are hashed once per worker; the hash goes into the URL and,
+    # with the templates, into every page ETag so a deploy invalidates them
+    fingerprints = fingerprint_files(static_directory)
+    build_id = hashlib.sha256(repr(sorted(fingerprints.items())).encode()
+                              + repr(sorted(fingerprint_files(template_directory).items())).encode()).hexdigest()[:8]
+    compressed_assets = {}
+
+    @app.template_global()
+    def asset_url(filename):
+        return url_for('static', filename=filename, v=fingerprints.get(filename))
+
+    @app.template_global()
+    def fleet_server():
+        # set on fleet clients, whose facts are only edited on that server
+        return fleet.SERVER
+
+    def fleet_read_only(view):
+        # a fleet client's facts are a copy of the server's, the next sync
+        # would overwrite a local edit
+        @functools.wraps(view)
+        def check(*args, **kwargs):
+            if fleet.SERVER:
+                return jsonify({'success': False,
+                                'message': f'This machine is a fleet client, edit facts on {fleet.SERVER}'}), 409
+            return view(*args, **kwargs)
+        return check
+
+    def facts_state():
+        # (change counter, unix time of the last change), both kept by triggers
+        cursor = get_connection().cursor()
+        cursor.execute("SELECT name, value FROM counters WHERE name IN ('facts_version', 'facts_modified')")
+        values = dict(cursor.fetchall())
+        return values.get('facts_version', 0), values.get('facts_modified')
+
+    def conditional(tag, render):
+        # answers 304 without rendering when the facts did not change since the
+        # browser's copy, fact pages are private and revalidated on every use
+        if not app.config['HTTP_CACHING']:
+            return render()
+        version, modified = facts_state()
+        etag = f'{tag}-{version}-{build_id}'
+        if request.if_none_match:
+            fresh = request.if_none_match.contains_weak(etag)
+        else:
+            since = request.if_modified_since
+            fresh = bool(modified and since and since.timestamp() >= modified)
+
+        response = app.response_class(status=304) if fresh else make_response(render())
+        if response.status_code not in (200, 304):
+            return response
+        response.set_etag(etag, weak=True)
+        if modified:
+            response.last_modified = modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    @app.before_request
+    def start_metrics():
+        # each worker flushes its histograms and follows the profiler switch,
+        # the thread is started after gunicorn --preload has forked
+        metrics.start_flusher()
+
+    @app.after_request
+    def finish_response(response):
+        is_static = request.endpoint == 'static'
+        if app.config['HTTP_CACHING'] and is_static and request.args.get('v') and request.args.get('v') == fingerprints.get(request.view_args.get('filename')):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+
+        if not app.config['COMPRESS_RESPONSES'] or response.status_code != 200 or 'Content-Encoding' in response.headers \
+                or not response.mimetype.startswith(COMPRESSIBLE_TYPES) or (response.is_streamed and not is_static):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = pick_encoding(request.accept_encodings)
+        if not encoding:
+            return response
+
+        if is_static:
+            # assets compress once per worker
+            key = (request.view_args.get('filename'), response.get_etag()[0], encoding)
+            data = compressed_assets.get(key)
+            if data is None:
+                response.direct_passthrough = False
+                plain = response.get_data()
+                if len(plain) < COMPRESS_MIN_SIZE:
+                    return response
+                data = compressed_assets[key] = compress(plain, encoding)
+        else:
+            plain = response.get_data()
+            if len(plain) < COMPRESS_MIN_SIZE:
+                return response
+            data = compress(plain, encoding)
+
+        response.direct_passthrough = False
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def get_category_names():
+        cursor = get_connection().cursor()
+        cursor.execute("SELECT name FROM categories WHERE fact_count > 0 ORDER BY name")
+        return [row[0] for row in cursor]
 
     @app.route('/')
     @login_required
     def index():
-        # return 'Welcome to the home page!'
-        facts = Fact.query.all()
-        return render_template('index.html', data=facts)
+        # rows are loaded page by page from /api/facts
+        return conditional('index', lambda: render_template('index.html', categories=get_category_names(),
+                                                            page_size=DEFAULT_PAGE_SIZE))
+
+    @app.route('/api/facts')
+    @login_required
+    def api_facts():
+        sort = request.args.get('sort', 'id')
+        order = request.args.get('order', 'asc')
+        if sort not in ('id', 'times_used') or order not in ('asc', 'desc'):
+            return jsonify({'success': False, 'message': 'sort must be id or times_used, order asc or desc'}), 400
+
+        try:
+            limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid limit or after'}), 400
+
+        def render():
+            try:
+                facts, next_after = list_facts(
+                    category=request.args.get('category') or None,
+                    search=request.args.get('q') or None,
+                    sort=sort,
+                    order=order,
+                    after=request.args.get('after') or None,
+                    limit=limit,
+                )
+            except ValueError:
+                return jsonify({'success': False, 'message': 'Invalid limit or after'}), 400
+            return jsonify({'success': True, 'facts': facts, 'next': next_after})
+
+        return conditional('facts', render)
     
     @app.route('/add_entry', methods=['GET', 'POST'])
     @login_required
+    @fleet_read_only
     def add_entry():
         form = EntryForm()
 
-        if form.validate_on_submit():
+        duplicates = []
+
+        if form.validate_on_submit() and not form.add_anyway.data:
+            cursor = get_connection().cursor()
+            if fact_search.fts_available(cursor):
+                duplicates = fact_search.find_duplicates(cursor, form.description.data)
+
+        if form.validate_on_submit() and not duplicates:
             # Create a new Entry instance and add it to the database
             # new_entry = Entry(category=form.category.data, description=form.description.data, times_used=0, owner="admin", create_ts=0, update_ts=0)
             # db.session.add(new_entry)
@@ -103,7 +420,7 @@ def create_app():
 
             # return redirect(url_for('view_entries'))
 
-        return render_template('add_entry.html', form=form)
+        return render_template('add_entry.html', form=form, duplicates=duplicates)
 
     @app.route('/login', methods=['GET', 'POST'])
     def login():
@@ -120,7 +437,7 @@ def create_app():
             user = users.get(username)
 
             if user and user['password'] == password:
-                login_user(User(username))
+                login_user(known_users[username])
                 flash('Login successful!', 'success')
                 return redirect(url_for('index'))
             else:
@@ -129,22 +446,173 @@ def create_app():
         return render_template('login.html', form=form)
 
     @app.route('/update/<int:id>', methods=['POST'])
+    @login_required
+    @fleet_read_only
     def update(id):
         try:
-            data = request.json
-            print("DATA:", type(data))
-            for column in data:
-                value = data[column]
-                if value:
-                    update_data_in_db(id, column, value)
+            values = validate_fields(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
 
-            # update_data_in_db(id, 'email', data['email'])
-            # Add other columns as needed
+        try:
+            result, = update_facts([(id, values)])
+            if not result['success']:
+                return jsonify(result)
 
             return jsonify({'success': True, 'message': 'Data updated successfully'})
         except Exception as e:
             return jsonify({'success': False, 'message': str(e)})
 
+    @app.route('/update', methods=['POST'])
+    @login_required
+    @fleet_read_only
+    def update_many():
+        # body: [{"id": 1, "fields": {"category": "...", "times_used": 0}}, ...]
+        try:
+            edits = validate_edits(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        try:
+            results = update_facts(edits)
+        except Exception as e:
+            return jsonify({'success': False, 'message': str(e)})
+
+        return jsonify({'success': all(result['success'] for result in results), 'results': results})
+
+    @app.route('/search')
+    @login_required
+    def search():
+        cursor = get_connection().cursor()
+        if not fact_search.fts_available(cursor):
+            return jsonify({'success': False, 'message': 'Full-text search is not available'}), 501
+
+        try:
+            limit = min(max(int(request.args.get('limit', 20)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid limit'}), 400
+
+        results = fact_search.search_facts(cursor, request.args.get('q', ''),
+                                           category=request.args.get('category') or None, limit=limit)
+        return jsonify({'success': True, 'results': results})
+
+    @app.route('/print', methods=['POST'])
+    @login_required
+    def submit_print():
+        data = request.get_json(silent=True) or {}
+        try:
+            count = int(data.get('count') or 1)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'count must be a number'}), 400
+        if not 1 <= count <= print_queue.MAX_BATCH_SIZE:
+            return jsonify({'success': False, 'message': f'count must be between 1 and {print_queue.MAX_BATCH_SIZE}'}), 400
+
+        job_id = print_queue.submit(data.get('category') or None, source="web", count=count)
+        return jsonify({'success': True, 'job_id': job_id})
+
+    @app.route('/print/<int:job_id>')
+    @login_required
+    def print_status(job_id):
+        job = print_queue.get_job(job_id)
+        if not job:
+            return jsonify({'success': False, 'message': 'Unknown print job'}), 404
+        return jsonify({'success': True, 'job': job})
+
+    @app.route('/print/stats')
+    @login_required
+    def print_stats():
+        return jsonify(print_queue.get_stats())
+
+    @app.route('/stats')
+    @login_required
+    def stats():
+        # reads the usage rollups only, see src/usage_log.py
+        usage = usage_log.summary()
+        busiest = max([hour['prints'] for hour in usage['hours']] + [1])
+        return render_template('stats.html', usage=usage, busiest=busiest,
+                               hour_label=lambda hour: time.strftime('%a %H:00', time.localtime(hour)))
+
+    @app.route('/api/stats')
+    @login_required
+    def api_stats():
+        try:
+            hours = min(max(int(request.args.get('hours', 48)), 1), 24 * 31)
+            days = min(max(int(request.args.get('days', 7)), 1), 366)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'hours and days must be integers'}), 400
+        return jsonify(dict(usage_log.summary(hours=hours, days=days), success=True))
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        # stage latency histograms of every process, in Prometheus text format
+        metrics.flush()
+        return app.response_class(metrics.render_prometheus(metrics.load()), mimetype="text/plain; version=0.0.4")
+
+    @app.route('/export')
+    @login_required
+    def export_facts():
+        # streamed one batch at a time, memory does not grow with the table
+        export_format = request.args.get('format', 'csv')
+        if export_format not in fact_export.FORMATS:
+            return jsonify({'success': False, 'message': 'format must be csv or jsonl'}), 400
+        chunks = fact_export.iter_export(export_format, category=request.args.get('category') or None)
+        return app.response_class(stream_with_context(chunks), mimetype=fact_export.FORMATS[export_format],
+                                  headers={'Content-Disposition': f'attachment; filename=facts.{export_format}'})
+
+    @app.route('/import', methods=['POST'])
+    @login_required
+    @fleet_read_only
+    def import_pack():
+        # the body is the pack itself, e.g. curl -T facts.csv '.../import?format=csv'.
+        # It is parsed as it arrives and inserted batch by batch, the response
+        # is one JSON line per committed batch and a last line with the result.
+        import_format = request.args.get('format', 'jsonl')
+        if import_format not in fact_import.PACK_READERS:
+            return jsonify({'success': False, 'message': 'format must be csv, json or jsonl'}), 400
+        body = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+
+        def run():
+            result = {'read': 0, 'inserted': 0, 'skipped': 0}
+            try:
+                for result in fact_import.iter_import(get_connection(), fact_import.iter_file(body, import_format)):
+                    yield json.dumps({'read': result['read']}) + '\n'
+            except (ValueError, KeyError, csv.Error, sqlite3.Error) as e:
+                # batches before the error stay imported, sending the pack again skips them
+                yield json.dumps(dict(result, success=False, message=f'Could not import: {e}')) + '\n'
+                return
+            yield json.dumps(dict(result, success=True)) + '\n'
+
+        return app.response_class(stream_with_context(run()), mimetype='application/x-ndjson')
+
+    # fleet server, see src/fleet.py. Machines authenticate with the shared
+    # token instead of a login, the routes answer 404 while no token is set.
+    @app.route('/fleet/facts')
+    def fleet_facts():
+        if not fleet.check_token(request.headers.get('X-Fleet-Token')):
+            return jsonify({'success': False, 'message': 'Unknown fleet token'}), 404
+        try:
+            since = int(request.args.get('since', 0))
+            limit = min(max(int(request.args.get('limit', fleet.PAGE_SIZE)), 1), fleet.PAGE_SIZE)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'since and limit must be integers'}), 400
+        return jsonify(fleet.facts_since(get_connection().cursor(), since, limit))
+
+    @app.route('/fleet/usage', methods=['POST'])
+    def fleet_usage():
+        # body: {"machine": "pi-3", "batch": 17, "deltas": {"<fact id>": <prints>, ...}}
+        if not fleet.check_token(request.headers.get('X-Fleet-Token')):
+            return jsonify({'success': False, 'message': 'Unknown fleet token'}), 404
+        body = request.get_json(silent=True) or {}
+        try:
+            machine = str(body['machine'])
+            batch = int(body['batch'])
+            deltas = {int(fact_id): int(count) for fact_id, count in dict(body['deltas']).items()}
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'machine, batch and deltas are required'}), 400
+        if any(count < 0 for count in deltas.values()):
+            return jsonify({'success': False, 'message': 'deltas can not be negative'}), 400
+        return jsonify({'success': True, 'applied': fleet.apply_usage(machine, batch, deltas)})
+
     @app.route('/logout')
     @login_required
     def logout():
@@ -152,6 +620,10 @@ def create_app():
         flash('Logout successful!', 'success')
         return redirect(url_for('index'))
 
+    # compile every template now, before gunicorn --preload forks the workers
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
     return app
 
 # if __name__ == '__main__':
@@ -0,0 +1,136 @@
+// fact table of index.html: pages from /api/facts, inline editing through /update/<id>
+// PAGE_SIZE and READ_ONLY (fleet clients) are set by the template
+let nextPage = null;
+
+function editableCell(fact, column) {
+    const td = document.createElement('td');
+    td.className = 'editable';
+    td.dataset.id = fact.id;
+    td.dataset.column = column;
+
+    const textSpan = document.createElement('span');
+    textSpan.className = 'text';
+    textSpan.innerText = fact[column];
+
+    const inputField = document.createElement('input');
+    inputField.className = 'input';
+    inputField.type = 'text';
+    inputField.value = fact[column];
+    inputField.dataset.column = column;
+    inputField.style.display = 'none';
+
+    td.append(textSpan, inputField);
+    return td;
+}
+
+function renderFact(fact) {
+    const row = document.createElement('tr');
+    row.id = `row_${fact.id}`;
+
+    const idCell = document.createElement('td');
+    idCell.innerText = fact.id;
+
+    const actions = document.createElement('td');
+    if (!READ_ONLY) {
+        const editButton = document.createElement('button');
+        editButton.className = 'btn btn-primary';
+        editButton.innerText = 'Edit';
+        editButton.onclick = () => toggleEditSave(fact.id);
+        actions.append(editButton);
+    }
+
+    row.append(idCell, editableCell(fact, 'category'), editableCell(fact, 'description'),
+               editableCell(fact, 'times_used'), actions);
+    return row;
+}
+
+function loadFacts(reset) {
+    const [sort, order] = document.getElementById('filter_sort').value.split(':');
+    const params = new URLSearchParams({sort, order, limit: PAGE_SIZE});
+    const category = document.getElementById('filter_category').value;
+    const search = document.getElementById('filter_search').value;
+    if (category) params.set('category', category);
+    if (search) params.set('q', search);
+    if (!reset && nextPage) params.set('after', nextPage);
+
+    fetch(`/api/facts?${params}`)
+    .then(response => response.json())
+    .then(data => {
+        const tbody = document.getElementById('facts');
+        if (reset) tbody.innerHTML = '';
+        data.facts.forEach(fact => tbody.append(renderFact(fact)));
+
+        nextPage = data.next;
+        document.getElementById('load_more').style.display = nextPage ? 'inline-block' : 'none';
+    })
+    .catch(error => {
+        console.error('Error:', error);
+    });
+}
+
+document.getElementById('filters').addEventListener('submit', event => {
+    event.preventDefault();
+    loadFacts(true);
+});
+document.getElementById('load_more').addEventListener('click', () => loadFacts(false));
+loadFacts(true);
+
+function toggleEditSave(id) {
+    const row = document.getElementById(`row_${id}`);
+    row.style.background = "lightblue"
+    const editButton = row.querySelector('button');
+    const editableFields = row.querySelectorAll('.editable');
+
+    if (editButton.innerText === 'Edit') {
+        // Switch to editing mode
+        editButton.innerText = 'Save';
+
+        editableFields.forEach(field => {
+            const textSpan = field.querySelector('.text');
+            const inputField = field.querySelector('.input');
+
+            textSpan.style.display = 'none';
+            inputField.style.display = 'block';
+        });
+    } else {
+        // Switch to saving mode
+        editButton.innerText = 'Edit';
+
+        // Get the updated values from input fields
+        const updatedData = {
+            category: row.querySelector('.input[data-column="category"]') ? row.querySelector('.input[data-column="category"]').value : null,
+            description: row.querySelector('.input[data-column="description"]') ? row.querySelector('.input[data-column="description"]').value : null,
+            times_used: row.querySelector('.input[data-column="times_used"]') ? row.querySelector('.input[data-column="times_used"]').value : null,
+            // Add other columns as needed
+        };
+
+        // Send the updated data to the server using AJAX (you might want to use a library like Axios)
+        fetch(`/update/${id}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(updatedData),
+        })
+        .then(response => response.json())
+        .then(data => {
+            // Handle response from the server, e.g., show success message
+            console.log(data);
+
+            // Update the text spans with the new values
+            editableFields.forEach(field => {
+                const textSpan = field.querySelector('.text');
+                const inputField = field.querySelector('.input');
+
+                textSpan.innerText = inputField.value;
+                textSpan.style.display = 'inline';
+                inputField.style.display = 'none';
+            });
+            row.style.background = "white"
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            row.style.background = "red"
+        });
+    }
+}
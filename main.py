@@ -21,15 +21,17 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-import cups
-import time
-import os
-import textwrap
-from reportlab.pdfgen import canvas
-from reportlab.lib import utils
+import os, sys
+import io
+import tempfile
 from datetime import datetime
-from src.db_utils import init_db
+from src.db_utils import get_connection
+from src.fact_selector import pick_random_category
+from src.fact_scheduler import create_scheduler
+from src import ticket_cache, metrics, usage_log
+from src.machine_status import status
 import logging
+import atexit
 
 script_directory = os.path.dirname(os.path.abspath(__file__))
 logs_path = os.path.join(script_directory, 'fun_fact_logs.log')
@@ -43,40 +45,67 @@ logging.basicConfig(
 )
 
 PRINTER_NAME = 'BIXOLON_SRP-E300'
+# "cups" prints the PDF through CUPS, "escpos" sends a raster straight to ESCPOS_DEVICE
+PRINTER_BACKEND = os.environ.get('FUN_FACTS_PRINTER_BACKEND', 'cups')
+# /dev/usb/lp0, tcp://host:9100, or any plain file to act as a fake printer
+ESCPOS_DEVICE = os.environ.get('FUN_FACTS_ESCPOS_DEVICE', '/dev/usb/lp0')
+# least_used, deck or weighted, see src/fact_scheduler.py
+SCHEDULER = os.environ.get('FUN_FACTS_SCHEDULER', 'least_used')
+NO_REPEAT_WINDOW = int(os.environ.get('FUN_FACTS_NO_REPEAT', '20'))
+# where PDFs go when pycups is too old to stream them, RAM backed when possible
+TMPFS_DIRECTORY = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+scheduler = create_scheduler(SCHEDULER, no_repeat=NO_REPEAT_WINDOW)
+atexit.register(scheduler.save)
+
+TICKET_SIZE = (200, 200)
+
+def draw_ticket(c, image_path, text):
+    width, height = TICKET_SIZE
+
+    # Draw the pre-dithered 1-bit category image (see src/image_assets.py),
+    # decoded once per process by the ticket cache
+    img = ticket_cache.get_image(image_path)
+    c.drawImage(img, 75, height - 50, width=50, height=50)
+
+    # Add text to the PDF with line breaks and wrapping
+    text_object = c.beginText(7, height - 65)
+    text_object.setFont("Helvetica", 10)
+
+    # Split the input text by newline and add each line to the text object
+    lines = text.split("\n")
+    for line in lines:
+        text_object.textLine(line)
+
+    c.drawText(text_object)
+    c.setFont('Helvetica', 7.5)
+
+    # Add time and date at the bottom
+    current_datetime = datetime.now()
+    human_readable_date = current_datetime.strftime("%H:%M:%S %d %B %Y")
+    c.drawString(7, height - 140, human_readable_date)
 
 def create_pdf(file_path, image_path, text):
+    return create_batch_pdf(file_path, [(image_path, text)])
+
+@metrics.timed("render_pdf")
+def create_batch_pdf(file_path, tickets):
+    # one 200x200 page per ticket, so the driver still cuts after every ticket.
+    # file_path may also be a file object, see render_pdf
+
+    # reportlab and cups take seconds to import on a Pi, so they are imported
+    # on the first print instead of when the demon starts
+    from reportlab.pdfgen import canvas
+
     success = True
     
     try:
-        width, height = 200, 200
         print("generating pdf...")
-        c = canvas.Canvas(file_path, pagesize=(width, height))
-
-        # check if given img exists if not use about_me.png
-        if not os.path.exists(image_path):
-            image_path = os.path.join(script_directory, "src", "images", "about_me.png")
-
-        # Draw the image on the PDF
-        img = utils.ImageReader(image_path)
-        print(img)
-        c.drawImage(img, 75, height - 50, width=50, height=50)
+        c = canvas.Canvas(file_path, pagesize=TICKET_SIZE)
 
-        # Add text to the PDF with line breaks and wrapping
-        text_object = c.beginText(7, height - 65)
-        text_object.setFont("Helvetica", 10)
-
-        # Split the input text by newline and add each line to the text object
-        lines = text.split("\n")
-        for line in lines:
-            text_object.textLine(line)
-
-        c.drawText(text_object)
-        c.setFont('Helvetica', 7.5)
-
-        # Add time and date at the bottom
-        current_datetime = datetime.now()
-        human_readable_date = current_datetime.strftime("%H:%M:%S %d %B %Y")
-        c.drawString(7, height - 140, human_readable_date)
+        for image_path, text in tickets:
+            draw_ticket(c, image_path, text)
+            c.showPage()
 
         # Save the PDF
         c.save()
@@ -89,7 +118,47 @@ def create_pdf(file_path, image_path, text):
     return success
 
 
-def print_fact(pdf_file_path=None):
+def render_pdf(tickets):
+    # rendered in memory: nothing touches the SD card and concurrent prints
+    # never share a file
+    buffer = io.BytesIO()
+    if not create_batch_pdf(buffer, tickets):
+        return None
+    return buffer.getvalue()
+
+@metrics.timed("cups_submit")
+def submit_pdf(pdf_data, pages=1, title="Print Job"):
+    import cups
+
+    conn = cups.Connection()
+    if PRINTER_NAME not in conn.getPrinters():
+        logging.error(f"Printer '{PRINTER_NAME}' not found.")
+        return False
+
+    if not hasattr(conn, "createJob"):
+        # pycups without the streaming API: a private file on tmpfs, removed
+        # once printFile has handed it to cupsd
+        with tempfile.NamedTemporaryFile(prefix="fun_fact_", suffix=".pdf", dir=TMPFS_DIRECTORY) as pdf_file:
+            pdf_file.write(pdf_data)
+            pdf_file.flush()
+            return print_fact(pdf_file.name, pages)
+
+    # stream the PDF into a new job instead of printing a file
+    print_id = conn.createJob(PRINTER_NAME, title, {"page-ranges": f"1-{pages}"})
+    conn.startDocument(PRINTER_NAME, print_id, title, "application/pdf", 1)
+    write_status = conn.writeRequestData(pdf_data, len(pdf_data))
+    ipp_status = conn.finishDocument(PRINTER_NAME)
+    if write_status != cups.HTTP_CONTINUE or ipp_status != cups.IPP_OK:
+        logging.error(f"Print job {print_id} failed: http status {write_status}, ipp status {ipp_status}")
+        conn.cancelJob(print_id)
+        return False
+
+    print(f"Print job sent to {PRINTER_NAME}. Job ID: {print_id}")
+    return True
+
+def print_fact(pdf_file_path=None, pages=1):
+    import cups
+
     conn = cups.Connection()
     printers = conn.getPrinters()
     success = False
@@ -109,7 +178,7 @@ def print_fact(pdf_file_path=None):
         pdf_file_path,
         "Print Job",
         {
-            "page-ranges": "1-1",
+            "page-ranges": f"1-{pages}",
             "document-format": "application/pdf"
         }
     )
@@ -120,58 +189,50 @@ def print_fact(pdf_file_path=None):
     return success
 
 
-def get_random_category():
-    conn, cursor = init_db()
-    sql = """SELECT category FROM facts GROUP BY category ORDER BY RANDOM() LIMIT 1"""
-    cursor.execute(sql)
-    row = cursor.fetchone()
-    random_category = row[0]
-
-    if conn:
-        conn.close()
-
-    return random_category
+@metrics.timed("escpos_print")
+def print_fact_escpos(image_path, text, category, fun_fact):
+    from src import escpos_printer
 
-def get_fun_fact(category=None):
-    conn, cursor = init_db()
-    current_timestamp = int(time.time())
+    success = False
+    try:
+        logging.info(f"Printing fact from [{category}]: {fun_fact}")
+        success = escpos_printer.print_ticket(ESCPOS_DEVICE, image_path, text)
+    except Exception as e:
+        logging.error(f"There was an error printing fact to {ESCPOS_DEVICE}: {e}")
 
-    smallest_times_used_sql = """SELECT times_used FROM facts WHERE category = ? ORDER BY times_used ASC LIMIT 1"""
+    return success
 
-    if not category:
-        category = get_random_category()
 
-    cursor.execute(smallest_times_used_sql, (category, ))
-    row = cursor.fetchone()
-    smallest_times_used = row[0]
+def get_random_category():
+    cursor = get_connection().cursor()
+    return pick_random_category(cursor)
 
-    sql = """SELECT id, times_used, category, description FROM facts 
-                WHERE category = ? AND times_used = ? ORDER BY RANDOM() LIMIT 1"""
+def format_fact(description):
+    # if random_fact is stats from about_this_machine, print stats about this machine...
+    if description == "stats":
+        total_prints = status.get_total_prints()
+        return f"I've printed {total_prints} facts in total and used around {total_prints * 8 / 100}m of paper."
+    return description
 
-    cursor.execute(sql, (category, smallest_times_used))
-    row = cursor.fetchone()
+@metrics.timed("select_fact")
+def get_fun_fact(category=None):
+    conn = get_connection()
+    row = scheduler.select(conn, category)
     fact_id, times_used, category, random_fact = row
 
-    update_sql = """
-                UPDATE facts
-                SET times_used = ?, update_ts = ?
-                WHERE id = ?;
-    """
-    cursor.execute(update_sql, (times_used + 1, current_timestamp, fact_id))
-
-    # if random_fact is stats from about_this_machine, print stats about this machine...
-    if random_fact == "stats":
-        sql = """SELECT SUM(times_used) as total_sum FROM facts"""
-        cursor.execute(sql)
-        row = cursor.fetchone()
-        total_prints = row[0]
-        random_fact = f"I've printed {total_prints} facts in total and used around {total_prints * 8 / 100}m of paper."
+    status.record_print()
+    usage_log.record(fact_id, category)
 
-    if conn:
-        conn.commit()
-        conn.close()
+    return format_fact(random_fact), category, fact_id
 
-    return random_fact, category
+@metrics.timed("select_batch")
+def get_fun_facts(count, category=None):
+    # count facts selected and marked used in one transaction
+    rows = scheduler.select_batch(get_connection(), count, category)
+    status.record_print(len(rows))
+    for fact_id, _, category, _ in rows:
+        usage_log.record(fact_id, category)
+    return [(format_fact(description), category, fact_id) for fact_id, _, category, description in rows]
 
 
 def print_fact_by_category(_category=None):
@@ -182,22 +243,71 @@ def print_fact_by_category(_category=None):
     else:
         logging.info(f"Generating fun fact in category: {_category}")
     
-    fun_fact, category = get_fun_fact(_category)
+    fun_fact, category, fact_id = get_fun_fact(_category)
 
     # split text to fit on the paper
-    wrapped_content = " ".join(str(category).split("_")).title() + ':\n' + textwrap.fill(fun_fact, 40) + '\n' * 4
+    wrapped_content = ticket_cache.get_wrapped_text(fact_id, category, fun_fact)
+
+    image_path, _ = ticket_cache.get_prologue(category)
 
-    image_path = os.path.join(script_directory, "src", "images", category+".png")
-    pdf_file_path = os.path.join(script_directory, "fact_to_print.pdf")
+    if PRINTER_BACKEND == 'escpos':
+        return print_fact_escpos(image_path, wrapped_content, category, fun_fact)
 
-    pdf = create_pdf(pdf_file_path, image_path, wrapped_content)
+    pdf = render_pdf([(image_path, wrapped_content)])
 
     if pdf:
         logging.info(f"Printing fact from [{category}]: {fun_fact}")
-        success = print_fact(pdf_file_path)
+        success = submit_pdf(pdf)
     else:
         logging.error(f"There was an error printing fact, check printer status and if USB cable connected correctly!")
         print("Error generating pdf... exiting.")
 
     return success
 
+
+def print_batch(count, _category=None):
+    # count tickets in one printer job: a multi-page PDF (one page, and one
+    # cut, per ticket) for CUPS, or back to back rasters for ESC/POS
+    logging.info(f"Generating batch of {count} fun facts in category: {_category or 'random'}")
+
+    facts = get_fun_facts(count, _category)
+    if not facts:
+        logging.error(f"No facts to print in category: {_category}")
+        return False
+
+    tickets = []
+    for fun_fact, category, fact_id in facts:
+        image_path, _ = ticket_cache.get_prologue(category)
+        tickets.append((image_path, ticket_cache.get_wrapped_text(fact_id, category, fun_fact)))
+
+    if PRINTER_BACKEND == 'escpos':
+        from src import escpos_printer
+
+        try:
+            return escpos_printer.print_tickets(ESCPOS_DEVICE, tickets)
+        except Exception as e:
+            logging.error(f"There was an error printing batch to {ESCPOS_DEVICE}: {e}")
+            return False
+
+    pdf = render_pdf(tickets)
+    if not pdf:
+        logging.error(f"There was an error generating the batch pdf")
+        return False
+
+    logging.info(f"Printing batch of {len(tickets)} facts")
+    return submit_pdf(pdf, pages=len(tickets), title=f"Batch of {len(tickets)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print fun facts straight to the printer, without the print queue")
+    parser.add_argument("category", nargs="?", default=None, help="category, random if omitted")
+    parser.add_argument("--batch", type=int, default=1, help="tickets printed as one printer job")
+    args = parser.parse_args()
+
+    if args.batch > 1:
+        success = print_batch(args.batch, args.category)
+    else:
+        success = print_fact_by_category(args.category)
+    sys.exit(0 if success else 1)
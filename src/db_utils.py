@@ -1,38 +1,56 @@
 import sqlite3
 import os, time
-import json
+import random
+import fcntl
+import threading
 
 script_directory = os.path.dirname(os.path.abspath(__file__))
-database_path = os.path.join(script_directory, 'facts.db')
+database_path = os.environ.get("FUN_FACTS_DB", os.path.join(script_directory, 'facts.db'))
 fact_json_path = os.path.join(script_directory, 'facts.json')
 
-def fetch_and_parse_json():
-    with open(fact_json_path, 'r') as file:
-        data = json.load(file)
-        return data
-
-def populate_db(conn, cursor):
-    json_data = fetch_and_parse_json()
-    current_timestamp = int(time.time())
-
-    for category in json_data:
-        print(f"Adding {category} to database...")
-        facts = json_data[category]
-        for fact in facts:
-            sql = """
-                    INSERT INTO facts (category, description, times_used, owner, create_ts, update_ts)
-                    VALUES (?,?,?,?,?,?);
-            """
-            cursor.execute(sql, (category, fact, 0, "szymon", current_timestamp, current_timestamp))
+# pragmas applied to every connection handed out by get_connection()
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -4000",
+    "PRAGMA busy_timeout = 5000",
+)
 
-    if conn:
-        conn.commit()
-        conn.close()
+# a write transaction still locked out after busy_timeout is retried this
+# many times, with a jittered exponential backoff
+WRITE_RETRIES = 4
+WRITE_RETRY_DELAY = 0.05
+CHANGE_POLL_INTERVAL = 1.0
+
+_local = threading.local()
+_bootstrap_lock = threading.Lock()
+_bootstrapped = set()
+
+def sync_facts_json(conn):
+    # import facts added to facts.json since the last sync, skipped while its mtime is unchanged
+    from src import fact_import
 
-def init_db():
-    conn = sqlite3.connect(database_path)
     cursor = conn.cursor()
+    # once a fleet client synced, its facts come from the fleet server only
+    cursor.execute("SELECT value FROM counters WHERE name = 'fleet_version'")
+    row = cursor.fetchone()
+    if row and row[0]:
+        return None
+
+    mtime = int(os.path.getmtime(fact_json_path))
+    cursor.execute("SELECT value FROM counters WHERE name = 'facts_json_mtime'")
+    row = cursor.fetchone()
+    if row and row[0] == mtime:
+        return None
+
+    result = fact_import.import_pack(fact_json_path, conn)
+    print(f"Synced facts.json: {result['inserted']} added, {result['skipped']} already known")
+    cursor.execute("INSERT OR REPLACE INTO counters (name, value) VALUES ('facts_json_mtime', ?)", (mtime, ))
+    conn.commit()
+    return result
 
+def create_schema(cursor):
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS facts (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -45,18 +63,449 @@ def init_db():
         )
     ''')
 
-    sql = """SELECT COUNT(id) FROM facts"""
-    cursor.execute(sql)
-    row = cursor.fetchone()
-    entires_count = row[0]
+    # content_hash dedupes imports, see src/fact_import.py
+    cursor.execute("PRAGMA table_info(facts)")
+    if "content_hash" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE facts ADD COLUMN content_hash TEXT")
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_facts_content_hash ON facts (content_hash)
+    ''')
 
-    print("\n\nFACTS COUNT:", entires_count)
+    # an edit makes the stored hash stale; clear it and let the next import's
+    # backfill hash the new text. Statements that set the hash themselves
+    # (fleet sync) keep theirs.
+    cursor.executescript('''
+    CREATE TRIGGER IF NOT EXISTS facts_content_hash_update AFTER UPDATE OF category, description ON facts
+    WHEN (OLD.category IS NOT NEW.category OR OLD.description IS NOT NEW.description)
+        AND NEW.content_hash IS OLD.content_hash
+    BEGIN
+        UPDATE facts SET content_hash = NULL WHERE id = NEW.id;
+    END;
+    ''')
 
-    if not entires_count:
-        populate_db(conn, cursor)
+    # least-used lookups seek on (category, times_used) and walk rowids within it
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_facts_category_times_used ON facts (category, times_used)
+    ''')
 
-    # reopen connection
-    conn = sqlite3.connect(database_path)
-    cursor = conn.cursor()
+    # web editor listing: sorted by usage across all categories, and by id within one
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_facts_times_used ON facts (times_used)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_facts_category ON facts (category)
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS categories (
+        name TEXT PRIMARY KEY,
+        fact_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    cursor.executescript('''
+    CREATE TRIGGER IF NOT EXISTS facts_categories_insert AFTER INSERT ON facts
+    WHEN NEW.category IS NOT NULL
+    BEGIN
+        INSERT OR IGNORE INTO categories (name, fact_count) VALUES (NEW.category, 0);
+        UPDATE categories SET fact_count = fact_count + 1 WHERE name = NEW.category;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS facts_categories_delete AFTER DELETE ON facts
+    WHEN OLD.category IS NOT NULL
+    BEGIN
+        UPDATE categories SET fact_count = fact_count - 1 WHERE name = OLD.category;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS facts_categories_update AFTER UPDATE OF category ON facts
+    WHEN OLD.category IS NOT NEW.category
+    BEGIN
+        UPDATE categories SET fact_count = fact_count - 1 WHERE name = OLD.category;
+        INSERT OR IGNORE INTO categories (name, fact_count) VALUES (NEW.category, 0);
+        UPDATE categories SET fact_count = fact_count + 1 WHERE name = NEW.category;
+    END;
+    ''')
+
+    # running totals, read instead of re-summing the facts table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    cursor.executescript('''
+    CREATE TRIGGER IF NOT EXISTS facts_total_prints_update AFTER UPDATE OF times_used ON facts
+    BEGIN
+        UPDATE counters SET value = value + IFNULL(NEW.times_used, 0) - IFNULL(OLD.times_used, 0)
+        WHERE name = 'total_prints';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS facts_total_prints_insert AFTER INSERT ON facts
+    WHEN NEW.times_used
+    BEGIN
+        UPDATE counters SET value = value + NEW.times_used WHERE name = 'total_prints';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS facts_total_prints_delete AFTER DELETE ON facts
+    WHEN OLD.times_used
+    BEGIN
+        UPDATE counters SET value = value - OLD.times_used WHERE name = 'total_prints';
+    END;
+    ''')
+
+    # change stamps for fleet clients, see src/fleet.py: every insert and every
+    # change to a fact takes the next 'facts_version'
+    cursor.execute("PRAGMA table_info(facts)")
+    if "version" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE facts ADD COLUMN version INTEGER")
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_facts_version ON facts (version)
+    ''')
+
+    cursor.executescript('''
+    CREATE TRIGGER IF NOT EXISTS facts_version_insert AFTER INSERT ON facts
+    BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'facts_version';
+        UPDATE facts SET version = (SELECT value FROM counters WHERE name = 'facts_version') WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS facts_version_update AFTER UPDATE OF category, description, times_used ON facts
+    BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'facts_version';
+        UPDATE facts SET version = (SELECT value FROM counters WHERE name = 'facts_version') WHERE id = NEW.id;
+    END;
+    ''')
+
+    # when the facts last changed, Last-Modified of the web server's fact listing.
+    # Deletes have no row to stamp but still move 'facts_version', which is its ETag.
+    # The row is seeded in bootstrap_db: an INSERT OR REPLACE here would take the
+    # conflict policy of the statement firing it, and fail under an upsert. The
+    # triggers are recreated so databases with that older version get these.
+    cursor.executescript('''
+    DROP TRIGGER IF EXISTS facts_modified_insert;
+    DROP TRIGGER IF EXISTS facts_modified_update;
+    DROP TRIGGER IF EXISTS facts_modified_delete;
+
+    CREATE TRIGGER facts_modified_insert AFTER INSERT ON facts
+    BEGIN
+        UPDATE counters SET value = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'facts_modified';
+    END;
+
+    CREATE TRIGGER facts_modified_update AFTER UPDATE OF category, description, times_used ON facts
+    BEGIN
+        UPDATE counters SET value = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'facts_modified';
+    END;
+
+    CREATE TRIGGER facts_modified_delete AFTER DELETE ON facts
+    BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'facts_version';
+        UPDATE counters SET value = CAST(strftime('%s', 'now') AS INTEGER) WHERE name = 'facts_modified';
+    END;
+    ''')
+
+    # client side: prints not yet sent and the batch waiting for the server's ack
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS fleet_usage (
+        fact_id INTEGER PRIMARY KEY,
+        pending INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS fleet_outbox (
+        batch INTEGER PRIMARY KEY,
+        deltas TEXT NOT NULL
+        )
+    ''')
+
+    # client side, during the first pull: this machine's own facts by content
+    # and the server id each one turned out to have, see fleet.set_aside_local_facts
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS fleet_local_facts (
+        local_id INTEGER PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        server_id INTEGER
+        )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_fleet_local_facts_hash ON fleet_local_facts (content_hash)
+    ''')
+
+    # server side: last usage batch applied per machine
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS fleet_machines (
+        machine TEXT PRIMARY KEY,
+        last_batch INTEGER NOT NULL,
+        last_seen REAL
+        )
+    ''')
+
+    # full-text index over descriptions, see src/fact_search.py
+    try:
+        cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS facts_fts USING fts5(
+            description, content='facts', content_rowid='id', tokenize='porter unicode61'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"Full-text search disabled, sqlite has no FTS5: {e}")
+    else:
+        cursor.executescript('''
+        CREATE TRIGGER IF NOT EXISTS facts_fts_insert AFTER INSERT ON facts
+        BEGIN
+            INSERT INTO facts_fts (rowid, description) VALUES (NEW.id, NEW.description);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS facts_fts_delete AFTER DELETE ON facts
+        BEGIN
+            INSERT INTO facts_fts (facts_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS facts_fts_update AFTER UPDATE OF description ON facts
+        BEGIN
+            INSERT INTO facts_fts (facts_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+            INSERT INTO facts_fts (rowid, description) VALUES (NEW.id, NEW.description);
+        END;
+        ''')
+
+    # queue shared by the buttons, the web UI and the CLI, see src/print_queue.py
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS print_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category TEXT,
+        source TEXT,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        created_ts REAL NOT NULL,
+        started_ts REAL,
+        finished_ts REAL,
+        next_attempt_ts REAL NOT NULL
+        )
+    ''')
+
+    # tickets printed by the job, more than one is a batch
+    cursor.execute("PRAGMA table_info(print_jobs)")
+    if "count" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE print_jobs ADD COLUMN count INTEGER NOT NULL DEFAULT 1")
+
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_print_jobs_status ON print_jobs (status, next_attempt_ts)
+    ''')
+
+    # latency histograms merged from every process, see src/metrics.py
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS stage_histograms (
+        stage TEXT PRIMARY KEY,
+        buckets TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        sum REAL NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # decks and no-repeat windows of src/fact_scheduler.py, category NULL holds the window
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS scheduler_state (
+        scheduler TEXT NOT NULL,
+        category TEXT,
+        deck TEXT NOT NULL,
+        known_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # print history, append only, and the rollups written with it, see src/usage_log.py
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS print_events (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        fact_id INTEGER,
+        category TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS usage_hourly (
+        hour INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        prints INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour, category)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS usage_categories (
+        category TEXT PRIMARY KEY,
+        prints INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS usage_facts_daily (
+        day INTEGER NOT NULL,
+        fact_id INTEGER NOT NULL,
+        prints INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, fact_id)
+        ) WITHOUT ROWID
+    ''')
+
+def rebuild_categories(cursor):
+    cursor.execute("DELETE FROM categories")
+    cursor.execute("""INSERT INTO categories (name, fact_count)
+                        SELECT category, COUNT(id) FROM facts WHERE category IS NOT NULL GROUP BY category""")
+
+def bootstrap_db(path=None):
+    # create schema and sync the facts table with facts.json, once per process and database file
+    path = path or database_path
+
+    with _bootstrap_lock:
+        if path in _bootstrapped:
+            return
+
+        # the demon and every gunicorn worker start together, one process at
+        # a time creates or migrates the schema and syncs facts.json
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            conn = open_connection(path)
+            cursor = conn.cursor()
+            create_schema(cursor)
+            conn.commit()
+
+            sql = """SELECT COUNT(id) FROM facts"""
+            cursor.execute(sql)
+            row = cursor.fetchone()
+            entires_count = row[0]
+
+            print("\n\nFACTS COUNT:", entires_count)
+
+            # databases created before the categories table existed need a backfill
+            cursor.execute("SELECT COUNT(name) FROM categories")
+            if entires_count and not cursor.fetchone()[0]:
+                rebuild_categories(cursor)
+                conn.commit()
+
+            cursor.execute("SELECT COUNT(name) FROM counters WHERE name = 'total_prints'")
+            if not cursor.fetchone()[0]:
+                cursor.execute("""INSERT INTO counters (name, value)
+                                    SELECT 'total_prints', IFNULL(SUM(times_used), 0) FROM facts""")
+                conn.commit()
+
+            # stamp facts that were there before the version column existed
+            cursor.execute("SELECT COUNT(name) FROM counters WHERE name = 'facts_version'")
+            if not cursor.fetchone()[0]:
+                cursor.execute("UPDATE facts SET version = id")
+                cursor.execute("""INSERT INTO counters (name, value)
+                                    SELECT 'facts_version', IFNULL(MAX(id), 0) FROM facts""")
+                conn.commit()
+
+            # the facts_modified triggers only update their row
+            cursor.execute("""INSERT OR IGNORE INTO counters (name, value)
+                                VALUES ('facts_modified', CAST(strftime('%s', 'now') AS INTEGER))""")
+            conn.commit()
+
+            # hashes from before the category was part of them are re-hashed by the next import
+            cursor.execute("SELECT COUNT(name) FROM counters WHERE name = 'content_hash_category'")
+            if not cursor.fetchone()[0]:
+                cursor.execute("UPDATE facts SET content_hash = NULL")
+                cursor.execute("INSERT INTO counters (name, value) VALUES ('content_hash_category', 1)")
+                conn.commit()
+
+            # index facts that were there before facts_fts existed
+            cursor.execute("SELECT COUNT(name) FROM sqlite_master WHERE name = 'facts_fts'")
+            if cursor.fetchone()[0]:
+                cursor.execute("SELECT COUNT(name) FROM counters WHERE name = 'facts_fts_built'")
+                if not cursor.fetchone()[0]:
+                    cursor.execute("INSERT INTO facts_fts (facts_fts) VALUES ('rebuild')")
+                    cursor.execute("INSERT INTO counters (name, value) VALUES ('facts_fts_built', 1)")
+                    conn.commit()
+
+            sync_facts_json(conn)
+
+            conn.close()
+        _bootstrapped.add(path)
+
+def open_connection(path=None):
+    conn = sqlite3.connect(path or database_path)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_connection(path=None):
+    # returns a connection owned by the calling thread, opened on first use
+    path = path or database_path
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        bootstrap_db(path)
+        conn = connections[path] = open_connection(path)
+
+    return conn
+
+def close_connection(path=None):
+    connections = getattr(_local, "connections", {})
+    conn = connections.pop(path or database_path, None)
+    if conn:
+        conn.close()
+
+def is_busy_error(e):
+    message = str(e).lower()
+    return isinstance(e, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+def write_transaction(fn, conn=None, retries=WRITE_RETRIES):
+    # runs fn(cursor) in a BEGIN IMMEDIATE transaction and commits, returning
+    # fn's result. Taking the write lock up front means readers never have to
+    # upgrade mid transaction; when another process keeps it past busy_timeout
+    # the whole transaction is rolled back and run again, so fn must only
+    # change the database
+    conn = conn or get_connection()
+    for attempt in range(retries + 1):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            result = fn(cursor)
+            conn.commit()
+            return result
+        except Exception as e:
+            conn.rollback()
+            if attempt == retries or not is_busy_error(e):
+                raise
+            time.sleep(WRITE_RETRY_DELAY * 2 ** attempt * (0.5 + random.random()))
+
+
+# Change notifications between processes. PRAGMA data_version changes every
+# time another connection commits to the database file, so polling it on a
+# private connection is a cheap way for the demon to learn that the web UI
+# (or anyone else) wrote something.
+class ChangeWatcher:
+    def __init__(self, path=None):
+        self.conn = sqlite3.connect(path or database_path, check_same_thread=False)
+        self.version = self.read_version()
+
+    def read_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed(self):
+        version = self.read_version()
+        if version == self.version:
+            return False
+        self.version = version
+        return True
+
+    def close(self):
+        self.conn.close()
+
+def watch_changes(callback, path=None, interval=CHANGE_POLL_INTERVAL):
+    # calls callback() from a background thread after other connections commit
+    watcher = ChangeWatcher(path)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                if watcher.changed():
+                    callback()
+            except Exception as e:
+                print(f"Database change callback failed: {e}")
 
-    return conn, cursor
+    thread = threading.Thread(target=run, name="db-change-watcher", daemon=True)
+    thread.start()
+    return thread
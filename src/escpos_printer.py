@@ -0,0 +1,104 @@
+import os
+import socket
+import threading
+from datetime import datetime
+
+from PIL import Image, ImageDraw, ImageFont
+
+script_directory = os.path.dirname(os.path.abspath(__file__))
+font_path = os.path.join(script_directory, "fonts", "Ubuntu-Regular.ttf")
+
+# BIXOLON SRP-E300: 80mm paper, 203dpi, 576 printable dots per line
+PAPER_WIDTH = 576
+# the PDF ticket is laid out on a 200pt page, keep the same proportions
+SCALE = PAPER_WIDTH / 200
+IMAGE_SIZE = int(50 * SCALE)
+BAND_HEIGHT = 256
+
+ESC_INIT = b"\x1b\x40"
+FEED_AND_CUT = b"\x1b\x64\x04" + b"\x1d\x56\x42\x00"
+# mode "1" packs white as 1, ESC/POS wants black as 1
+INVERT = bytes(255 - i for i in range(256))
+
+_lock = threading.Lock()
+_fonts = {}
+_images = {}
+
+def get_font(size):
+    font = _fonts.get(size)
+    if font is None:
+        font = _fonts[size] = ImageFont.truetype(font_path, size)
+    return font
+
+def get_image(image_path):
+    # built assets (see image_assets) are already IMAGE_SIZE and 1-bit,
+    # anything else is scaled and dithered once per process
+    img = _images.get(image_path)
+    if img is None:
+        with Image.open(image_path) as source:
+            if source.mode == "1" and source.size == (IMAGE_SIZE, IMAGE_SIZE):
+                img = source.copy()
+            else:
+                source = source.convert("RGBA")
+                background = Image.new("RGBA", source.size, "white")
+                background.alpha_composite(source)
+                img = background.convert("L").resize((IMAGE_SIZE, IMAGE_SIZE), Image.LANCZOS).convert("1")
+        with _lock:
+            _images[image_path] = img
+    return img
+
+def render_ticket(image_path, text, timestamp=None):
+    text_font = get_font(int(10 * SCALE))
+    date_font = get_font(int(7.5 * SCALE))
+    line_height = int(12 * SCALE)
+    lines = text.rstrip("\n").split("\n")
+
+    height = IMAGE_SIZE + int(15 * SCALE) + line_height * (len(lines) + 1) + int(10 * SCALE)
+    ticket = Image.new("1", (PAPER_WIDTH, height), 1)
+    ticket.paste(get_image(image_path), ((PAPER_WIDTH - IMAGE_SIZE) // 2, 0))
+
+    draw = ImageDraw.Draw(ticket)
+    x, y = int(7 * SCALE), IMAGE_SIZE + int(15 * SCALE)
+    for line in lines:
+        draw.text((x, y), line, fill=0, font=text_font)
+        y += line_height
+
+    timestamp = timestamp or datetime.now()
+    draw.text((x, y + line_height // 2), timestamp.strftime("%H:%M:%S %d %B %Y"), fill=0, font=date_font)
+
+    return ticket
+
+def raster_to_escpos(ticket):
+    # GS v 0: raster bit image, 1 = black dot, sent in bands to keep the
+    # printer's receive buffer happy
+    width_bytes = ticket.width // 8
+    data = bytearray(ESC_INIT)
+
+    for top in range(0, ticket.height, BAND_HEIGHT):
+        band = ticket.crop((0, top, ticket.width, min(top + BAND_HEIGHT, ticket.height)))
+        rows = band.height
+        data += b"\x1d\x76\x30\x00"
+        data += bytes((width_bytes & 0xFF, width_bytes >> 8, rows & 0xFF, rows >> 8))
+        data += band.tobytes().translate(INVERT)
+
+    data += FEED_AND_CUT
+    return bytes(data)
+
+def send(data, device):
+    # device is either a path (/dev/usb/lp0, or a plain file acting as a fake
+    # printer) or tcp://host:port for network printers
+    if device.startswith("tcp://"):
+        host, _, port = device[len("tcp://"):].partition(":")
+        with socket.create_connection((host, int(port or 9100)), timeout=10) as s:
+            s.sendall(data)
+    else:
+        with open(device, "ab") as printer:
+            printer.write(data)
+    return True
+
+def print_ticket(device, image_path, text):
+    return send(raster_to_escpos(render_ticket(image_path, text)), device)
+
+def print_tickets(device, tickets):
+    # (image_path, text) pairs sent as one write, every ticket keeps its own cut
+    return send(b"".join(raster_to_escpos(render_ticket(image_path, text)) for image_path, text in tickets), device)
@@ -0,0 +1,92 @@
+import io
+import sys
+import csv
+import json
+import argparse
+import contextlib
+
+from src.db_utils import get_connection
+
+# Streaming fact export. Rows are read in id order one batch at a time
+# (keyset pagination, so no read transaction stays open for the whole file
+# and the WAL can checkpoint) and written out as CSV or JSONL text chunks.
+# Memory stays at one batch whatever the size of the table. Both formats
+# import back with src.fact_import.
+#
+#   python3 -m src.fact_export [--format csv|jsonl] [--category animals] [-o facts.csv]
+
+BATCH_SIZE = 5000
+COLUMNS = ("id", "category", "description", "times_used", "owner", "create_ts", "update_ts")
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+def iter_rows(conn=None, category=None, batch_size=BATCH_SIZE):
+    conn = conn or get_connection()
+    where, params = "id > ?", []
+    if category:
+        where += " AND category = ?"
+        params.append(category)
+
+    last_id = 0
+    while True:
+        cursor = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM facts WHERE {where} ORDER BY id LIMIT ?",
+                              (last_id, *params, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+def iter_csv(rows, batch_size=BATCH_SIZE):
+    # one text chunk per batch of rows, the header first
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_jsonl(rows, batch_size=BATCH_SIZE):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False))
+        if len(lines) >= batch_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def iter_export(format="csv", conn=None, category=None, batch_size=BATCH_SIZE):
+    rows = iter_rows(conn, category, batch_size)
+    return iter_csv(rows, batch_size) if format == "csv" else iter_jsonl(rows, batch_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the facts table as CSV or JSONL")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--category", help="only this category")
+    parser.add_argument("-o", "--output", default="-", help="file to write, - for stdout")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    # opening the database may print the schema check, keep it out of the export
+    with contextlib.redirect_stdout(sys.stderr):
+        get_connection()
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        for chunk in iter_export(args.format, category=args.category, batch_size=args.batch_size):
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
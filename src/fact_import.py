@@ -0,0 +1,188 @@
+import os, sys, time
+import csv
+import json
+import hashlib
+import argparse
+
+from src.db_utils import get_connection, write_transaction
+
+# Incremental fact import. Facts are deduplicated by a hash of their category
+# and normalised description, so re-running an import (or syncing an updated
+# facts.json) only inserts facts the database has never seen, while the same
+# fact listed under two categories is kept in both. Packs are
+# stream-parsed and written with executemany, one transaction per batch.
+
+BATCH_SIZE = 5000
+CHUNK_SIZE = 1 << 16
+DEFAULT_OWNER = "szymon"
+
+
+def content_hash(category, description):
+    normalised = " ".join(str(description).split()).casefold()
+    return hashlib.sha1(f"{category or ''}\n{normalised}".encode("utf-8")).hexdigest()
+
+def iter_json_pack(file, chunk_size=CHUNK_SIZE):
+    # streams {"category": ["fact", ...], ...} without loading the whole file
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def next_token():
+        nonlocal buffer, pos, eof
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer):
+                char = buffer[pos]
+                if char in "{}[]:,":
+                    pos += 1
+                    return char
+                try:
+                    value, pos = decoder.raw_decode(buffer, pos)
+                    return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            elif eof:
+                return None
+
+            chunk = file.read(chunk_size)
+            buffer, pos = buffer[pos:] + chunk, 0
+            eof = not chunk
+
+    def expect(token):
+        found = next_token()
+        if found != token:
+            raise ValueError(f"Malformed fact pack: expected {token!r}, got {found!r}")
+
+    expect("{")
+    token = next_token()
+    while token != "}":
+        if token == ",":
+            token = next_token()
+            continue
+        if not isinstance(token, str):
+            raise ValueError(f"Malformed fact pack: expected a category, got {token!r}")
+
+        category = token
+        expect(":")
+        expect("[")
+        token = next_token()
+        while token != "]":
+            if token != ",":
+                yield category, token
+            token = next_token()
+        token = next_token()
+
+def iter_jsonl_pack(file):
+    # one {"category": ..., "description": ...} object per line
+    for line in file:
+        line = line.strip()
+        if line:
+            item = json.loads(line)
+            if not isinstance(item, dict):
+                raise ValueError(f"Malformed fact pack: expected an object per line, got {line[:40]!r}")
+            yield item["category"], item.get("description", item.get("fact"))
+
+def iter_csv_pack(file):
+    # a header row with category and description columns, like src.fact_export writes
+    reader = csv.DictReader(file)
+    if not reader.fieldnames or "category" not in reader.fieldnames or "description" not in reader.fieldnames:
+        raise ValueError("Malformed fact pack: CSV needs category and description columns")
+    for row in reader:
+        yield row["category"], row["description"]
+
+PACK_READERS = {"json": iter_json_pack, "jsonl": iter_jsonl_pack, "csv": iter_csv_pack}
+
+def pack_format(path):
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    return extension if extension in PACK_READERS else "json"
+
+def iter_file(file, format="json"):
+    return PACK_READERS[format](file)
+
+def iter_pack(path, format=None):
+    # "-" reads the pack from stdin
+    format = format or pack_format(path)
+    if path == "-":
+        yield from iter_file(sys.stdin, format)
+        return
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        yield from iter_file(file, format)
+
+def backfill_hashes(cursor, batch_size=BATCH_SIZE):
+    # facts added or edited through the web editor (a trigger clears the hash
+    # of an edited fact), or from before this column existed, have no hash yet
+    last_id, total = 0, 0
+    while True:
+        cursor.execute("""SELECT id, category, description FROM facts
+                            WHERE content_hash IS NULL AND id > ? ORDER BY id LIMIT ?""", (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return total
+        cursor.executemany("UPDATE facts SET content_hash = ? WHERE id = ?",
+                           [(content_hash(category, description or ""), fact_id) for fact_id, category, description in rows])
+        last_id, total = rows[-1][0], total + len(rows)
+
+def iter_import(conn, facts, owner=DEFAULT_OWNER, batch_size=BATCH_SIZE):
+    # every batch is its own write transaction: memory stays at one batch
+    # however long the pack is, the demon's prints get the write lock between
+    # batches, and an interrupted import keeps what it committed (running it
+    # again skips those facts by hash). Yields the running totals after each batch.
+    now = int(time.time())
+    read, inserted = 0, 0
+    write_transaction(backfill_hashes, conn)
+
+    # a fact is skipped when its hash is already in the table, which also
+    # covers duplicates earlier in the same pack since they are inserted first
+    sql = """
+            INSERT INTO facts (category, description, times_used, owner, create_ts, update_ts, content_hash)
+            SELECT ?, ?, 0, ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM facts WHERE content_hash = ?)
+    """
+
+    def insert(batch):
+        nonlocal read, inserted
+        # rowcount of executemany is the number of rows actually inserted
+        inserted += write_transaction(lambda cursor: cursor.executemany(sql, batch).rowcount, conn)
+        read += len(batch)
+        return {"read": read, "inserted": inserted, "skipped": read - inserted}
+
+    batch = []
+    for category, description in facts:
+        if not description:
+            continue
+        digest = content_hash(category, description)
+        batch.append((category, description, owner, now, now, digest, digest))
+        if len(batch) >= batch_size:
+            yield insert(batch)
+            batch = []
+    yield insert(batch) if batch else {"read": read, "inserted": inserted, "skipped": read - inserted}
+
+def import_facts(conn, facts, owner=DEFAULT_OWNER, batch_size=BATCH_SIZE, progress=None):
+    result = {"read": 0, "inserted": 0, "skipped": 0}
+    for result in iter_import(conn, facts, owner, batch_size):
+        if progress:
+            progress(result["read"])
+    return result
+
+def import_pack(path, conn=None, format=None, **kwargs):
+    return import_facts(conn or get_connection(), iter_pack(path, format), **kwargs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import fact packs (.json, .jsonl or .csv) into the facts database")
+    parser.add_argument("paths", nargs="+", help="fact packs to import, - for stdin")
+    parser.add_argument("--format", choices=sorted(PACK_READERS), help="pack format, by default from the file extension")
+    parser.add_argument("--owner", default=DEFAULT_OWNER)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        start = time.perf_counter()
+        result = import_pack(path, format=args.format, owner=args.owner, batch_size=args.batch_size,
+                             progress=lambda read: print(f"\r{path}: {read} facts read", end="", flush=True))
+        print(f"\r{path}: {result['inserted']} added, {result['skipped']} already known "
+              f"({time.perf_counter() - start:.2f}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+import time
+import json
+import random
+import threading
+from collections import deque
+
+from src.db_utils import get_connection, write_transaction
+from src import fact_selector
+
+# Pluggable fact scheduling. Every scheduler answers select(conn, category)
+# with the same (id, times_used, category, description) row as
+# fact_selector.select_fact and marks the fact as used, so main.get_fun_fact
+# can switch strategies through FUN_FACTS_SCHEDULER. select_batch picks
+# several facts in one transaction for batch printing.
+#
+#   least_used  min times_used in the category, random among ties (the default)
+#               that are not in the no-repeat window
+#   deck        uniform category, then a shuffled deck per category
+#   weighted    category picked in proportion to its size, then its deck, so
+#               every fact is equally likely however uneven the categories are
+#
+# Every scheduler keeps the last no_repeat facts it printed, so a fact is not
+# printed again right after itself, e.g. when a small category starts its
+# next round. Deck schedulers keep their decks and that window in memory, so a
+# pick is an O(1) pop, and write them to scheduler_state every PERSIST_INTERVAL;
+# least_used only keeps the window in memory, its counts are in the facts table.
+# A transaction only reads that memory: what it picked is applied once it has
+# committed, so a retried or rolled back transaction leaves no trace there.
+
+PERSIST_INTERVAL = 30.0
+DEFAULT_NO_REPEAT = 20
+
+
+class Draws:
+    # the cards one transaction takes from a deck, laid over it without
+    # changing it until apply(): taken cards come off the end, swaps are kept
+    # by position
+    def __init__(self, deck, known_count):
+        self.deck = deck
+        self.known_count = known_count
+        self.taken = 0
+        self.swapped = {}
+
+    def remaining(self):
+        return len(self.deck) - self.taken
+
+    def card(self, position):
+        return self.swapped.get(position, self.deck[position])
+
+    def draw(self, rng, recent_ids):
+        # a fact shown in the last no_repeat picks swaps places with a random
+        # card still in the deck, which keeps the draw O(1)
+        position = self.remaining() - 1
+        fact_id = self.card(position)
+        self.taken += 1
+        for _ in range(position):
+            if fact_id not in recent_ids:
+                break
+            idx = rng.randrange(position)
+            self.swapped[idx], fact_id = fact_id, self.card(idx)
+        return fact_id
+
+    def apply(self):
+        for position, fact_id in self.swapped.items():
+            self.deck[position] = fact_id
+        del self.deck[self.remaining():]
+        return self.deck
+
+
+class Picks:
+    # what one transaction picked, taken over by the scheduler after the commit
+    def __init__(self):
+        self.fact_ids = []
+        self.draws = {}  # category -> Draws
+
+
+class FactScheduler:
+    name = None
+
+    def __init__(self, no_repeat=DEFAULT_NO_REPEAT, rng=None):
+        self.no_repeat = no_repeat
+        self.rng = rng or random.Random()
+        self.recent = deque(maxlen=max(no_repeat, 1))
+        self.recent_ids = set()
+        self._lock = threading.Lock()
+
+    def remember(self, fact_id):
+        if not self.no_repeat:
+            return
+        if len(self.recent) == self.recent.maxlen:
+            self.recent_ids.discard(self.recent[0])
+        self.recent.append(fact_id)
+        self.recent_ids.add(fact_id)
+
+    def category_sizes(self, cursor):
+        cursor.execute("""SELECT name, fact_count FROM categories WHERE fact_count > 0 ORDER BY name""")
+        return cursor.fetchall()
+
+    def choose_category(self, sizes):
+        return self.rng.choice(sizes)[0] if sizes else None
+
+    def window(self, picks):
+        # ids in the no-repeat window once the transaction's picks are in it
+        if not picks.fact_ids:
+            return self.recent_ids
+        return set((list(self.recent) + picks.fact_ids)[-self.recent.maxlen:]) if self.no_repeat else set()
+
+    def pick(self, cursor, picks, category=None):
+        # one fact, called inside the write transaction opened by select_batch;
+        # records it in picks rather than in the scheduler
+        raise NotImplementedError
+
+    def commit(self, picks):
+        for fact_id in picks.fact_ids:
+            self.remember(fact_id)
+
+    def select(self, conn, category=None):
+        rows = self.select_batch(conn, 1, category)
+        return rows[0] if rows else None
+
+    def select_batch(self, conn, count, category=None):
+        # count facts picked and marked used in one transaction, a random
+        # category is drawn for every fact when category is None
+        def pick_all(cursor):
+            picks = Picks()
+            rows = []
+            for _ in range(count):
+                row = self.pick(cursor, picks, category)
+                if row:
+                    rows.append(row)
+            return rows, picks
+
+        # the lock is held until the picks are applied, so the next
+        # transaction in this process reads the window and decks they left
+        with self._lock:
+            rows, picks = write_transaction(pick_all, conn)
+            self.commit(picks)
+        self.after_select(conn)
+        return rows
+
+    def after_select(self, conn):
+        pass
+
+    def save(self, conn=None):
+        pass
+
+
+class LeastUsedScheduler(FactScheduler):
+    name = "least_used"
+
+    def pick(self, cursor, picks, category=None):
+        if not self.no_repeat:
+            return fact_selector.pick_fact(cursor, category)
+
+        if not category:
+            category = fact_selector.pick_random_category(cursor)
+        if not category:
+            return None
+
+        row = fact_selector.pick_least_used(cursor, category, exclude=self.window(picks))
+        if row:
+            picks.fact_ids.append(row[0])
+            fact_selector.mark_used(cursor, row[0], row[1])
+        return row
+
+
+class DeckScheduler(FactScheduler):
+    name = "deck"
+
+    def __init__(self, no_repeat=DEFAULT_NO_REPEAT, rng=None):
+        super().__init__(no_repeat, rng)
+        self.decks = {}         # category -> list of fact ids, drawn from the end
+        self.known_counts = {}  # category -> fact_count the deck was built for
+        self.loaded = False
+        self.last_saved = time.monotonic()
+
+    def load(self, cursor):
+        cursor.execute("""SELECT category, deck, known_count FROM scheduler_state WHERE scheduler = ?""", (self.name, ))
+        for category, deck, known_count in cursor.fetchall():
+            if category is None:
+                for fact_id in json.loads(deck)[-self.no_repeat:] if self.no_repeat else []:
+                    self.remember(fact_id)
+            else:
+                self.decks[category] = json.loads(deck)
+                self.known_counts[category] = known_count
+        self.loaded = True
+
+    def save(self, conn=None):
+        if not self.loaded:
+            return
+        with self._lock:
+            rows = [(self.name, category, json.dumps(deck), self.known_counts.get(category, 0))
+                    for category, deck in self.decks.items()]
+            rows.append((self.name, None, json.dumps(list(self.recent)), 0))
+
+        def replace(cursor):
+            cursor.execute("DELETE FROM scheduler_state WHERE scheduler = ?", (self.name, ))
+            cursor.executemany("""INSERT INTO scheduler_state (scheduler, category, deck, known_count)
+                                  VALUES (?,?,?,?)""", rows)
+
+        write_transaction(replace, conn)
+        self.last_saved = time.monotonic()
+
+    def build_deck(self, cursor, category):
+        cursor.execute("""SELECT id FROM facts WHERE category = ?""", (category, ))
+        deck = [row[0] for row in cursor]
+        self.rng.shuffle(deck)
+        return deck
+
+    def draw(self, cursor, picks, category, known_count):
+        draws = picks.draws.get(category)
+        if draws is None:
+            deck = self.decks.get(category)
+            if not deck or self.known_counts.get(category) != known_count:
+                # new deck once the old one is used up, or facts were added/removed
+                deck = self.build_deck(cursor, category)
+            draws = picks.draws[category] = Draws(deck, known_count)
+        elif not draws.remaining():
+            draws = picks.draws[category] = Draws(self.build_deck(cursor, category), known_count)
+        if not draws.remaining():
+            return None
+        return draws.draw(self.rng, self.window(picks))
+
+    def pick(self, cursor, picks, category=None):
+        sizes = self.category_sizes(cursor)
+        if not category:
+            category = self.choose_category(sizes)
+        known_count = dict(sizes).get(category, 0)
+
+        row = None
+        # ids of deleted facts can still be in a deck, skip them
+        for _ in range(known_count + 1):
+            fact_id = self.draw(cursor, picks, category, known_count)
+            if fact_id is None:
+                break
+            cursor.execute("""SELECT id, times_used, category, description FROM facts WHERE id = ?""", (fact_id, ))
+            row = cursor.fetchone()
+            if row:
+                picks.fact_ids.append(fact_id)
+                break
+
+        if row:
+            fact_selector.mark_used(cursor, row[0], row[1] or 0)
+        return row
+
+    def commit(self, picks):
+        super().commit(picks)
+        for category, draws in picks.draws.items():
+            self.decks[category] = draws.apply()
+            self.known_counts[category] = draws.known_count
+
+    def select_batch(self, conn, count, category=None):
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.load((conn or get_connection()).cursor())
+        return super().select_batch(conn, count, category)
+
+    def after_select(self, conn):
+        if time.monotonic() - self.last_saved > PERSIST_INTERVAL:
+            self.save(conn)
+
+
+class WeightedDeckScheduler(DeckScheduler):
+    name = "weighted"
+
+    def choose_category(self, sizes):
+        if not sizes:
+            return None
+        names, weights = zip(*sizes)
+        return self.rng.choices(names, weights=weights)[0]
+
+
+SCHEDULERS = {scheduler.name: scheduler for scheduler in (LeastUsedScheduler, DeckScheduler, WeightedDeckScheduler)}
+
+def create_scheduler(name, **kwargs):
+    if name not in SCHEDULERS:
+        raise ValueError(f"Unknown scheduler {name!r}, expected one of {', '.join(SCHEDULERS)}")
+    return SCHEDULERS[name](**kwargs)
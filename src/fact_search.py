@@ -0,0 +1,78 @@
+import re
+import html
+import difflib
+
+# Full-text search over fact descriptions, backed by the facts_fts FTS5 table
+# that the triggers in db_utils.create_schema keep in sync with facts.
+
+# private-use characters mark the snippet highlights until the text is escaped
+HIGHLIGHT_START = "\ue000"
+HIGHLIGHT_END = "\ue001"
+DUPLICATE_RATIO = 0.85
+
+_word_re = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_available(cursor):
+    cursor.execute("SELECT COUNT(name) FROM sqlite_master WHERE name = 'facts_fts'")
+    return bool(cursor.fetchone()[0])
+
+def build_match_query(text, any_word=False):
+    # quote every word so user input can never be read as FTS5 syntax
+    words = _word_re.findall(text or "")
+    if not words:
+        return None
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    # the last word is matched as a prefix so results show up while typing
+    terms[-1] += "*"
+    return (" OR " if any_word else " AND ").join(terms)
+
+def highlight_html(snippet):
+    return html.escape(snippet).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_END, "</mark>")
+
+def search_facts(cursor, text, category=None, limit=20):
+    query = build_match_query(text)
+    if not query:
+        return []
+
+    sql = """SELECT f.id, f.category, f.description, f.times_used,
+                    snippet(facts_fts, 0, ?, ?, '...', 16), bm25(facts_fts)
+             FROM facts_fts JOIN facts f ON f.id = facts_fts.rowid
+             WHERE facts_fts MATCH ?"""
+    params = [HIGHLIGHT_START, HIGHLIGHT_END, query]
+    if category:
+        sql += " AND f.category = ?"
+        params.append(category)
+    sql += " ORDER BY bm25(facts_fts) LIMIT ?"
+    params.append(limit)
+
+    cursor.execute(sql, params)
+    return [
+        {"id": row[0], "category": row[1], "description": row[2], "times_used": row[3],
+         "snippet": highlight_html(row[4]), "score": -row[5]}
+        for row in cursor
+    ]
+
+def normalise(text):
+    return " ".join(_word_re.findall((text or "").casefold()))
+
+def find_duplicates(cursor, description, limit=5):
+    # FTS narrows the table down to a few candidates sharing words with the new
+    # fact, which are then compared as whole sentences
+    query = build_match_query(description, any_word=True)
+    if not query:
+        return []
+
+    cursor.execute("""SELECT f.id, f.category, f.description
+                      FROM facts_fts JOIN facts f ON f.id = facts_fts.rowid
+                      WHERE facts_fts MATCH ? ORDER BY bm25(facts_fts) LIMIT ?""", (query, limit * 4))
+
+    wanted = normalise(description)
+    duplicates = []
+    for fact_id, category, existing in cursor.fetchall():
+        ratio = difflib.SequenceMatcher(None, wanted, normalise(existing)).ratio()
+        if ratio >= DUPLICATE_RATIO:
+            duplicates.append({"id": fact_id, "category": category, "description": existing, "similarity": round(ratio, 2)})
+
+    duplicates.sort(key=lambda duplicate: duplicate["similarity"], reverse=True)
+    return duplicates[:limit]
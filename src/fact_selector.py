@@ -0,0 +1,93 @@
+import random
+import time
+
+from src.db_utils import write_transaction
+from src import fleet
+
+# All lookups below are index seeks: categories is a handful of rows and facts is
+# read through idx_facts_category_times_used, so pick cost does not grow with
+# the size of the facts table, short of pick_tied_id's fallback.
+
+# rowid probes for a least-used fact before counting the ties
+TIE_PROBES = 32
+
+def pick_random_category(cursor):
+    cursor.execute("""SELECT COUNT(name) FROM categories WHERE fact_count > 0""")
+    total = cursor.fetchone()[0]
+    if not total:
+        return None
+
+    sql = """SELECT name FROM categories WHERE fact_count > 0 ORDER BY name LIMIT 1 OFFSET ?"""
+    cursor.execute(sql, (random.randrange(total), ))
+    return cursor.fetchone()[0]
+
+def pick_least_used(cursor, category, exclude=()):
+    # exclude: ids to skip among the tied least-used facts, unless all of them are in it
+    cursor.execute("""SELECT MIN(times_used) FROM facts WHERE category = ?""", (category, ))
+    smallest_times_used = cursor.fetchone()[0]
+    if smallest_times_used is None:
+        return None
+
+    start = pick_tied_id(cursor, category, smallest_times_used)
+
+    # walk on from there, wrapping around once; len(exclude) + 1 rows always
+    # hold one that is not excluded, if the ties have any
+    sql = """SELECT id, times_used, category, description FROM facts
+                WHERE category = ? AND times_used = ? AND id {} ? ORDER BY id LIMIT ?"""
+    fallback = None
+    for operator in (">=", "<"):
+        cursor.execute(sql.format(operator), (category, smallest_times_used, start, len(exclude) + 1))
+        for row in cursor.fetchall():
+            if row[0] not in exclude:
+                return row
+            fallback = fallback or row
+    return fallback
+
+def pick_tied_id(cursor, category, times_used):
+    # a uniformly random fact among the ties: random rowids between the first
+    # and last of them are probed until one is a tie. Taking the next tie
+    # after a random rowid instead would favour facts that follow a gap. Ties
+    # too sparse for TIE_PROBES fall back to a random offset, which walks the
+    # index over the ties.
+    bounds_sql = """SELECT id FROM facts WHERE category = ? AND times_used = ? ORDER BY id {} LIMIT 1"""
+    cursor.execute(bounds_sql.format("ASC"), (category, times_used))
+    lowest_id = cursor.fetchone()[0]
+    cursor.execute(bounds_sql.format("DESC"), (category, times_used))
+    highest_id = cursor.fetchone()[0]
+
+    for _ in range(TIE_PROBES):
+        fact_id = random.randint(lowest_id, highest_id)
+        cursor.execute("""SELECT id FROM facts WHERE id = ? AND category = ? AND times_used = ?""",
+                       (fact_id, category, times_used))
+        if cursor.fetchone():
+            return fact_id
+
+    cursor.execute("""SELECT COUNT(id) FROM facts WHERE category = ? AND times_used = ?""", (category, times_used))
+    cursor.execute("""SELECT id FROM facts WHERE category = ? AND times_used = ? ORDER BY id LIMIT 1 OFFSET ?""",
+                   (category, times_used, random.randrange(cursor.fetchone()[0])))
+    return cursor.fetchone()[0]
+
+def mark_used(cursor, fact_id, times_used):
+    update_sql = """
+                UPDATE facts
+                SET times_used = ?, update_ts = ?
+                WHERE id = ?;
+    """
+    cursor.execute(update_sql, (times_used + 1, int(time.time()), fact_id))
+    if fleet.SERVER:
+        fleet.record_usage(cursor, fact_id)
+
+def pick_fact(cursor, category=None):
+    # expects to run inside a write transaction, see select_fact
+    if not category:
+        category = pick_random_category(cursor)
+
+    row = pick_least_used(cursor, category) if category else None
+    if row:
+        mark_used(cursor, row[0], row[1])
+    return row
+
+def select_fact(conn, category=None):
+    # read, pick and increment in one write transaction so two callers never
+    # hand out the same least-used fact
+    return write_transaction(lambda cursor: pick_fact(cursor, category), conn)
@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import socket
+import hmac
+import argparse
+import logging
+import threading
+
+from src import db_utils, ticket_cache, usage_log
+from src.fact_import import content_hash
+
+# Fleet mode: one machine's web server is the fleet server, every other
+# machine keeps its own facts.db as a read-through cache of it.
+#
+# Server side, the facts table carries a version stamped by triggers from
+# the 'facts_version' counter (see db_utils.create_schema), so a client asks
+# for everything above the last version it saw, one index range per page.
+# Client side, prints keep selecting from the local table, so they work with
+# the server down; every times_used increment is also counted in fleet_usage
+# and a background thread ships those counts in numbered batches. A batch
+# stays in fleet_outbox until the server acknowledged it, and the server
+# remembers the last batch per machine, so a resend after a lost reply is
+# not counted twice.
+#
+# The first pull replaces the facts a machine had on its own. Its print
+# history is moved over to the server's ids of the same facts (matched by
+# content hash), prints of facts the server does not have are kept without a
+# fact. While this machine is a client its facts are edited on the server
+# only, the web UI is read-only.
+#
+#   FUN_FACTS_FLEET_SERVER=http://10.0.0.2:5000   makes a machine a client
+#   FUN_FACTS_FLEET_TOKEN=...                     shared secret, required on the server
+#
+#   python3 -m src.fleet sync|status
+
+SERVER = os.environ.get("FUN_FACTS_FLEET_SERVER")
+TOKEN = os.environ.get("FUN_FACTS_FLEET_TOKEN")
+MACHINE = os.environ.get("FUN_FACTS_MACHINE") or socket.gethostname()
+
+SYNC_INTERVAL = 30.0
+MAX_SYNC_INTERVAL = 300.0
+REQUEST_TIMEOUT = 5.0
+PAGE_SIZE = 500
+
+FACT_COLUMNS = ("id", "category", "description", "times_used", "owner", "create_ts", "update_ts",
+                "content_hash", "version")
+
+
+# server
+
+def check_token(token):
+    # fleet routes are off unless the server has a token configured
+    return bool(TOKEN) and hmac.compare_digest(str(token or ""), TOKEN)
+
+def facts_since(cursor, since, limit=PAGE_SIZE):
+    cursor.execute("SELECT value FROM counters WHERE name = 'facts_version'")
+    row = cursor.fetchone()
+    cursor.execute(f"""SELECT {', '.join(FACT_COLUMNS)} FROM facts
+                        WHERE version > ? ORDER BY version LIMIT ?""", (since, limit + 1))
+    facts = [dict(zip(FACT_COLUMNS, fact)) for fact in cursor.fetchall()]
+    return {"version": row[0] if row else 0, "facts": facts[:limit], "more": len(facts) > limit}
+
+def apply_usage(machine, batch, deltas):
+    # returns False for a batch that was already applied
+    now = time.time()
+
+    def apply(cursor):
+        cursor.execute("SELECT last_batch FROM fleet_machines WHERE machine = ?", (machine, ))
+        row = cursor.fetchone()
+        if row and batch <= row[0]:
+            cursor.execute("UPDATE fleet_machines SET last_seen = ? WHERE machine = ?", (now, machine))
+            return False
+        cursor.executemany("UPDATE facts SET times_used = IFNULL(times_used, 0) + ? WHERE id = ?",
+                           [(int(count), int(fact_id)) for fact_id, count in deltas.items()])
+        cursor.execute("""INSERT OR REPLACE INTO fleet_machines (machine, last_batch, last_seen)
+                            VALUES (?,?,?)""", (machine, batch, now))
+        return True
+
+    return db_utils.write_transaction(apply)
+
+
+# client
+
+def record_usage(cursor, fact_id):
+    # called from fact_selector.mark_used, inside the selecting transaction
+    cursor.execute("""INSERT INTO fleet_usage (fact_id, pending) VALUES (?, 1)
+                        ON CONFLICT (fact_id) DO UPDATE SET pending = pending + 1""", (fact_id, ))
+
+def synced_version(cursor):
+    cursor.execute("SELECT value FROM counters WHERE name = 'fleet_version'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def set_aside_local_facts(cursor):
+    # before the first page replaces the facts: every local fact by content,
+    # and the history pointing at them moved to negative ids, which no server
+    # id can be mistaken for until remap_history puts the right ones in
+    cursor.execute("DELETE FROM fleet_local_facts")
+    local_facts = cursor.connection.execute("SELECT id, category, description FROM facts")
+    cursor.executemany("INSERT INTO fleet_local_facts (local_id, content_hash) VALUES (?,?)",
+                       ((-fact_id, content_hash(category, description or "")) for fact_id, category, description in local_facts))
+    cursor.execute("UPDATE print_events SET fact_id = -fact_id WHERE fact_id > 0")
+    cursor.execute("UPDATE usage_facts_daily SET fact_id = -fact_id WHERE fact_id > 0")
+
+def match_local_facts(cursor, facts):
+    cursor.executemany("UPDATE fleet_local_facts SET server_id = ? WHERE content_hash = ?",
+                       [(fact["id"], content_hash(fact["category"], fact["description"] or "")) for fact in facts])
+
+def remap_history(cursor):
+    # after the last page of the first pull, one pass over the history
+    cursor.execute("""UPDATE print_events SET fact_id = (SELECT server_id FROM fleet_local_facts WHERE local_id = fact_id)
+                        WHERE fact_id < 0""")
+    cursor.execute("""INSERT INTO usage_facts_daily (day, fact_id, prints)
+                        SELECT day, server_id, SUM(prints) FROM usage_facts_daily
+                        JOIN fleet_local_facts ON local_id = fact_id
+                        WHERE server_id IS NOT NULL GROUP BY day, server_id
+                        ON CONFLICT (day, fact_id) DO UPDATE SET prints = prints + excluded.prints""")
+    cursor.execute("DELETE FROM usage_facts_daily WHERE fact_id < 0")
+    cursor.execute("DELETE FROM fleet_local_facts")
+
+def unsynced_usage(cursor):
+    # increments the server has not acknowledged yet, queued or in flight
+    usage = {}
+    cursor.execute("SELECT fact_id, pending FROM fleet_usage")
+    for fact_id, pending in cursor.fetchall():
+        usage[fact_id] = pending
+    cursor.execute("SELECT deltas FROM fleet_outbox")
+    for (deltas, ) in cursor.fetchall():
+        for fact_id, count in json.loads(deltas).items():
+            usage[int(fact_id)] = usage.get(int(fact_id), 0) + count
+    return usage
+
+
+class FleetClient:
+    def __init__(self, server=SERVER, token=TOKEN, machine=MACHINE, timeout=REQUEST_TIMEOUT):
+        self.server = server.rstrip("/")
+        self.token = token
+        self.machine = machine
+        self.timeout = timeout
+
+    def request(self, path, body=None):
+        # urllib is only imported by machines that actually sync
+        import urllib.request
+
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.server + path, data=data, headers={
+            "Content-Type": "application/json",
+            "X-Fleet-Token": self.token or "",
+        })
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def take_batch(self):
+        # moves the pending counts into the outbox, unless a batch is still unacknowledged
+        def take(cursor):
+            cursor.execute("SELECT batch, deltas FROM fleet_outbox ORDER BY batch LIMIT 1")
+            row = cursor.fetchone()
+            if row:
+                return row[0], json.loads(row[1])
+            cursor.execute("SELECT fact_id, pending FROM fleet_usage WHERE pending > 0")
+            deltas = {str(fact_id): pending for fact_id, pending in cursor.fetchall()}
+            if not deltas:
+                return None
+            cursor.execute("UPDATE counters SET value = value + 1 WHERE name = 'fleet_batch'")
+            if not cursor.rowcount:
+                # seeded from the clock, so a reinstalled machine does not start
+                # below the last batch the server has seen from it
+                cursor.execute("INSERT INTO counters (name, value) VALUES ('fleet_batch', ?)", (int(time.time()), ))
+            batch = cursor.execute("SELECT value FROM counters WHERE name = 'fleet_batch'").fetchone()[0]
+            cursor.execute("DELETE FROM fleet_usage")
+            cursor.execute("INSERT INTO fleet_outbox (batch, deltas) VALUES (?,?)", (batch, json.dumps(deltas)))
+            return batch, deltas
+
+        return db_utils.write_transaction(take)
+
+    def push(self):
+        pushed = 0
+        while True:
+            taken = self.take_batch()
+            if not taken:
+                return pushed
+            batch, deltas = taken
+            self.request("/fleet/usage", {"machine": self.machine, "batch": batch, "deltas": deltas})
+            db_utils.write_transaction(lambda cursor: cursor.execute("DELETE FROM fleet_outbox WHERE batch = ?", (batch, )))
+            pushed += sum(deltas.values())
+
+    def apply_page(self, page, first):
+        columns = [column for column in FACT_COLUMNS if column != "version"]
+        if first:
+            # buffered print events still carry the local ids
+            usage_log.flush()
+
+        def apply(cursor):
+            if first:
+                # the first sync replaces the facts this machine imported on
+                # its own, counts recorded against those ids mean nothing to the server
+                set_aside_local_facts(cursor)
+                cursor.execute("DELETE FROM facts")
+                cursor.execute("DELETE FROM fleet_usage")
+                cursor.execute("DELETE FROM fleet_outbox")
+            if cursor.execute("SELECT 1 FROM fleet_local_facts LIMIT 1").fetchone():
+                match_local_facts(cursor, page["facts"])
+                if not page["more"]:
+                    remap_history(cursor)
+            usage = unsynced_usage(cursor)
+            # a plain UPDATE, then an INSERT for facts this machine has not got:
+            # an upsert would run the facts triggers' INSERT OR IGNORE with its
+            # own ABORT policy and fail on categories and counters
+            update_sql = f"UPDATE facts SET {', '.join(f'{column} = ?' for column in columns[1:])} WHERE id = ?"
+            insert_sql = f"INSERT INTO facts ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            for fact in page["facts"]:
+                # the server's count plus the prints it has not heard about yet
+                fact["times_used"] = (fact["times_used"] or 0) + usage.get(fact["id"], 0)
+                values = [fact[column] for column in columns]
+                cursor.execute(update_sql, values[1:] + values[:1])
+                if not cursor.rowcount:
+                    cursor.execute(insert_sql, values)
+            version = page["facts"][-1]["version"] if page["facts"] else page["version"]
+            cursor.execute("INSERT OR REPLACE INTO counters (name, value) VALUES ('fleet_version', ?)", (version, ))
+
+        db_utils.write_transaction(apply)
+        if first:
+            ticket_cache.clear()
+        for fact in page["facts"]:
+            ticket_cache.evict_fact(fact["id"])
+
+    def pull(self):
+        pulled = 0
+        while True:
+            since = synced_version(db_utils.get_connection().cursor())
+            page = self.request(f"/fleet/facts?since={since}&limit={PAGE_SIZE}")
+            if not page["facts"] and (since or not page["version"]):
+                return pulled
+            self.apply_page(page, first=not since)
+            pulled += len(page["facts"])
+            if not page["more"]:
+                return pulled
+
+    def sync(self):
+        # push first, so the pulled counts already include this machine's
+        # prints. Until the first pull the local ids are not the server's,
+        # so nothing is pushed before it.
+        if not synced_version(db_utils.get_connection().cursor()):
+            pulled = self.pull()
+            return self.push(), pulled
+        return self.push(), self.pull()
+
+
+class FleetSync(threading.Thread):
+    def __init__(self, client=None, interval=SYNC_INTERVAL):
+        super().__init__(name="fleet-sync", daemon=True)
+        self.client = client or FleetClient()
+        self.interval = interval
+        self.running = True
+        self.last_sync = None
+        self.last_error = None
+        self._wakeup = threading.Event()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def sync_now(self):
+        self._wakeup.set()
+
+    def run(self):
+        delay = self.interval
+        while self.running:
+            try:
+                pushed, pulled = self.client.sync()
+                if pushed or pulled:
+                    logging.info(f"Fleet sync: {pushed} prints sent, {pulled} facts received")
+                self.last_sync, self.last_error = time.time(), None
+                delay = self.interval
+            except Exception as e:
+                # offline: prints go on from the local table, counts wait in fleet_usage
+                self.last_error = str(e)
+                delay = min(delay * 2, MAX_SYNC_INTERVAL)
+                logging.error(f"Fleet sync failed, retrying in {delay:.0f}s: {e}")
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+def start():
+    # no-op unless this machine is a fleet client
+    if not SERVER:
+        return None
+    sync = FleetSync()
+    sync.start()
+    return sync
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fun Fact Machine fleet sync")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("sync", help="send counted prints and fetch changed facts once")
+    commands.add_parser("status", help="synced version and counts waiting to be sent")
+    args = parser.parse_args(argv)
+
+    if args.command == "sync":
+        if not SERVER:
+            parser.error("FUN_FACTS_FLEET_SERVER is not set")
+        pushed, pulled = FleetClient().sync()
+        print(f"{pushed} prints sent, {pulled} facts received")
+    elif args.command == "status":
+        cursor = db_utils.get_connection().cursor()
+        usage = unsynced_usage(cursor)
+        print(json.dumps({"server": SERVER, "machine": MACHINE, "version": synced_version(cursor),
+                          "unsent_prints": sum(usage.values())}, indent=2))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
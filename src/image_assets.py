@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import argparse
+import threading
+
+# Category images are big RGBA PNGs, the printer wants a 50pt square of 1-bit
+# dots. The build step scales and dithers every src/images/<category>.png
+# once into src/images/build/ and records them in a manifest; prints load the
+# manifest once per process and only stat the source images now and then to
+# pick up added or replaced ones, see changed_images.
+#
+#   python3 -m src.image_assets build [--force]
+#   python3 -m src.image_assets list
+
+script_directory = os.path.dirname(os.path.abspath(__file__))
+images_directory = os.path.join(script_directory, "images")
+build_directory = os.path.join(images_directory, "build")
+manifest_path = os.path.join(build_directory, "manifest.json")
+
+FALLBACK = "about_me"
+# 50pt on the 203dpi thermal head, the same as escpos_printer.IMAGE_SIZE
+ASSET_SIZE = 144
+# bumped when the conversion changes so every asset gets rebuilt
+ASSET_VERSION = 1
+
+_lock = threading.Lock()
+_manifest = None
+_sources = None  # name -> (mtime_ns, size) of the source images the manifest was loaded for
+
+
+def convert(source_path, asset_path):
+    from PIL import Image
+
+    with Image.open(source_path) as source:
+        source = source.convert("RGBA")
+        background = Image.new("RGBA", source.size, "white")
+        background.alpha_composite(source)
+        # Floyd-Steinberg dither once here instead of in CUPS on every print
+        asset = background.convert("L").resize((ASSET_SIZE, ASSET_SIZE), Image.LANCZOS).convert("1")
+    asset.save(asset_path, optimize=True)
+
+def read_manifest():
+    try:
+        with open(manifest_path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def source_images():
+    sources = {}
+    for file_name in os.listdir(images_directory):
+        name, extension = os.path.splitext(file_name)
+        if extension.lower() == ".png":
+            stat = os.stat(os.path.join(images_directory, file_name))
+            sources[name] = (stat.st_mtime_ns, stat.st_size)
+    return sources
+
+def build_assets(force=False):
+    # incremental: a source is converted again only when its size or mtime
+    # changed, its asset is missing or the conversion itself changed
+    previous = read_manifest() or {}
+    old_assets = previous.get("assets", {}) if previous.get("version") == ASSET_VERSION and not force else {}
+    os.makedirs(build_directory, exist_ok=True)
+
+    assets, built = {}, []
+    for file_name in sorted(os.listdir(images_directory)):
+        name, extension = os.path.splitext(file_name)
+        if extension.lower() != ".png":
+            continue
+        source_path = os.path.join(images_directory, file_name)
+        stat = os.stat(source_path)
+        entry = {"source": file_name, "asset": name + ".png", "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+        old = old_assets.get(name)
+        if old != entry or not os.path.exists(os.path.join(build_directory, entry["asset"])):
+            convert(source_path, os.path.join(build_directory, entry["asset"]))
+            built.append(name)
+        assets[name] = entry
+
+    removed = [name for name in old_assets if name not in assets]
+    for name in removed:
+        try:
+            os.remove(os.path.join(build_directory, old_assets[name]["asset"]))
+        except OSError:
+            pass
+
+    if built or removed or not previous:
+        manifest = {"version": ASSET_VERSION, "size": ASSET_SIZE, "fallback": FALLBACK, "assets": assets}
+        temp_path = manifest_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(temp_path, manifest_path)
+
+    return built, removed
+
+def load_manifest():
+    # name -> asset path, read once per process. Checks the sources for
+    # changes on the first load so a fresh checkout or a new image works
+    # without running the build by hand.
+    global _manifest, _sources
+    with _lock:
+        if _manifest is None:
+            _sources = source_images()
+            try:
+                build_assets()
+                manifest = read_manifest()
+                _manifest = {name: os.path.join(build_directory, entry["asset"])
+                             for name, entry in manifest["assets"].items()}
+            except (OSError, ImportError) as e:
+                # read-only install or no Pillow: print the sources as they are
+                print(f"Could not build image assets, using the source images: {e}")
+                _manifest = {os.path.splitext(file_name)[0]: os.path.join(images_directory, file_name)
+                             for file_name in os.listdir(images_directory) if file_name.endswith(".png")}
+        return _manifest
+
+def asset_path(category):
+    assets = load_manifest()
+    return assets.get(str(category)) or assets[FALLBACK]
+
+def reload():
+    global _manifest
+    with _lock:
+        _manifest = None
+
+def changed_images():
+    # names of the source images added, removed or replaced since the manifest
+    # was loaded; the next asset_path rebuilds those. One listdir and a stat
+    # per image, see ticket_cache.check_images.
+    with _lock:
+        if _manifest is None:
+            return []
+        loaded = _sources
+    try:
+        current = source_images()
+    except OSError:
+        return []
+    changed = sorted(name for name in loaded.keys() | current.keys() if loaded.get(name) != current.get(name))
+    if changed:
+        reload()
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fun Fact Machine category image assets")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="convert new and changed category images")
+    build_parser.add_argument("--force", action="store_true", help="convert every image again")
+    commands.add_parser("list", help="show the manifest")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        built, removed = build_assets(force=args.force)
+        print(f"{len(built)} built, {len(removed)} removed: {', '.join(built + removed) or 'nothing changed'}")
+    elif args.command == "list":
+        print(json.dumps(read_manifest(), indent=2))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
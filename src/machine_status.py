@@ -0,0 +1,123 @@
+import math
+import time
+import socket
+import threading
+
+from src.db_utils import get_connection
+
+# Values shown on the OLED status page and on the "stats" ticket. Each metric
+# is cached with its own TTL and refreshed by a background thread, so drawing
+# a frame never opens a socket, reads /proc or queries the database.
+
+IP_TTL = 30.0
+TOTAL_PRINTS_TTL = 5.0
+REFRESH_INTERVAL = 1.0
+
+
+def read_local_ip():
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+        s.close()
+        return ip
+    except socket.error as e:
+        print(f"Error getting local IP: {e}")
+    return "NOT CONNECTED!"
+
+def read_boot_time():
+    # /proc/uptime is read once, after that uptime is derived from the monotonic clock
+    try:
+        with open('/proc/uptime', 'r') as f:
+            uptime_seconds = float(f.readline().split()[0])
+    except OSError:
+        uptime_seconds = 0.0
+    return time.monotonic() - uptime_seconds
+
+def read_total_prints():
+    # kept up to date by the facts_total_prints trigger, see db_utils.create_schema
+    cursor = get_connection().cursor()
+    cursor.execute("""SELECT value FROM counters WHERE name = 'total_prints'""")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def format_duration(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+
+    if days > 0:
+        return str(f"{days}d {hours}h {minutes}m")
+    elif hours > 0:
+        return str(f"{hours:02d}h {minutes:02d}m")
+    else:
+        return str(f"{minutes:02d}m {seconds:02d}s")
+
+
+class StatusProvider:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._expires = {}
+        self._loaders = {
+            "local_ip": (read_local_ip, IP_TTL),
+            "total_prints": (read_total_prints, TOTAL_PRINTS_TTL),
+        }
+        self._boot_time = None
+        self._thread = None
+
+    def refresh(self, name):
+        loader, ttl = self._loaders[name]
+        value = loader()
+        with self._lock:
+            self._values[name] = value
+            self._expires[name] = time.monotonic() + ttl
+        return value
+
+    def get(self, name):
+        with self._lock:
+            if name in self._values:
+                return self._values[name]
+        # first use blocks once, later reads are served from the cache
+        return self.refresh(name)
+
+    def refresh_expired(self):
+        now = time.monotonic()
+        for name in self._loaders:
+            if self._expires.get(name, 0) <= now:
+                try:
+                    self.refresh(name)
+                except Exception as e:
+                    print(f"Error refreshing {name}: {e}")
+
+    def start(self):
+        if self._thread:
+            return
+
+        def run():
+            while True:
+                self.refresh_expired()
+                time.sleep(REFRESH_INTERVAL)
+
+        self._thread = threading.Thread(target=run, name="machine-status", daemon=True)
+        self._thread.start()
+
+    def record_print(self, count=1):
+        # keep this process's view current between database refreshes
+        with self._lock:
+            if "total_prints" in self._values:
+                self._values["total_prints"] += count
+
+    def get_local_ip(self):
+        return self.get("local_ip")
+
+    def get_total_prints(self):
+        return self.get("total_prints")
+
+    def get_uptime(self):
+        if self._boot_time is None:
+            self._boot_time = read_boot_time()
+        return format_duration(math.ceil(time.monotonic() - self._boot_time))
+
+
+status = StatusProvider()
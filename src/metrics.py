@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import argparse
+import threading
+import contextlib
+from collections import Counter
+
+from src import db_utils
+
+# Latency histograms for the stages of the print pipeline and the OLED.
+# Timers observe into in-process histograms; a background thread merges them
+# into the stage_histograms table every FLUSH_INTERVAL, so the web server's
+# /metrics route and the CLI see what the demon and its print worker measured.
+#
+#   python3 -m src.metrics dump|prometheus|reset
+#   python3 -m src.metrics profile on|off
+
+# upper bounds in seconds, the last bucket is +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL = 10.0
+PROFILE_INTERVAL = 0.005
+
+METRIC_NAME = "fun_facts_stage_seconds"
+METRIC_HELP = "Time spent in each stage of the print pipeline and the OLED redraw"
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def merge(self, buckets, count, total):
+        self.buckets = [a + b for a, b in zip(self.buckets, buckets)]
+        self.count += count
+        self.sum += total
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for idx, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return BUCKETS[idx] if idx < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+_lock = threading.Lock()
+_pending = {}
+_flusher = None
+
+
+def start_flusher():
+    # the flusher also follows the profiler switch, so processes that may
+    # never observe anything (web workers) start it themselves
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=run_flusher, name="metrics-flush", daemon=True)
+            _flusher.start()
+            atexit.register(flush)
+
+def after_fork():
+    # threads do not survive fork (gunicorn --preload), the child starts its own
+    global _flusher, _lock
+    _flusher = None
+    _lock = threading.Lock()
+    profiler._running = False
+
+os.register_at_fork(after_in_child=after_fork)
+
+def observe(stage, seconds):
+    with _lock:
+        if stage not in _pending:
+            _pending[stage] = Histogram()
+        _pending[stage].observe(seconds)
+    start_flusher()
+
+
+class timed(contextlib.ContextDecorator):
+    # with timed("stage"): ... or @timed("stage")
+    def __init__(self, stage):
+        self.stage = stage
+
+    def _recreate_cm(self):
+        # a decorated function can run on several threads at once, each call
+        # needs its own start time
+        return timed(self.stage)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def flush(conn=None):
+    global _pending
+    with _lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return
+
+    def merge(cursor):
+        for stage, histogram in pending.items():
+            cursor.execute("SELECT buckets, count, sum FROM stage_histograms WHERE stage = ?", (stage, ))
+            row = cursor.fetchone()
+            merged = Histogram()
+            merged.merge(histogram.buckets, histogram.count, histogram.sum)
+            if row:
+                merged.merge(json.loads(row[0]), row[1], row[2])
+            cursor.execute("""INSERT OR REPLACE INTO stage_histograms (stage, buckets, count, sum)
+                                VALUES (?,?,?,?)""", (stage, json.dumps(merged.buckets), merged.count, merged.sum))
+
+    try:
+        db_utils.write_transaction(merge, conn)
+    except Exception:
+        # keep them for the next flush
+        with _lock:
+            for stage, histogram in pending.items():
+                if stage not in _pending:
+                    _pending[stage] = Histogram()
+                _pending[stage].merge(histogram.buckets, histogram.count, histogram.sum)
+        raise
+
+def run_flusher():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+            profiler.follow_switch()
+        except Exception as e:
+            print(f"Could not flush metrics: {e}")
+
+def load(conn=None):
+    cursor = (conn or db_utils.get_connection()).cursor()
+    cursor.execute("SELECT stage, buckets, count, sum FROM stage_histograms ORDER BY stage")
+    histograms = {}
+    for stage, buckets, count, total in cursor:
+        histograms[stage] = Histogram()
+        histograms[stage].merge(json.loads(buckets), count, total)
+    return histograms
+
+def reset(conn=None):
+    with _lock:
+        _pending.clear()
+    db_utils.write_transaction(lambda cursor: cursor.execute("DELETE FROM stage_histograms"), conn)
+
+def format_le(bound):
+    return "+Inf" if bound is None else repr(bound)
+
+def render_prometheus(histograms):
+    lines = [f"# HELP {METRIC_NAME} {METRIC_HELP}", f"# TYPE {METRIC_NAME} histogram"]
+    for stage, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (None, ), histogram.buckets):
+            cumulative += count
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{format_le(bound)}"}} {cumulative}')
+        lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {histogram.sum}')
+        lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {histogram.count}')
+    return "\n".join(lines) + "\n"
+
+def summarize(histograms):
+    summary = {}
+    for stage, histogram in sorted(histograms.items()):
+        summary[stage] = {
+            "count": histogram.count,
+            "mean_ms": round(histogram.sum / histogram.count * 1000, 3) if histogram.count else None,
+            "p50_le_ms": histogram.quantile(0.5) * 1000 if histogram.count else None,
+            "p95_le_ms": histogram.quantile(0.95) * 1000 if histogram.count else None,
+            "p99_le_ms": histogram.quantile(0.99) * 1000 if histogram.count else None,
+        }
+    return summary
+
+
+# Samples the stacks of every thread in the process and counts them in
+# collapsed "outer;inner" form, ready for flamegraph.pl or speedscope.
+# Processes that record metrics follow the 'profiler_enabled' counters row,
+# so `python3 -m src.metrics profile on` switches it on in the running demon
+# and web server; `off` writes each process's samples next to the database.
+class SamplingProfiler:
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._thread = None
+        self._running = False
+
+    def sample(self):
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            while frame:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        if self._running:
+            return
+
+        def run():
+            while self._running:
+                self.sample()
+                time.sleep(self.interval)
+
+        self._running = True
+        self._thread = threading.Thread(target=run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, path=None):
+        if not self._running:
+            return None
+        self._running = False
+        self._thread.join()
+        path = path or f"{db_utils.database_path}.{os.getpid()}.profile"
+        with open(path, "w") as file:
+            for stack, count in self.samples.most_common():
+                file.write(f"{stack} {count}\n")
+        self.samples.clear()
+        return path
+
+    def follow_switch(self, conn=None):
+        cursor = (conn or db_utils.get_connection()).cursor()
+        cursor.execute("SELECT value FROM counters WHERE name = 'profiler_enabled'")
+        row = cursor.fetchone()
+        if row and row[0]:
+            self.start()
+        elif self._running:
+            print("Profile written to", self.stop())
+
+profiler = SamplingProfiler()
+
+def set_profiling(enabled, conn=None):
+    db_utils.write_transaction(lambda cursor: cursor.execute(
+        "INSERT OR REPLACE INTO counters (name, value) VALUES ('profiler_enabled', ?)", (int(enabled), )), conn)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fun Fact Machine latency metrics")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("dump", help="per-stage counts and latency quantiles")
+    commands.add_parser("prometheus", help="the /metrics text")
+    commands.add_parser("reset", help="clear all histograms")
+    profile_parser = commands.add_parser("profile", help="switch the sampling profiler in running processes")
+    profile_parser.add_argument("state", choices=("on", "off"))
+    args = parser.parse_args(argv)
+
+    if args.command == "dump":
+        print(json.dumps(summarize(load()), indent=2))
+    elif args.command == "prometheus":
+        print(render_prometheus(load()), end="")
+    elif args.command == "reset":
+        reset()
+    elif args.command == "profile":
+        set_profiling(args.state == "on")
+        print(f"Profiler {args.state}, running processes follow within {FLUSH_INTERVAL:.0f}s")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
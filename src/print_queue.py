@@ -0,0 +1,286 @@
+import sys
+import time
+import json
+import queue
+import sqlite3
+import argparse
+import logging
+import threading
+
+from src.db_utils import get_connection, write_transaction
+from src import metrics
+
+# Print jobs live in the print_jobs table so the buttons, every gunicorn worker
+# and the CLI can all submit to the one worker thread that owns the printer.
+
+QUEUED = "queued"
+PRINTING = "printing"
+DONE = "done"
+FAILED = "failed"
+
+# presses for the same category within this window share one job, also when
+# the worker has already picked it up
+COALESCE_WINDOW = 2.0
+MAX_ATTEMPTS = 4
+RETRY_BACKOFF = 2.0
+POLL_INTERVAL = 0.5
+# the worker backs off this far while the database keeps failing
+MAX_ERROR_BACKOFF = 30.0
+# most tickets one batch job may print
+MAX_BATCH_SIZE = 100
+
+_wakeup = threading.Event()
+
+JOB_COLUMNS = ("id", "category", "source", "status", "attempts", "error",
+               "created_ts", "started_ts", "finished_ts", "next_attempt_ts", "count")
+
+
+def row_to_job(row):
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+def submit(category=None, source="cli", count=1, created_ts=None):
+    # created_ts is when the print was asked for, if that was earlier
+    if not 1 <= count <= MAX_BATCH_SIZE:
+        raise ValueError(f"count must be between 1 and {MAX_BATCH_SIZE}")
+
+    now = time.time() if created_ts is None else created_ts
+
+    def insert_job(cursor):
+        cursor.execute("""SELECT id FROM print_jobs
+                            WHERE status IN (?, ?) AND category IS ? AND count = ? AND created_ts >= ?
+                            ORDER BY id DESC LIMIT 1""", (QUEUED, PRINTING, category, count, now - COALESCE_WINDOW))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        cursor.execute("""INSERT INTO print_jobs (category, source, status, created_ts, next_attempt_ts, count)
+                            VALUES (?,?,?,?,?,?)""", (category, source, QUEUED, now, now, count))
+        return cursor.lastrowid
+
+    job_id = write_transaction(insert_job)
+    _wakeup.set()
+    return job_id
+
+def get_job(job_id):
+    cursor = get_connection().cursor()
+    cursor.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM print_jobs WHERE id = ?", (job_id, ))
+    return row_to_job(cursor.fetchone())
+
+def get_stats(window=3600):
+    cursor = get_connection().cursor()
+    cursor.execute("SELECT COUNT(id) FROM print_jobs WHERE status IN (?, ?)", (QUEUED, PRINTING))
+    depth = cursor.fetchone()[0]
+
+    cursor.execute("""SELECT finished_ts - created_ts FROM print_jobs
+                        WHERE status = ? AND finished_ts >= ? ORDER BY 1""", (DONE, time.time() - window))
+    latencies = [row[0] for row in cursor]
+    cursor.execute("SELECT COUNT(id) FROM print_jobs WHERE status = ? AND finished_ts >= ?", (FAILED, time.time() - window))
+    failed = cursor.fetchone()[0]
+
+    stats = {"queue_depth": depth, "done": len(latencies), "failed": failed,
+             "latency_avg": None, "latency_p95": None}
+    if latencies:
+        stats["latency_avg"] = sum(latencies) / len(latencies)
+        stats["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return stats
+
+def claim_next_job():
+    now = time.time()
+
+    def claim(cursor):
+        cursor.execute(f"""SELECT {', '.join(JOB_COLUMNS)} FROM print_jobs
+                            WHERE status = ? AND next_attempt_ts <= ?
+                            ORDER BY next_attempt_ts, id LIMIT 1""", (QUEUED, now))
+        job = row_to_job(cursor.fetchone())
+        if job:
+            cursor.execute("UPDATE print_jobs SET status = ?, started_ts = ? WHERE id = ?", (PRINTING, now, job["id"]))
+            job["status"], job["started_ts"] = PRINTING, now
+        return job
+
+    return write_transaction(claim)
+
+def finish_job(job, success, error=None):
+    now = time.time()
+    attempts = job["attempts"] + 1
+
+    if success:
+        job.update(status=DONE, attempts=attempts, finished_ts=now, error=None)
+    elif attempts < MAX_ATTEMPTS:
+        job.update(status=QUEUED, attempts=attempts, error=error,
+                   next_attempt_ts=now + RETRY_BACKOFF * 2 ** (attempts - 1))
+    else:
+        job.update(status=FAILED, attempts=attempts, finished_ts=now, error=error)
+
+    write_transaction(lambda cursor: cursor.execute(
+        """UPDATE print_jobs SET status = ?, attempts = ?, error = ?, finished_ts = ?, next_attempt_ts = ?
+            WHERE id = ?""", (job["status"], job["attempts"], job["error"], job["finished_ts"],
+                              job["next_attempt_ts"], job["id"])))
+    return job
+
+def requeue_interrupted_jobs():
+    # jobs left "printing" by a crashed worker go back to the queue
+    write_transaction(lambda cursor: cursor.execute("UPDATE print_jobs SET status = ? WHERE status = ?", (QUEUED, PRINTING)))
+
+def default_print_function(category, count=1):
+    import main
+    if count > 1:
+        return main.print_batch(count, category)
+    return main.print_fact_by_category(category)
+
+
+class PrintWorker(threading.Thread):
+    def __init__(self, print_function=None, on_status=None):
+        super().__init__(name="print-worker", daemon=True)
+        self.print_function = print_function or default_print_function
+        self.on_status = on_status
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        _wakeup.set()
+
+    def notify(self, job):
+        if self.on_status:
+            try:
+                self.on_status(job)
+            except Exception as e:
+                logging.error(f"Print job status callback failed: {e}")
+
+    def run_job(self, job):
+        self.notify(job)
+        metrics.observe("queue_wait", job["started_ts"] - job["created_ts"])
+        error = None
+        try:
+            with metrics.timed("print_job"):
+                success = self.print_function(job["category"], job["count"])
+            if not success:
+                error = "printer reported failure"
+        except Exception as e:
+            success = False
+            error = str(e)
+
+        # the ticket is out, so the result is retried rather than left
+        # "printing", which would print it again after a restart
+        delay = POLL_INTERVAL
+        while True:
+            try:
+                job = finish_job(dict(job), success, error)
+                break
+            except Exception as e:
+                if not self.running:
+                    raise
+                delay = min(delay * 2, MAX_ERROR_BACKOFF)
+                logging.error(f"Could not record print job {job['id']}, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+        if job["status"] == DONE:
+            logging.info(f"Print job {job['id']} done in {job['finished_ts'] - job['created_ts']:.2f}s")
+        else:
+            logging.error(f"Print job {job['id']} attempt {job['attempts']} failed: {error}")
+        self.notify(job)
+
+    def run(self):
+        requeued = False
+        delay = POLL_INTERVAL
+        while self.running:
+            try:
+                if not requeued:
+                    requeue_interrupted_jobs()
+                    requeued = True
+                job = claim_next_job()
+                if job:
+                    self.run_job(job)
+                    delay = POLL_INTERVAL
+                    continue
+            except Exception as e:
+                # e.g. the database still locked after write_transaction's
+                # retries: the worker has to outlive it, or nothing prints again
+                delay = min(delay * 2, MAX_ERROR_BACKOFF)
+                logging.error(f"Print worker error, retrying in {delay:.1f}s: {e}")
+                _wakeup.wait(delay)
+                _wakeup.clear()
+                continue
+
+            delay = POLL_INTERVAL
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+
+
+# Writes print jobs for a thread that must not wait on the database, i.e. the
+# button input thread: submit() only queues the press with its time and this
+# thread inserts the job, so a busy database delays the ticket, not the next
+# button press. Presses keep their own time for coalescing.
+class Submitter(threading.Thread):
+    def __init__(self, source="buttons", on_submit=None):
+        super().__init__(name="print-submitter", daemon=True)
+        self.source = source
+        self.on_submit = on_submit
+        self.presses = queue.Queue()
+        self._stopped = threading.Event()
+
+    def submit(self, category=None, count=1):
+        self.presses.put((category, count, time.time()))
+
+    def stop(self):
+        self._stopped.set()
+        self.presses.put(None)
+
+    def write(self, category, count, created_ts):
+        delay = POLL_INTERVAL
+        while True:
+            try:
+                return submit(category, source=self.source, count=count, created_ts=created_ts)
+            except sqlite3.Error as e:
+                if self._stopped.is_set():
+                    raise
+                delay = min(delay * 2, MAX_ERROR_BACKOFF)
+                logging.error(f"Could not queue print job, retrying in {delay:.1f}s: {e}")
+                self._stopped.wait(delay)
+
+    def run(self):
+        # presses made before stop() still get one try
+        while True:
+            press = self.presses.get()
+            if press is None:
+                break
+            try:
+                job_id = self.write(*press)
+            except Exception as e:
+                logging.error(f"Print job for {press[0] or 'a random fact'} dropped: {e}")
+                continue
+            if self.on_submit:
+                self.on_submit(job_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fun Fact Machine print queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit_parser = commands.add_parser("submit", help="queue a print job")
+    submit_parser.add_argument("category", nargs="?", default=None, help="category, random if omitted")
+    submit_parser.add_argument("--count", type=int, default=1, help="tickets printed as one batch job")
+    status_parser = commands.add_parser("status", help="show a job")
+    status_parser.add_argument("job_id", type=int)
+    commands.add_parser("stats", help="queue depth and job latency")
+    commands.add_parser("work", help="run a print worker in the foreground")
+    args = parser.parse_args(argv)
+
+    if args.command == "submit":
+        if not 1 <= args.count <= MAX_BATCH_SIZE:
+            parser.error(f"--count must be between 1 and {MAX_BATCH_SIZE}")
+        print(submit(args.category, source="cli", count=args.count))
+    elif args.command == "status":
+        print(json.dumps(get_job(args.job_id), indent=2))
+    elif args.command == "stats":
+        print(json.dumps(get_stats(), indent=2))
+    elif args.command == "work":
+        worker = PrintWorker()
+        worker.start()
+        try:
+            while worker.is_alive():
+                worker.join(1)
+        except KeyboardInterrupt:
+            worker.stop()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import time
+import threading
+import textwrap
+from collections import OrderedDict
+
+from src import image_assets
+
+TEXT_WIDTH = 40
+MAX_CACHED_FACTS = 2048
+# how often prints look for new or replaced category images
+IMAGE_CHECK_INTERVAL = 10.0
+
+_lock = threading.Lock()
+_images = {}            # image path -> decoded ImageReader
+_prologues = {}         # category -> (image path, title line)
+_texts = OrderedDict()  # fact id -> (description, wrapped ticket text), LRU ordered
+_images_checked = time.monotonic()
+
+def category_title(category):
+    return " ".join(str(category).split("_")).title()
+
+def get_prologue(category):
+    # everything on the ticket that only depends on the category
+    if time.monotonic() - _images_checked > IMAGE_CHECK_INTERVAL:
+        check_images()
+    prologue = _prologues.get(category)
+    if prologue is None:
+        # the asset manifest already resolved the about_me.png fallback
+        image_path = image_assets.asset_path(category)
+        prologue = _prologues[category] = (image_path, category_title(category) + ':\n')
+    return prologue
+
+def get_image(image_path):
+    img = _images.get(image_path)
+    if img is None:
+        from reportlab.lib import utils
+
+        img = utils.ImageReader(image_path)
+        # make ReportLab decode the pixels now rather than on first draw
+        img.getRGBData()
+        with _lock:
+            _images[image_path] = img
+    return img
+
+def get_wrapped_text(fact_id, category, description):
+    _, title = get_prologue(category)
+    if fact_id is None:
+        return title + textwrap.fill(description, TEXT_WIDTH) + '\n' * 4
+
+    # entries are keyed by id but only used while the description matches,
+    # so an edit made in any process (web admin, fleet sync) is picked up on
+    # the next print without being told about it
+    with _lock:
+        cached = _texts.get(fact_id)
+        if cached and cached[0] == description:
+            _texts.move_to_end(fact_id)
+            return title + cached[1]
+
+    wrapped = textwrap.fill(description, TEXT_WIDTH) + '\n' * 4
+    with _lock:
+        _texts[fact_id] = (description, wrapped)
+        _texts.move_to_end(fact_id)
+        while len(_texts) > MAX_CACHED_FACTS:
+            _texts.popitem(last=False)
+
+    return title + wrapped
+
+def evict_fact(fact_id):
+    with _lock:
+        _texts.pop(fact_id, None)
+
+def evict_category(category):
+    with _lock:
+        prologue = _prologues.pop(category, None)
+        if prologue:
+            _images.pop(prologue[0], None)
+
+def check_images():
+    # an image added for a category (or replacing one) shows on its next
+    # ticket without restarting the demon
+    global _images_checked
+    _images_checked = time.monotonic()
+    changed = image_assets.changed_images()
+    if image_assets.FALLBACK in changed:
+        # every category without its own image uses the fallback
+        with _lock:
+            _images.clear()
+            _prologues.clear()
+    for category in changed:
+        evict_category(category)
+
+def clear():
+    image_assets.reload()
+    with _lock:
+        _images.clear()
+        _prologues.clear()
+        _texts.clear()
@@ -0,0 +1,171 @@
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+from collections import Counter
+
+from src import db_utils
+
+# Print history. Every printed ticket appends an event (time, fact, category)
+# to print_events, the times_used column only says how often. Events are
+# buffered in the printing process and a background thread writes them a batch
+# at a time, in the same transaction as the rollups they change: prints per
+# hour and category, per category, and per fact and day. The dashboard only
+# reads rollups, so its cost follows the window it shows (48 hours, 7 days),
+# not the length of the history.
+#
+#   python3 -m src.usage_log summary [--hours 48] [--days 7]
+#   python3 -m src.usage_log rebuild
+
+FLUSH_INTERVAL = 10.0
+# a buffer this long wakes the flusher early
+MAX_PENDING = 500
+
+HOUR = 3600
+DAY = 86400
+
+_lock = threading.Lock()
+_pending = []
+_wakeup = threading.Event()
+_flusher = None
+
+
+def record(fact_id, category, ts=None):
+    global _flusher
+    with _lock:
+        _pending.append((ts or time.time(), fact_id, category or ""))
+        if len(_pending) >= MAX_PENDING:
+            _wakeup.set()
+        if _flusher is None:
+            _flusher = threading.Thread(target=run_flusher, name="usage-flush", daemon=True)
+            _flusher.start()
+            atexit.register(flush)
+
+def rollups(events):
+    hourly, categories, daily = Counter(), Counter(), Counter()
+    for ts, fact_id, category in events:
+        hourly[int(ts) // HOUR * HOUR, category] += 1
+        categories[category] += 1
+        daily[int(ts) // DAY * DAY, fact_id] += 1
+    return hourly, categories, daily
+
+def write_events(cursor, events):
+    cursor.executemany("INSERT INTO print_events (ts, fact_id, category) VALUES (?,?,?)", events)
+
+    hourly, categories, daily = rollups(events)
+    cursor.executemany("""INSERT INTO usage_hourly (hour, category, prints) VALUES (?,?,?)
+                            ON CONFLICT (hour, category) DO UPDATE SET prints = prints + excluded.prints""",
+                       [(hour, category, prints) for (hour, category), prints in hourly.items()])
+    cursor.executemany("""INSERT INTO usage_categories (category, prints) VALUES (?,?)
+                            ON CONFLICT (category) DO UPDATE SET prints = prints + excluded.prints""",
+                       list(categories.items()))
+    cursor.executemany("""INSERT INTO usage_facts_daily (day, fact_id, prints) VALUES (?,?,?)
+                            ON CONFLICT (day, fact_id) DO UPDATE SET prints = prints + excluded.prints""",
+                       [(day, fact_id, prints) for (day, fact_id), prints in daily.items()])
+
+def flush(conn=None):
+    global _pending
+    with _lock:
+        pending, _pending = _pending, []
+    if not pending:
+        return 0
+
+    try:
+        db_utils.write_transaction(lambda cursor: write_events(cursor, pending), conn)
+    except Exception:
+        # keep them for the next flush, in order
+        with _lock:
+            _pending[:0] = pending
+        raise
+    return len(pending)
+
+def run_flusher():
+    while True:
+        _wakeup.wait(FLUSH_INTERVAL)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception as e:
+            print(f"Could not write print events: {e}")
+
+def rebuild(conn=None):
+    # recomputes every rollup from print_events, after a restore or a manual edit
+    def run(cursor):
+        for table in ("usage_hourly", "usage_categories", "usage_facts_daily"):
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"""INSERT INTO usage_hourly (hour, category, prints)
+                            SELECT CAST(ts AS INTEGER) / {HOUR} * {HOUR}, category, COUNT(id)
+                            FROM print_events GROUP BY 1, 2""")
+        cursor.execute("""INSERT INTO usage_categories (category, prints)
+                            SELECT category, COUNT(id) FROM print_events GROUP BY category""")
+        cursor.execute(f"""INSERT INTO usage_facts_daily (day, fact_id, prints)
+                            SELECT CAST(ts AS INTEGER) / {DAY} * {DAY}, fact_id, COUNT(id)
+                            FROM print_events GROUP BY 1, 2""")
+        cursor.execute("SELECT COUNT(id) FROM print_events")
+        return cursor.fetchone()[0]
+
+    return db_utils.write_transaction(run, conn)
+
+
+def summary(conn=None, hours=48, days=7, top=10, now=None):
+    # every query is a range seek on a rollup's primary key
+    cursor = (conn or db_utils.get_connection()).cursor()
+    now = int(now or time.time())
+    first_hour = now // HOUR * HOUR - (hours - 1) * HOUR
+    first_day = now // DAY * DAY - (days - 1) * DAY
+    # local midnight, hours are whole in every time zone that matters here
+    midnight = int(time.mktime(time.localtime(now)[:3] + (0, 0, 0, 0, 0, -1)))
+
+    cursor.execute("""SELECT hour, SUM(prints) FROM usage_hourly
+                        WHERE hour >= ? GROUP BY hour""", (first_hour, ))
+    per_hour = dict(cursor.fetchall())
+
+    cursor.execute("""SELECT category, SUM(prints) FROM usage_hourly
+                        WHERE hour >= ? GROUP BY category ORDER BY 2 DESC, 1""", (first_day, ))
+    week_categories = cursor.fetchall()
+
+    cursor.execute("SELECT IFNULL(SUM(prints), 0) FROM usage_hourly WHERE hour >= ?", (midnight, ))
+    today = cursor.fetchone()[0]
+
+    cursor.execute("""SELECT top.fact_id, facts.category, facts.description, top.prints
+                        FROM (SELECT fact_id, SUM(prints) AS prints FROM usage_facts_daily
+                              WHERE day >= ? GROUP BY fact_id ORDER BY prints DESC, fact_id LIMIT ?) AS top
+                        LEFT JOIN facts ON facts.id = top.fact_id
+                        ORDER BY top.prints DESC, top.fact_id""", (first_day, top))
+    top_facts = [{"id": fact_id, "category": category, "description": description, "prints": prints}
+                 for fact_id, category, description, prints in cursor.fetchall()]
+
+    cursor.execute("SELECT category, prints FROM usage_categories ORDER BY prints DESC, category")
+    all_categories = cursor.fetchall()
+
+    return {
+        "hours": [{"hour": hour, "prints": per_hour.get(hour, 0)}
+                  for hour in range(first_hour, first_hour + hours * HOUR, HOUR)],
+        "today": today,
+        "days": days,
+        "week_categories": [{"category": category, "prints": prints} for category, prints in week_categories],
+        "top_facts": top_facts,
+        "all_categories": [{"category": category, "prints": prints} for category, prints in all_categories],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fun Fact Machine print history")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary_parser = commands.add_parser("summary", help="prints per hour, per category and top facts")
+    summary_parser.add_argument("--hours", type=int, default=48)
+    summary_parser.add_argument("--days", type=int, default=7)
+    commands.add_parser("rebuild", help="recompute the rollups from print_events")
+    args = parser.parse_args(argv)
+
+    if args.command == "summary":
+        print(json.dumps(summary(hours=args.hours, days=args.days), indent=2, ensure_ascii=False))
+    elif args.command == "rebuild":
+        print(f"Rollups rebuilt from {rebuild()} print events")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())